@@ -0,0 +1,79 @@
+"""Run the benchmarks and print the results as JSON.
+
+Run with: python -m benchmarks [--scale SCALE] [--output FILE] [NAME ...]
+"""
+
+import argparse
+from datetime import datetime, timezone
+import json
+import logging
+import platform
+import sys
+
+from mysensors import __version__
+
+from . import (
+    bench_const,
+    bench_gateway,
+    bench_logic,
+    bench_message,
+    bench_mqtt,
+    bench_ota,
+    bench_persistence,
+    bench_sensor,
+)
+
+BENCHMARKS = {
+    "const": bench_const,
+    "message": bench_message,
+    "mqtt": bench_mqtt,
+    "logic": bench_logic,
+    "sensor": bench_sensor,
+    "persistence": bench_persistence,
+    "ota": bench_ota,
+    "gateway": bench_gateway,
+}
+
+
+def run(names=None, scale=1.0):
+    """Run the benchmarks with names and return the report."""
+    if not names:
+        names = list(BENCHMARKS)
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "scale": scale,
+        "unit": "us",
+        "results": {name: BENCHMARKS[name].run(scale) for name in names},
+    }
+
+
+def main(argv=None):
+    """Parse arguments, run the benchmarks and write the report."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "names", nargs="*", help=f"Benchmarks to run: {', '.join(BENCHMARKS)}."
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Scale the number of iterations."
+    )
+    parser.add_argument("--output", help="Write the report to this file.")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+    logging.basicConfig(level=logging.ERROR)
+    report = run(args.names, args.scale)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file_handle:
+            json.dump(report, file_handle, indent=2)
+            file_handle.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
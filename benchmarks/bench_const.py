@@ -0,0 +1,36 @@
+"""Benchmark const lookup and version comparison per message."""
+
+from awesomeversion import AwesomeVersion
+
+from mysensors.const import CONST_VERSIONS, get_const, get_version_tuple
+
+from .common import measure
+
+PROTOCOL_VERSION = "2.3.2"
+NUMBER = 100000
+
+
+def uncached_get_const(protocol_version):
+    """Return the const module path the way it was resolved before caching."""
+    path = next(
+        (
+            CONST_VERSIONS[const_version]
+            for const_version in sorted(CONST_VERSIONS, reverse=True)
+            if AwesomeVersion(protocol_version) >= AwesomeVersion(const_version)
+        ),
+        "mysensors.const_14",
+    )
+    return path
+
+
+def run(scale=1.0):
+    """Run the benchmarks and return a dict of microseconds per call."""
+    number = max(1, int(NUMBER * scale))
+    cases = {
+        "get_const_uncached": lambda: uncached_get_const(PROTOCOL_VERSION),
+        "get_const": lambda: get_const(PROTOCOL_VERSION),
+        "version_compare_awesomeversion": lambda: AwesomeVersion(PROTOCOL_VERSION)
+        >= AwesomeVersion("2.0"),
+        "version_compare_tuple": lambda: get_version_tuple(PROTOCOL_VERSION) >= (2, 0),
+    }
+    return {name: measure(func, number) for name, func in cases.items()}
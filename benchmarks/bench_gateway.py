@@ -0,0 +1,60 @@
+"""Benchmark end-to-end latency through the sync and async gateways.
+
+A simulated network replaces the serial port. Each sample is the time from
+a time request sent by a node until the reply is written back to the node.
+"""
+
+import asyncio
+
+from mysensors.simulator import (
+    AsyncSimulatorGateway,
+    SimulatedNetwork,
+    SimulatedNode,
+    SimulatorGateway,
+    summarize,
+)
+
+NUMBER = 2000
+REQUEST = "1;255;3;0;1;\n"
+TIMEOUT = 5.0
+
+
+def run_sync(number):
+    """Return latency samples in seconds through the sync gateway."""
+    network = SimulatedNetwork([SimulatedNode(1)])
+    gateway = SimulatorGateway(network)
+    gateway.start()
+    try:
+        if not network.wait_connected(TIMEOUT):
+            raise TimeoutError("Sync gateway did not connect")
+        for count in range(1, number + 1):
+            network.send([REQUEST])
+            if not network.wait_replies(count, TIMEOUT):
+                raise TimeoutError("No reply from sync gateway")
+    finally:
+        gateway.stop()
+    return network.latencies
+
+
+async def run_async(number):
+    """Return latency samples in seconds through the async gateway."""
+    network = SimulatedNetwork([SimulatedNode(1)])
+    gateway = AsyncSimulatorGateway(network)
+    await gateway.start()
+    try:
+        for count in range(1, number + 1):
+            network.send([REQUEST])
+            if not await network.async_wait_replies(count, TIMEOUT):
+                raise TimeoutError("No reply from async gateway")
+    finally:
+        await gateway.stop()
+    return network.latencies
+
+
+def run(scale=1.0):
+    """Run the benchmarks and return latency summaries in microseconds."""
+    number = max(1, int(NUMBER * scale))
+    return {
+        "sync_latency": summarize(run_sync(number)),
+        "async_latency": summarize(asyncio.run(run_async(number))),
+    }
@@ -0,0 +1,37 @@
+"""Benchmark Gateway.logic per message type and protocol version."""
+
+from mysensors import BaseSyncGateway
+from mysensors.const import CONST_VERSIONS
+
+from .common import measure
+
+NUMBER = 5000
+MESSAGES = {
+    "presentation": "1;255;0;0;17;1.4.1\n",
+    "set": "1;1;1;0;0;20.5\n",
+    "req": "1;1;2;0;0;\n",
+    "internal_battery_level": "1;255;3;0;0;57\n",
+    "internal_time": "1;255;3;0;1;\n",
+}
+
+
+def make_gateway(protocol_version):
+    """Return a gateway with a presented node."""
+    gateway = BaseSyncGateway(None, protocol_version=protocol_version)
+    gateway.logic("1;255;0;0;17;1.4.1\n")
+    gateway.logic("1;1;0;0;6;\n")
+    gateway.logic("1;1;1;0;0;20.0\n")
+    return gateway
+
+
+def run(scale=1.0):
+    """Run the benchmarks and return a dict of microseconds per call."""
+    number = max(1, int(NUMBER * scale))
+    results = {}
+    for protocol_version in CONST_VERSIONS:
+        gateway = make_gateway(protocol_version)
+        for name, line in MESSAGES.items():
+            results[f"{name}_{protocol_version}"] = measure(
+                lambda logic=gateway.logic, line=line: logic(line), number
+            )
+    return results
@@ -0,0 +1,31 @@
+"""Benchmark decode, encode and validate of messages."""
+
+from mysensors import Message
+from mysensors.const import CONST_VERSIONS
+
+from .common import measure
+
+NUMBER = 20000
+LINE = "1;1;1;0;0;20.5\n"
+
+
+def run(scale=1.0):
+    """Run the benchmarks and return a dict of microseconds per call."""
+    number = max(1, int(NUMBER * scale))
+    msg = Message(LINE)
+    data = LINE.encode()
+    buffer = bytearray()
+    results = {
+        "decode": measure(lambda: Message(LINE), number),
+        "decode_bytes": measure(lambda: Message(data), number),
+        "decode_bytes_as_text": measure(lambda: Message(data.decode()), number),
+        "encode": measure(msg.encode, number),
+        "encode_into": measure(
+            lambda: msg.encode_into(buffer), number, setup=buffer.clear
+        ),
+    }
+    for protocol_version in CONST_VERSIONS:
+        results[f"validate_{protocol_version}"] = measure(
+            lambda version=protocol_version: msg.validate(version), number
+        )
+    return results
@@ -0,0 +1,36 @@
+"""Benchmark MQTT topic decode and encode of messages."""
+
+from unittest import mock
+
+from mysensors.gateway_mqtt import MQTTGateway
+
+from .common import measure
+
+NUMBER = 20000
+TOPIC = "mygateway1-out/1/1/1/0/0"
+LINE = "1;1;1;0;0;20.5\n"
+
+
+def run(scale=1.0):
+    """Run the benchmarks and return a dict of microseconds per call."""
+    number = max(1, int(NUMBER * scale))
+    gateway = MQTTGateway(mock.Mock(), mock.Mock(), in_prefix="mygateway1-out")
+    wildcard_gateway = MQTTGateway(
+        mock.Mock(),
+        mock.Mock(),
+        in_prefix="mygateway1-out",
+        wildcard_subscription=True,
+    )
+    wildcard_gateway.topic_index.add(1, 1)
+    msg = gateway.decode_mqtt(TOPIC, "20.5", 0)
+    return {
+        "parse_topic": measure(
+            lambda: gateway.parse_mqtt_to_message(TOPIC, "20.5", 0), number
+        ),
+        "decode_topic": measure(lambda: gateway.decode_mqtt(TOPIC, "20.5", 0), number),
+        "decode_topic_wildcard": measure(
+            lambda: wildcard_gateway.decode_mqtt(TOPIC, "20.5", 0), number
+        ),
+        "encode_line": measure(lambda: gateway.parse_message_to_mqtt(LINE), number),
+        "encode_message": measure(lambda: gateway.parse_message_to_mqtt(msg), number),
+    }
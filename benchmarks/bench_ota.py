@@ -0,0 +1,40 @@
+"""Benchmark serving of OTA firmware blocks."""
+
+import os
+
+from mysensors import BaseSyncGateway
+from mysensors.ota import FIRMWARE_BLOCK_SIZE, fw_int_to_hex
+
+from .common import measure
+
+FW_TYPE = 1
+FW_VER = 2
+FW_SIZE = 32768
+NUMBER = 5000
+
+
+def run(scale=1.0):
+    """Run the benchmarks and return a dict of microseconds per call."""
+    number = max(1, int(NUMBER * scale))
+    gateway = BaseSyncGateway(None, protocol_version="2.0")
+    gateway.add_sensor(1)
+    gateway.tasks.ota.make_update(1, FW_TYPE, FW_VER, os.urandom(FW_SIZE))
+    blocks = FW_SIZE // FIRMWARE_BLOCK_SIZE
+    gateway.logic(f"1;255;4;0;0;{fw_int_to_hex(FW_TYPE, 1, blocks, 0, 0)}\n")
+    lines = [
+        f"1;255;4;0;2;{fw_int_to_hex(FW_TYPE, FW_VER, block)}\n"
+        for block in range(blocks)
+    ]
+    lines_iter = iter(())
+
+    def next_block():
+        """Serve the next firmware block."""
+        nonlocal lines_iter
+        line = next(lines_iter, None)
+        if line is None:
+            lines_iter = iter(lines)
+            line = next(lines_iter)
+        return gateway.logic(line)
+
+    assert next_block() is not None
+    return {"firmware_block": measure(next_block, number)}
@@ -0,0 +1,70 @@
+"""Benchmark saving and loading of persistence files."""
+
+import os
+import tempfile
+
+from mysensors.persistence import Persistence
+from mysensors.sensor import ChangeTracker, Sensor
+
+from .common import measure
+
+NODE_COUNTS = (10, 100, 1000)
+FORMATS = ("pickle", "json", "journal", "sqlite")
+NUMBER = 10
+
+
+def make_sensors(count):
+    """Return a dict of count sensors with children and values."""
+    sensors = {}
+    for node_id in range(1, count + 1):
+        sensor = Sensor(node_id)
+        sensor.sketch_name = "bench"
+        sensor.sketch_version = "1.0"
+        for child_id in range(2):
+            sensor.add_child_sensor(child_id, 6, "temperature")
+            sensor.children[child_id].values[0] = "20.5"
+            sensor.children[child_id].values[1] = "40"
+        sensors[node_id] = sensor
+    return sensors
+
+
+def _remove(path):
+    """Remove file at path if it exists."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def run(scale=1.0):
+    """Run the benchmarks and return a dict of microseconds per call."""
+    number = max(1, int(NUMBER * scale))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for count in NODE_COUNTS:
+            sensors = make_sensors(count)
+            for fmt in FORMATS:
+                path = os.path.join(tmpdir, f"mysensors.{fmt}")
+                persistence = Persistence(sensors, lambda func: None, path)
+
+                def save(persistence=persistence):
+                    """Save all sensors to a new file."""
+                    persistence.need_save = True
+                    persistence.save_sensors()
+
+                results[f"save_{fmt}_{count}"] = measure(
+                    save, number, setup=lambda path=path: _remove(path)
+                )
+                save()
+                loader = Persistence({}, lambda func: None, path)
+                results[f"load_{fmt}_{count}"] = measure(
+                    loader.safe_load_sensors, number
+                )
+                if fmt in ("journal", "sqlite"):
+                    persistence.changes = ChangeTracker()
+
+                    def append(persistence=persistence):
+                        """Save one changed child value."""
+                        persistence.changes.mark(1, 0, 0)
+                        persistence.save_sensors()
+
+                    results[f"append_{fmt}_{count}"] = measure(append, number)
+    return results
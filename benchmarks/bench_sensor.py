@@ -0,0 +1,49 @@
+"""Benchmark the sensor updates of set and internal messages."""
+
+from mysensors import BaseSyncGateway
+
+from .common import measure
+
+NUMBER = 20000
+
+
+def make_gateway():
+    """Return a gateway with a presented and tracked node."""
+    gateway = BaseSyncGateway(None, protocol_version="2.2")
+    gateway.logic("1;255;0;0;17;2.2.0\n")
+    gateway.logic("1;1;0;0;6;\n")
+    gateway.logic("1;1;1;0;0;20.0\n")
+    return gateway
+
+
+def run(scale=1.0):
+    """Run the benchmarks and return a dict of microseconds per call."""
+    number = max(1, int(NUMBER * scale))
+    gateway = make_gateway()
+    sensor = gateway.sensors[1]
+    values = ("20.5", "21.0")
+    state = {"idx": 0}
+
+    def update_changed():
+        """Update a child value with a new value."""
+        state["idx"] ^= 1
+        sensor.update_child_value(1, 0, values[state["idx"]])
+
+    def logic_changed():
+        """Handle a set message with a new value."""
+        state["idx"] ^= 1
+        gateway.logic(f"1;1;1;0;0;{values[state['idx']]}\n")
+
+    return {
+        "update_child_value_changed": measure(update_changed, number),
+        "update_child_value_unchanged": measure(
+            lambda: sensor.update_child_value(1, 0, "20.0"), number
+        ),
+        "set_heartbeat_unchanged": measure(
+            lambda: setattr(sensor, "heartbeat", 0), number
+        ),
+        "logic_set_changed": measure(logic_changed, number),
+        "logic_set_unchanged": measure(
+            lambda: gateway.logic("1;1;1;0;0;20.0\n"), number
+        ),
+    }
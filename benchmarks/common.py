@@ -0,0 +1,27 @@
+"""Provide helpers for the benchmarks."""
+
+import time
+import timeit
+
+REPEAT = 3
+
+
+def measure(func, number, setup=None, repeat=REPEAT):
+    """Return the best mean time in microseconds per call of func.
+
+    If setup is given it's called before each call of func, outside of the
+    measured time.
+    """
+    if setup is None:
+        return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+    best = None
+    for _ in range(repeat):
+        total = 0.0
+        for _ in range(number):
+            setup()
+            start = time.perf_counter()
+            func()
+            total += time.perf_counter() - start
+        if best is None or total < best:
+            best = total
+    return best / number * 1e6
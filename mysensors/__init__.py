@@ -1,15 +1,27 @@
 """Python implementation of MySensors API."""
 
+import asyncio
 import logging
 from pathlib import Path
+from timeit import default_timer as timer
 
 import voluptuous as vol
-from awesomeversion import AwesomeVersion
 from voluptuous.humanize import humanize_error
 
-from .const import SYSTEM_CHILD_ID, get_const
+from .allocator import NodeIdAllocator
+from .const import SYSTEM_CHILD_ID, get_const, get_version_tuple
 from .message import Message
-from .sensor import Sensor
+from .metrics import MetricsExporter
+from .sensor import ChangeTracker, Sensor
+from .stats import (
+    COUNTER_DECODE_FAILURES,
+    COUNTER_VALIDATION_FAILURES,
+    STAGE_DECODE,
+    STAGE_EVENT_CALLBACK,
+    STAGE_HANDLER,
+    STAGE_VALIDATE,
+    GatewayStats,
+)
 from .task import AsyncTasks, SyncTasks
 from .validation import safe_is_version
 
@@ -27,65 +39,211 @@ class Gateway:
         protocol_version = safe_is_version(protocol_version)
         self.const = get_const(protocol_version)
         self.event_callback = event_callback
+        self.batch_event_callback = None
         self.metric = True  # if true - use metric, if false - use imperial
         handlers = self.const.get_handler_registry()
         # Copy to allow safe modification.
         self.handlers = dict(handlers)
         self.can_log = False
+        self.changes = ChangeTracker()
+        self.node_ids = NodeIdAllocator(max_id=self.const.MAX_NODE_ID)
+        self.stats = GatewayStats()
+        self._event_dispatcher = None
+        self._update_coalescer = None
         self.on_conn_made = None
         self.on_conn_lost = None
         self.protocol_version = protocol_version
         self.sensors = {}
         self.tasks = None
+        self._pending_alerts = None
+        self._stage_timer = None
 
     def __repr__(self):
         """Return the representation."""
         return f"<{self.__class__.__name__}>"
 
+    @property
+    def event_dispatcher(self):
+        """Return the dispatcher that runs event_callback, or None."""
+        return self._event_dispatcher
+
+    @event_dispatcher.setter
+    def event_dispatcher(self, dispatcher):
+        """Set a dispatcher to run event_callback outside message handling.
+
+        If None, event_callback is called directly when a sensor is updated.
+        """
+        if dispatcher is not None:
+            dispatcher.stats = self.stats
+        self._event_dispatcher = dispatcher
+
+    @property
+    def update_coalescer(self):
+        """Return the coalescer of child value update alerts, or None."""
+        return self._update_coalescer
+
+    @update_coalescer.setter
+    def update_coalescer(self, coalescer):
+        """Set a coalescer to decide which child value updates alert.
+
+        If None, every child value update alerts.
+        """
+        if coalescer is not None:
+            coalescer.gateway = self
+        self._update_coalescer = coalescer
+
     def logic(self, data):
         """Parse the data and respond to it appropriately.
 
+        Data is a mysensors command string, the bytes of one or a Message.
         Response is returned to the caller and has to be sent
         data as a mysensors command string.
         """
+        reply = self.respond(data)
+        return reply.encode() if reply else None
+
+    def respond(self, data):
+        """Parse the data and respond to it like logic.
+
+        Return the response as a Message, or None if there is no response.
+        """
+        if not self.stats.enabled:
+            return self._respond(data)
+        stage_timer = self.stats.timer()
+        self._stage_timer = stage_timer
         try:
-            msg = Message(data)
-        except ValueError as exc:
-            _LOGGER.warning("Not a valid message: %s", exc)
-            return None
+            return self._respond(data, stage_timer)
+        finally:
+            self._stage_timer = None
+            stage_timer.record()
+
+    def _respond(self, data, stage_timer=None):
+        """Parse and respond to data, marking stages on stage_timer if set."""
+        if isinstance(data, Message):
+            msg = data
+        else:
+            try:
+                msg = Message(data)
+            except ValueError as exc:
+                _LOGGER.warning("Not a valid message: %s", exc)
+                if stage_timer is not None:
+                    self.stats.count(COUNTER_DECODE_FAILURES)
+                return None
+        if stage_timer is not None:
+            stage_timer.mark(STAGE_DECODE, msg)
         try:
             msg.validate(self.protocol_version)
         except vol.Invalid as exc:
-            _LOGGER.warning("Invalid %s: %s", msg, humanize_error(msg.__dict__, exc))
+            _LOGGER.warning("Invalid %s: %s", msg, humanize_error(msg.as_dict(), exc))
+            if stage_timer is not None:
+                self.stats.count(COUNTER_VALIDATION_FAILURES, msg.type, msg.sub_type)
             return None
+        finally:
+            if stage_timer is not None:
+                stage_timer.mark(STAGE_VALIDATE)
 
         msg.gateway = self
+        if msg.node_id in self.sensors:
+            self.node_ids.seen(msg.node_id)
         message_type = self.const.MessageType(msg.type)
         handler = message_type.get_handler(self.handlers)
         reply = handler(msg)
         reply = self._route_message(reply)
-        return reply.encode() if reply else None
+        if stage_timer is not None:
+            stage_timer.mark(STAGE_HANDLER)
+        return reply
+
+    def logic_many(self, lines):
+        """Parse many lines of data and respond to them appropriately.
+
+        All replies are returned to the caller joined as one mysensors
+        command string. If batch_event_callback is set, it will be called
+        once with a list of all updated messages instead of calling
+        event_callback once per update.
+        """
+        batch_event_callback = self.batch_event_callback
+        if batch_event_callback is not None:
+            self._pending_alerts = []
+        try:
+            replies = [reply for reply in map(self.logic, lines) if reply]
+        finally:
+            pending_alerts = self._pending_alerts
+            self._pending_alerts = None
+        if pending_alerts and batch_event_callback is not None:
+            try:
+                # Set by the caller after init, which pylint doesn't infer.
+                # pylint: disable-next=not-callable
+                batch_event_callback(pending_alerts)
+            except Exception as exception:  # pylint: disable=broad-except
+                _LOGGER.exception(exception)
+        return "".join(replies) if replies else None
 
     def alert(self, msg):
         """Tell anyone who wants to know that a sensor was updated."""
-        if self.event_callback is not None:
+        if self._pending_alerts is not None:
+            self._pending_alerts.append(msg)
+        elif self.event_callback is not None and self._event_dispatcher is not None:
+            self._event_dispatcher.dispatch(self.event_callback, msg)
+        elif self.event_callback is not None:
+            # Keep the callback out of the handler stage of a timed message.
+            stage_timer = self._stage_timer
+            if stage_timer is not None:
+                stage_timer.mark(STAGE_HANDLER)
+            start = timer() if stage_timer is None and self.stats.enabled else None
             try:
                 self.event_callback(msg)
             except Exception as exception:  # pylint: disable=broad-except
                 _LOGGER.exception(exception)
+            if stage_timer is not None:
+                stage_timer.mark(STAGE_EVENT_CALLBACK)
+            elif start is not None:
+                self.stats.record(
+                    STAGE_EVENT_CALLBACK, timer() - start, msg.type, msg.sub_type
+                )
 
         if self.tasks.persistence:
             self.tasks.persistence.need_save = True
 
     def _get_next_id(self):
-        """Return the next available sensor id."""
-        if self.sensors:
-            next_id = max(self.sensors.keys()) + 1
-        else:
-            next_id = 1
-        if next_id <= self.const.MAX_NODE_ID:
+        """Return the lowest free sensor id.
+
+        If no id is free, the id of a node that has been silent for at least
+        node_ids.recycle_after seconds is recycled. Return None if no id is
+        available.
+        """
+        next_id = self.node_ids.allocate()
+        # Sensors can be added without the allocator, eg by persistence.
+        while next_id is not None and next_id in self.sensors:
+            next_id = self.node_ids.allocate()
+        if next_id is not None:
             return next_id
-        return None
+        next_id = self.node_ids.recycle()
+        if next_id is None:
+            return None
+        _LOGGER.info("Recycling id of silent node %s", next_id)
+        self._forget_sensor(next_id)
+        return next_id
+
+    def _forget_sensor(self, sensorid):
+        """Remove sensor with sensorid and mark it as changed.
+
+        Return the removed sensor or None.
+        """
+        sensor = self.sensors.pop(sensorid, None)
+        self.changes.mark(sensorid)
+        if self.tasks and self.tasks.persistence:
+            self.tasks.persistence.need_save = True
+            self.tasks.persistence.need_snapshot = True
+        return sensor
+
+    def remove_sensor(self, sensorid):
+        """Remove a sensor from the gateway and free its node id.
+
+        Return the removed sensor or None.
+        """
+        sensor = self._forget_sensor(sensorid)
+        self.node_ids.release(sensorid)
+        return sensor
 
     def add_sensor(self, sensorid=None):
         """Add a sensor to the gateway."""
@@ -93,8 +251,25 @@ class Gateway:
             sensorid = self._get_next_id()
         if sensorid is not None and sensorid not in self.sensors:
             self.sensors[sensorid] = Sensor(sensorid)
+            self.node_ids.claim(sensorid)
+            self.track_sensor(sensorid)
         return sensorid if sensorid in self.sensors else None
 
+    def track_sensor(self, sensorid):
+        """Track changes of sensor with sensorid in the gateway changes."""
+        sensor = self.sensors[sensorid]
+        sensor.tracker = self.changes
+        sensor.mark_changed()
+
+    def changes_since(self, token=0):
+        """Return the current change token and a list of changes since token.
+
+        A change is a tuple of node id, child id and value type. Child id is
+        None for a change of a node attribute and value type is None for a
+        change of a child presentation.
+        """
+        return self.changes.changes_since(token)
+
     def create_message_to_set_sensor_value(
         self, sensor, child_id, value_type, value, **kwargs
     ):
@@ -139,7 +314,7 @@ class Gateway:
             ret = child_id in self.sensors[sensorid].children
             if not ret:
                 _LOGGER.warning("Child %s is unknown", child_id)
-        if not ret and AwesomeVersion(self.protocol_version) >= AwesomeVersion("2.0"):
+        if not ret and get_version_tuple(self.protocol_version) >= (2, 0):
             _LOGGER.info("Requesting new presentation for node %s", sensorid)
             msg = Message(gateway=self).modify(
                 node_id=sensorid,
@@ -197,7 +372,7 @@ class Gateway:
 
     def send(self, message):
         """Write a message to the arduino gateway."""
-        self.tasks.transport.send(message)
+        self.tasks.send(message)
 
 
 class BaseSyncGateway(Gateway):
@@ -209,25 +384,45 @@ class BaseSyncGateway(Gateway):
         *args,
         persistence=False,
         persistence_file="mysensors.pickle",
+        metrics_port=None,
         **kwargs,
     ):
         """Set up gateway."""
         super().__init__(*args, **kwargs)
+        self.metrics = None
+        if metrics_port is not None:
+            self.metrics = MetricsExporter(self, port=metrics_port)
         self.tasks = SyncTasks(
             self.const, persistence, persistence_file, self.sensors, transport
         )
+        if self.tasks.persistence:
+            self.tasks.persistence.changes = self.changes
+            self.tasks.persistence.stats = self.stats
 
     def start(self):
         """Start the gateway and task allow tasks to be scheduled."""
+        if self.metrics:
+            self.metrics.start()
+        if self.event_dispatcher:
+            self.event_dispatcher.start()
         self.tasks.start()
 
     def stop(self):
         """Stop the gateway and stop allowing tasks for the scheduler."""
+        if self.update_coalescer:
+            self.update_coalescer.flush()
         self.tasks.stop()
+        if self.event_dispatcher:
+            self.event_dispatcher.stop()
+        if self.metrics:
+            self.metrics.stop()
 
     def start_persistence(self):
         """Load persistence file and schedule saving of persistence file."""
         self.tasks.start_persistence()
+        self.node_ids.sync(self.sensors)
+        for sensorid in self.sensors:
+            self.track_sensor(sensorid)
 
     def update_fw(self, nids, fw_type, fw_ver, fw_path=None):
         """Update firmware of all node_ids in nids."""
@@ -243,10 +438,14 @@ class BaseAsyncGateway(Gateway):
         *args,
         persistence=False,
         persistence_file="mysensors.pickle",
+        metrics_port=None,
         **kwargs,
     ):
         """Set up gateway."""
         super().__init__(*args, **kwargs)
+        self.metrics = None
+        if metrics_port is not None:
+            self.metrics = MetricsExporter(self, port=metrics_port)
         self.tasks = AsyncTasks(
             self.const,
             persistence,
@@ -254,18 +453,38 @@ class BaseAsyncGateway(Gateway):
             self.sensors,
             transport,
         )
+        if self.tasks.persistence:
+            self.tasks.persistence.changes = self.changes
+            self.tasks.persistence.stats = self.stats
 
     async def start(self):
         """Start the gateway and task allow tasks to be scheduled."""
+        if self.metrics:
+            self.metrics.start()
+        if self.event_dispatcher:
+            self.event_dispatcher.start()
         await self.tasks.start()
 
     async def stop(self):
         """Stop the gateway and stop allowing tasks for the scheduler."""
+        if self.update_coalescer:
+            self.update_coalescer.flush()
         await self.tasks.stop()
+        if self.event_dispatcher:
+            await self.event_dispatcher.stop()
+        if self.metrics:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.metrics.stop)
 
-    async def start_persistence(self):
-        """Load persistence file and schedule saving of persistence file."""
-        await self.tasks.start_persistence()
+    async def start_persistence(self, schedule_save=True):
+        """Load persistence file and schedule saving of persistence file.
+
+        If schedule_save is False, saving is left to the caller.
+        """
+        await self.tasks.start_persistence(schedule_save=schedule_save)
+        self.node_ids.sync(self.sensors)
+        for sensorid in self.sensors:
+            self.track_sensor(sensorid)
 
     async def update_fw(self, nids, fw_type, fw_ver, fw_path=None):
         """Update firmware of all node_ids in nids."""
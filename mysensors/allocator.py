@@ -0,0 +1,99 @@
+"""Allocate node ids to nodes that request an id."""
+
+import time
+
+from .const_14 import MAX_NODE_ID
+
+
+class NodeIdAllocator:
+    """Allocate the lowest free node id from a bitmap of free ids.
+
+    Bit n of the bitmap is set when node id n is free. Reserved ids are
+    never allocated, but may still be claimed by nodes with a static id.
+    If recycle_after is set to a number of seconds, the id of the node that
+    has been silent the longest, for at least that time, can be recycled when
+    no id is free.
+    """
+
+    def __init__(self, min_id=1, max_id=MAX_NODE_ID, recycle_after=None):
+        """Set up allocator."""
+        self.min_id = min_id
+        self.max_id = max_id
+        self.recycle_after = recycle_after
+        self._free = ((1 << (max_id + 1)) - 1) & ~((1 << min_id) - 1)
+        self._reserved = 0
+        self._last_seen = {}
+
+    def _is_reserved(self, node_id):
+        """Return True if node_id is reserved."""
+        return bool(self._reserved >> node_id & 1)
+
+    def is_free(self, node_id):
+        """Return True if node_id is free to allocate."""
+        return bool(self._free >> node_id & 1)
+
+    def reserve(self, first, last=None):
+        """Reserve the ids from first to last, inclusive, from allocation."""
+        if last is None:
+            last = first
+        mask = ((1 << (last + 1)) - 1) & ~((1 << first) - 1)
+        self._reserved |= mask
+        self._free &= ~mask
+
+    def claim(self, node_id, now=None):
+        """Mark node_id as used."""
+        self._free &= ~(1 << node_id)
+        self.seen(node_id, now)
+
+    def release(self, node_id):
+        """Mark node_id as free, unless the id is reserved or out of range."""
+        self._last_seen.pop(node_id, None)
+        if self.min_id <= node_id <= self.max_id and not self._is_reserved(node_id):
+            self._free |= 1 << node_id
+
+    def sync(self, node_ids, now=None):
+        """Mark node_ids as used and all other ids as free."""
+        self._free = ((1 << (self.max_id + 1)) - 1) & ~((1 << self.min_id) - 1)
+        self._free &= ~self._reserved
+        self._last_seen = {}
+        for node_id in node_ids:
+            self.claim(node_id, now)
+
+    def seen(self, node_id, now=None):
+        """Record that node_id was heard from."""
+        self._last_seen[node_id] = time.monotonic() if now is None else now
+
+    def allocate(self, now=None):
+        """Return the lowest free id and mark it as used.
+
+        Return None if no id is free.
+        """
+        if not self._free:
+            return None
+        node_id = (self._free & -self._free).bit_length() - 1
+        self.claim(node_id, now)
+        return node_id
+
+    def recycle(self, now=None):
+        """Return the id of the node that has been silent the longest.
+
+        Return None if recycling is disabled or no node has been silent
+        for at least recycle_after seconds. The returned id stays used and
+        counts as seen now.
+        """
+        if self.recycle_after is None:
+            return None
+        if now is None:
+            now = time.monotonic()
+        candidates = [
+            (last_seen, node_id)
+            for node_id, last_seen in self._last_seen.items()
+            if now - last_seen >= self.recycle_after
+            and self.min_id <= node_id <= self.max_id
+            and not self._is_reserved(node_id)
+        ]
+        if not candidates:
+            return None
+        _, node_id = min(candidates)
+        self.seen(node_id, now)
+        return node_id
@@ -8,6 +8,7 @@ from mysensors import __version__
 from mysensors.cli.gateway_mqtt import async_mqtt_gateway, mqtt_gateway
 from mysensors.cli.gateway_serial import async_serial_gateway, serial_gateway
 from mysensors.cli.gateway_tcp import async_tcp_gateway, tcp_gateway
+from mysensors.cli.simulator import simulator
 
 SETTINGS = {"help_option_names": ["-h", "--help"]}
 
@@ -30,4 +31,5 @@ cli.add_command(async_serial_gateway)
 cli.add_command(async_tcp_gateway)
 cli.add_command(mqtt_gateway)
 cli.add_command(serial_gateway)
+cli.add_command(simulator)
 cli.add_command(tcp_gateway)
@@ -1,9 +1,7 @@
 """Start a mqtt gateway."""
 
-import asyncio
 from contextlib import contextmanager
 import logging
-import socket
 import sys
 
 import click
@@ -14,6 +12,7 @@ from mysensors.cli.helper import (
     run_async_gateway,
     run_gateway,
 )
+from mysensors.cli.mqtt_client import AsyncioMQTTClient
 from mysensors.gateway_mqtt import AsyncMQTTGateway, MQTTGateway
 
 _LOGGER = logging.getLogger(__name__)
@@ -21,6 +20,12 @@ _LOGGER = logging.getLogger(__name__)
 
 def common_mqtt_options(func):
     """Supply common mqtt gateway options."""
+    func = click.option(
+        "--wildcard-subscription",
+        is_flag=True,
+        default=False,
+        help="Subscribe to all topics with one subscription.",
+    )(func)
     func = click.option(
         "-r",
         "--retain",
@@ -61,7 +66,12 @@ def mqtt_gateway(broker, port, **kwargs):
     """Start an mqtt gateway."""
     with run_mqtt_client(broker, port) as mqttc:
         gateway = MQTTGateway(
-            mqttc.publish, mqttc.subscribe, event_callback=handle_msg, **kwargs
+            mqttc.publish,
+            mqttc.subscribe,
+            pub_many_callback=mqttc.publish_many,
+            sub_many_callback=mqttc.subscribe_many,
+            event_callback=handle_msg,
+            **kwargs,
         )
         run_gateway(gateway)
 
@@ -76,7 +86,12 @@ def async_mqtt_gateway(broker, port, **kwargs):
         """Create the async MQTT gateway."""
         mqttc = await async_start_mqtt_client(broker, port)
         gateway = AsyncMQTTGateway(
-            mqttc.publish, mqttc.subscribe, event_callback=handle_msg, **kwargs
+            mqttc.publish,
+            mqttc.subscribe,
+            pub_many_callback=mqttc.publish_many,
+            sub_many_callback=mqttc.subscribe_many,
+            event_callback=handle_msg,
+            **kwargs,
         )
         return gateway, mqttc.stop
 
@@ -102,7 +117,7 @@ def run_mqtt_client(broker, port):
 
 async def async_start_mqtt_client(broker, port):
     """Start async mqtt client."""
-    mqttc = AsyncMQTTClient(broker, port)
+    mqttc = AsyncioMQTTClient(broker, port)
     try:
         await mqttc.start()
     except OSError as exc:
@@ -142,9 +157,21 @@ class BaseMQTTClient:
         """Publish an MQTT message."""
         self._client.publish(topic, payload, qos, retain)
 
+    def publish_many(self, messages):
+        """Publish a list of topic, payload, qos and retain tuples."""
+        for topic, payload, qos, retain in messages:
+            self._client.publish(topic, payload, qos, retain)
+
     def subscribe(self, topic, callback, qos):
         """Subscribe to an MQTT topic."""
-        if topic in self.topics:
+        self.subscribe_many([(topic, qos)], callback)
+
+    def subscribe_many(self, subscriptions, callback):
+        """Subscribe to a list of topic and qos tuples with one request."""
+        subscriptions = [
+            (topic, qos) for topic, qos in subscriptions if topic not in self.topics
+        ]
+        if not subscriptions:
             return
 
         def message_callback(mqttc, userdata, msg):
@@ -152,9 +179,10 @@ class BaseMQTTClient:
             # pylint: disable=unused-argument
             callback(msg.topic, msg.payload.decode("utf-8"), msg.qos)
 
-        self._client.subscribe(topic, qos)
-        self._client.message_callback_add(topic, message_callback)
-        self.topics[topic] = callback
+        self._client.subscribe(subscriptions)
+        for topic, _ in subscriptions:
+            self._client.message_callback_add(topic, message_callback)
+            self.topics[topic] = callback
 
 
 class MQTTClient(BaseMQTTClient):
@@ -171,94 +199,3 @@ class MQTTClient(BaseMQTTClient):
         _LOGGER.info("Stop MQTT client")
         self._client.disconnect()
         self._client.loop_stop()
-
-
-class AsyncMQTTClient(BaseMQTTClient):
-    """Async MQTT client."""
-
-    def __init__(self, *args):
-        """Set up async MQTT client."""
-        self.disconnected = None
-        self._aio_helper = None
-        super().__init__(*args)
-
-    def on_disconnect(self, client, userdata, ret_code):
-        """Handle disconnection."""
-        # pylint: disable=unused-argument
-        self.disconnected.set_result(ret_code)
-
-    def _connect(self):
-        """Connect to broker."""
-        loop = asyncio.get_running_loop()
-        self.disconnected = loop.create_future()
-        self._client.on_disconnect = self.on_disconnect
-        self._aio_helper = AsyncioHelper(loop, self._client)
-        super()._connect()
-        self._client.socket().setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048)
-
-    async def start(self):
-        """Run the MQTT client."""
-        _LOGGER.info("Start MQTT client")
-        self._connect()
-
-    async def stop(self):
-        """Stop the MQTT client."""
-        _LOGGER.info("Stop MQTT client")
-        self._client.disconnect()
-        await self.disconnected
-
-
-class AsyncioHelper:
-    """Provide asyncio loop support.
-
-    Based on example at https://github.com/eclipse/paho.mqtt.python.
-    """
-
-    # pylint: disable=unused-argument
-
-    def __init__(self, loop, client):
-        """Set up instance."""
-        self.loop = loop
-        self._client = client
-        self._client.on_socket_open = self.on_socket_open
-        self._client.on_socket_close = self.on_socket_close
-        self._client.on_socket_register_write = self.register_write
-        self._client.on_socket_unregister_write = self.unregister_write
-        self.misc_loop_task = None
-
-    def on_socket_open(self, client, userdata, sock):
-        """Handle socket open."""
-
-        def callback():
-            client.loop_read()
-
-        self.loop.add_reader(sock, callback)
-        self.misc_loop_task = self.loop.create_task(self.run_misc_loop())
-
-    def on_socket_close(self, client, userdata, sock):
-        """Handle socket close."""
-        self.loop.remove_reader(sock)
-        self.misc_loop_task.cancel()
-
-    def register_write(self, client, userdata, sock):
-        """Register write callback."""
-
-        def callback():
-            client.loop_write()
-
-        self.loop.add_writer(sock, callback)
-
-    def unregister_write(self, client, userdata, sock):
-        """Unregister write callback."""
-        self.loop.remove_writer(sock)
-
-    async def run_misc_loop(self):
-        """Provide loop for paho mqtt."""
-        # pylint: disable=import-outside-toplevel
-        import paho.mqtt.client as mqtt
-
-        while self._client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
-            try:
-                await asyncio.sleep(1)
-            except asyncio.CancelledError:
-                break
@@ -21,6 +21,11 @@ def common_gateway_options(func):
     func = click.option(
         "-s", "--persistence", help="Turn on persistence.", is_flag=True
     )(func)
+    func = click.option(
+        "--metrics-port",
+        type=int,
+        help="Serve OpenMetrics at http://127.0.0.1:<port>/metrics.",
+    )(func)
     return func
 
 
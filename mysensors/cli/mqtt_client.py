@@ -0,0 +1,309 @@
+"""Provide an asyncio MQTT 3.1.1 client using only the standard library."""
+
+import asyncio
+import logging
+import math
+import os
+import struct
+import time
+
+from mysensors.gateway_mqtt import topic_matches
+
+_LOGGER = logging.getLogger(__name__)
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+PROTOCOL_LEVEL = 4  # MQTT 3.1.1
+CLEAN_SESSION = 0x02
+SUBACK_FAILURE = 0x80
+MAX_PACKET_ID = 0xFFFF
+
+
+def encode_length(length):
+    """Return the remaining length of a packet encoded as bytes."""
+    data = bytearray()
+    while True:
+        length, digit = divmod(length, 128)
+        if length:
+            digit |= 0x80
+        data.append(digit)
+        if not length:
+            return bytes(data)
+
+
+def encode_string(value):
+    """Return a string encoded with its length as bytes."""
+    data = value.encode("utf-8")
+    return struct.pack("!H", len(data)) + data
+
+
+def packet(packet_type, body=b"", flags=0):
+    """Return a packet of packet_type with body."""
+    return bytes((packet_type << 4 | flags,)) + encode_length(len(body)) + body
+
+
+class AsyncioMQTTClient:
+    """Represent an MQTT 3.1.1 client on asyncio streams.
+
+    Publish and subscribe don't wait for the broker. Packets are written to
+    the stream write buffer and QoS 1 publishes are acknowledged by the
+    broker while later packets are sent. QoS 2 is requested as QoS 1.
+    A ping is sent when nothing has been sent for keepalive seconds, and the
+    connection is closed if the broker doesn't answer within keepalive
+    seconds.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, broker, port=1883, keepalive=60, client_id=None):
+        """Set up MQTT client."""
+        self.broker = broker
+        self.port = port
+        self.keepalive = keepalive
+        self.client_id = client_id or f"pymysensors-{os.urandom(4).hex()}"
+        self.disconnected = None
+        self.inflight = {}
+        self.topics = {}
+        self._last_packet_id = 0
+        self._last_write = 0.0
+        self._ping_sent = None
+        self._reader = None
+        self._writer = None
+        self._tasks = []
+
+    async def start(self):
+        """Connect to the broker.
+
+        Raise OSError if the connection fails or the broker refuses it.
+        """
+        _LOGGER.info("Start MQTT client")
+        self._reader, self._writer = await asyncio.open_connection(
+            self.broker, self.port
+        )
+        body = (
+            encode_string("MQTT")
+            + struct.pack(
+                "!BBH", PROTOCOL_LEVEL, CLEAN_SESSION, math.ceil(self.keepalive)
+            )
+            + encode_string(self.client_id)
+        )
+        self._write(packet(CONNECT, body))
+        try:
+            packet_type, _, body = await asyncio.wait_for(
+                self._read_packet(), self.keepalive or None
+            )
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+            self._writer.close()
+            raise ConnectionError("No connection acknowledgement from broker") from exc
+        if packet_type != CONNACK or len(body) != 2 or body[1]:
+            self._writer.close()
+            raise ConnectionError(
+                f"Connection refused by broker, return code {body[1:2].hex()}"
+            )
+        loop = asyncio.get_running_loop()
+        self.disconnected = loop.create_future()
+        self._tasks = [loop.create_task(self._read_loop())]
+        if self.keepalive:
+            self._tasks.append(loop.create_task(self._keepalive_loop()))
+
+    async def stop(self):
+        """Disconnect from the broker."""
+        _LOGGER.info("Stop MQTT client")
+        if self._writer is None:
+            return
+        if not self._writer.is_closing():
+            self._write(packet(DISCONNECT))
+            try:
+                await self._writer.drain()
+            except ConnectionError:
+                pass
+        if self.inflight:
+            _LOGGER.warning(
+                "Disconnecting with %s unacknowledged messages", len(self.inflight)
+            )
+        self._close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    @property
+    def writing_paused(self):
+        """Return True if the write buffer is above its high water mark."""
+        if self._writer is None or self._writer.is_closing():
+            return False
+        transport = self._writer.transport
+        _, high = transport.get_write_buffer_limits()
+        return transport.get_write_buffer_size() > high
+
+    async def drain(self):
+        """Wait until the write buffer is below its high water mark."""
+        await self._writer.drain()
+
+    def publish(self, topic, payload, qos, retain):
+        """Publish an MQTT message."""
+        self.publish_many([(topic, payload, qos, retain)])
+
+    def publish_many(self, messages):
+        """Publish a list of topic, payload, qos and retain tuples in one write.
+
+        Publishing doesn't wait for the broker, so the write buffer grows
+        while the broker can't keep up. Callers that publish in a loop must
+        await drain() when writing_paused is True.
+        """
+        data = bytearray()
+        for topic, payload, qos, retain in messages:
+            qos = min(int(qos), 1)
+            body = encode_string(topic)
+            if qos:
+                packet_id = self._next_packet_id()
+                if packet_id is None:
+                    _LOGGER.warning(
+                        "All packet ids are in flight, dropping message to %s", topic
+                    )
+                    continue
+                body += struct.pack("!H", packet_id)
+                self.inflight[packet_id] = topic
+            if isinstance(payload, str):
+                payload = payload.encode("utf-8")
+            data += packet(PUBLISH, body + payload, qos << 1 | bool(retain))
+        if data:
+            self._write(data)
+
+    def subscribe(self, topic, callback, qos):
+        """Subscribe to an MQTT topic."""
+        self.subscribe_many([(topic, qos)], callback)
+
+    def subscribe_many(self, subscriptions, callback):
+        """Subscribe to a list of topic and qos tuples with one request."""
+        subscriptions = [
+            (topic, qos) for topic, qos in subscriptions if topic not in self.topics
+        ]
+        if not subscriptions:
+            return
+        packet_id = self._next_packet_id()
+        if packet_id is None:
+            _LOGGER.error("All packet ids are in flight, not subscribing")
+            return
+        body = bytearray(struct.pack("!H", packet_id))
+        for topic, qos in subscriptions:
+            body += encode_string(topic) + bytes((min(int(qos), 1),))
+            self.topics[topic] = callback
+        self._write(packet(SUBSCRIBE, bytes(body), 0x02))
+
+    def _next_packet_id(self):
+        """Return a packet id that isn't in flight.
+
+        Return None if all packet ids are in flight.
+        """
+        for _ in range(MAX_PACKET_ID):
+            self._last_packet_id = self._last_packet_id % MAX_PACKET_ID + 1
+            if self._last_packet_id not in self.inflight:
+                return self._last_packet_id
+        return None
+
+    def _write(self, data):
+        """Write data to the stream write buffer."""
+        if self._writer is None or self._writer.is_closing():
+            _LOGGER.warning("Not connected to broker, dropping packet")
+            return
+        self._writer.write(data)
+        self._last_write = time.monotonic()
+
+    def _close(self):
+        """Close the connection and resolve disconnected."""
+        if self._writer is not None:
+            self._writer.close()
+        if self.disconnected is not None and not self.disconnected.done():
+            self.disconnected.set_result(None)
+
+    async def _read_packet(self):
+        """Read a packet. Return packet type, flags and body."""
+        header = await self._reader.readexactly(1)
+        length = 0
+        multiplier = 1
+        while True:
+            digit = (await self._reader.readexactly(1))[0]
+            length += (digit & 0x7F) * multiplier
+            if not digit & 0x80:
+                break
+            multiplier *= 128
+        body = await self._reader.readexactly(length) if length else b""
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    async def _read_loop(self):
+        """Read and handle packets until the connection closes."""
+        try:
+            while True:
+                packet_type, flags, body = await self._read_packet()
+                self._handle_packet(packet_type, flags, body)
+        except (asyncio.IncompleteReadError, ConnectionError) as exc:
+            _LOGGER.warning("Connection to broker lost: %s", exc)
+        finally:
+            self._close()
+
+    def _handle_packet(self, packet_type, flags, body):
+        """Handle a packet from the broker."""
+        if packet_type == PUBLISH:
+            self._handle_publish(flags, body)
+        elif packet_type == PUBACK:
+            self.inflight.pop(struct.unpack("!H", body[:2])[0], None)
+        elif packet_type == PUBREL:
+            self._write(packet(PUBCOMP, body[:2]))
+        elif packet_type == SUBACK:
+            if SUBACK_FAILURE in body[2:]:
+                _LOGGER.error("Broker refused a subscription")
+        elif packet_type == PINGRESP:
+            self._ping_sent = None
+        else:
+            _LOGGER.debug("Ignoring packet of type %s", packet_type)
+
+    def _handle_publish(self, flags, body):
+        """Acknowledge a received message and pass it to its callbacks."""
+        qos = flags >> 1 & 0x03
+        (topic_length,) = struct.unpack("!H", body[:2])
+        start = 2 + topic_length
+        topic = body[2:start].decode("utf-8")
+        if qos:
+            packet_id = body[start : start + 2]
+            start += 2
+            self._write(packet(PUBACK if qos == 1 else PUBREC, packet_id))
+        payload = body[start:].decode("utf-8", "replace")
+        for topic_filter, callback in list(self.topics.items()):
+            if topic_matches(topic_filter, topic):
+                try:
+                    callback(topic, payload, qos)
+                except Exception as exception:  # pylint: disable=broad-except
+                    _LOGGER.exception(exception)
+
+    async def _keepalive_loop(self):
+        """Ping the broker when idle and close the connection if it's gone."""
+        while not self._writer.is_closing():
+            now = time.monotonic()
+            if self._ping_sent is not None:
+                if now - self._ping_sent >= self.keepalive:
+                    _LOGGER.warning("No ping response from broker, disconnecting")
+                    self._close()
+                    return
+                delay = self._ping_sent + self.keepalive - now
+            elif now - self._last_write >= self.keepalive:
+                self._ping_sent = now
+                self._write(packet(PINGREQ))
+                delay = self.keepalive
+            else:
+                delay = self._last_write + self.keepalive - now
+            await asyncio.sleep(delay)
@@ -0,0 +1,101 @@
+"""Run a gateway against a simulated network of nodes."""
+
+import json
+import os
+import tempfile
+
+import click
+
+from mysensors.cli.helper import common_gateway_options
+from mysensors.simulator import FW_SIZE, SimulatedNetwork, make_nodes, simulate
+
+
+@click.command(options_metavar="<options>")
+@click.option(
+    "-g",
+    "--gateway",
+    "gateway_type",
+    type=click.Choice(["sync", "async", "tcp", "mqtt"]),
+    default="sync",
+    show_default=True,
+    help="Type of gateway to run.",
+)
+@click.option("-n", "--nodes", default=10, show_default=True, help="Number of nodes.")
+@click.option(
+    "-r",
+    "--rate",
+    default=10.0,
+    show_default=True,
+    help="Messages per second sent by all nodes.",
+)
+@click.option(
+    "-d",
+    "--duration",
+    default=10.0,
+    show_default=True,
+    help="Seconds to run the simulation.",
+)
+@click.option(
+    "--smart-sleep",
+    default=0,
+    show_default=True,
+    help="Number of nodes that use smart sleep.",
+)
+@click.option(
+    "--ota",
+    default=0,
+    show_default=True,
+    help="Number of nodes to update firmware of.",
+)
+@click.option(
+    "--fw-size",
+    default=FW_SIZE,
+    show_default=True,
+    help="Size in bytes of the simulated firmware.",
+)
+@click.option(
+    "--request-id", is_flag=True, help="Let the nodes request ids when they boot."
+)
+@click.option(
+    "--persistence-file",
+    type=click.Path(dir_okay=False),
+    help="Path of the persistence file. Default is a temporary file.",
+)
+@common_gateway_options
+# Click passes every option as an argument.
+# pylint: disable-next=too-many-arguments, too-many-positional-arguments
+def simulator(
+    gateway_type,
+    nodes,
+    rate,
+    duration,
+    smart_sleep,
+    ota,
+    fw_size,
+    request_id,
+    persistence_file,
+    **kwargs,
+):
+    """Run a gateway against a simulated network and print statistics."""
+    network = SimulatedNetwork(
+        make_nodes(
+            nodes,
+            protocol_version=kwargs["protocol_version"],
+            rate=rate,
+            smart_sleep=smart_sleep,
+            request_id=request_id,
+        ),
+        protocol_version=kwargs["protocol_version"],
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stats = simulate(
+            network,
+            gateway_type,
+            duration=duration,
+            ota_nodes=tuple(range(1, ota + 1)),
+            fw_size=fw_size,
+            persistence_file=persistence_file
+            or os.path.join(tmp_dir, "mysensors_simulator.json"),
+            **kwargs,
+        )
+    click.echo(json.dumps(stats, indent=2))
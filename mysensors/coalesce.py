@@ -0,0 +1,127 @@
+"""Coalesce redundant child value updates before alerting."""
+
+from itertools import count
+
+from .stats import COUNTER_UPDATES_COALESCED
+
+
+class UpdateCoalescer:
+    """Decide when set messages should alert, per node, child and value type.
+
+    If suppress_unchanged is True, a value equal to the last alerted value
+    doesn't alert. If debounce is set to a number of seconds, an update
+    alerts when no other update of the same child value has followed within
+    that time. If throttle is set to a number of seconds, an update alerts at
+    once and further updates within that time alert once at the end of it,
+    with the latest value. Child values are always updated, only the alerts
+    are coalesced.
+    """
+
+    def __init__(self, suppress_unchanged=True, debounce=None, throttle=None):
+        """Set up update coalescer."""
+        if debounce and throttle:
+            raise ValueError("Set either debounce or throttle, not both")
+        self.suppress_unchanged = suppress_unchanged
+        self.debounce = debounce
+        self.throttle = throttle
+        self.gateway = None
+        self._alerted = {}
+        self._pending = {}
+        self._timers = {}
+        self._timer_ids = count()
+
+    def update(self, msg, previous=None):
+        """Return True if the set message msg should alert now.
+
+        Previous is the child value before msg was handled.
+        """
+        key = (msg.node_id, msg.child_id, msg.sub_type)
+        if self.suppress_unchanged:
+            if msg.payload == self._alerted.get(key, previous):
+                # The value is back at the alerted value.
+                self._pending.pop(key, None)
+                self._count_coalesced()
+                return False
+        if self.debounce:
+            self._hold(key, msg)
+            self._cancel_timer(key)
+            self._start_timer(key, self.debounce, self._debounce_end)
+            return False
+        if self.throttle:
+            if key in self._timers:
+                self._hold(key, msg)
+                return False
+            self._start_timer(key, self.throttle, self._throttle_end)
+        self._alerted_value(key, msg)
+        return True
+
+    def flush(self):
+        """Cancel all timers and alert all held updates."""
+        for key in list(self._timers):
+            self._cancel_timer(key)
+        pending, self._pending = self._pending, {}
+        for key, msg in pending.items():
+            self._alert(key, msg)
+
+    def _hold(self, key, msg):
+        """Hold msg until it may alert."""
+        if key in self._pending:
+            self._count_coalesced()
+        self._pending[key] = msg
+
+    def _alerted_value(self, key, msg):
+        """Remember the value alerted by msg."""
+        if self.suppress_unchanged:
+            self._alerted[key] = msg.payload
+
+    def _alert(self, key, msg):
+        """Alert a held update."""
+        self._alerted_value(key, msg)
+        self.gateway.alert(msg)
+
+    def _count_coalesced(self):
+        """Count an update that didn't alert."""
+        stats = getattr(self.gateway, "stats", None)
+        if stats is not None and stats.enabled:
+            stats.count(COUNTER_UPDATES_COALESCED)
+
+    def _start_timer(self, key, delay, func):
+        """Call func with key and a timer id after delay seconds."""
+        timer_id = next(self._timer_ids)
+        cancel = self.gateway.tasks.call_later(delay, func, key, timer_id)
+        self._timers[key] = (timer_id, cancel)
+
+    def _cancel_timer(self, key):
+        """Cancel the timer for key if any."""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer[1]()
+
+    def _end_timer(self, key, timer_id):
+        """Remove the timer for key. Return False if timer_id isn't current.
+
+        A cancelled timer may still call back, if its call was already queued.
+        """
+        timer = self._timers.get(key)
+        if timer is None or timer[0] != timer_id:
+            return False
+        del self._timers[key]
+        return True
+
+    def _debounce_end(self, key, timer_id):
+        """Alert the held update when no update has followed it."""
+        if not self._end_timer(key, timer_id):
+            return
+        msg = self._pending.pop(key, None)
+        if msg is not None:
+            self._alert(key, msg)
+
+    def _throttle_end(self, key, timer_id):
+        """Alert the latest held update and start a new window if any."""
+        if not self._end_timer(key, timer_id):
+            return
+        msg = self._pending.pop(key, None)
+        if msg is None:
+            return
+        self._start_timer(key, self.throttle, self._throttle_end)
+        self._alert(key, msg)
@@ -5,6 +5,7 @@ from importlib import import_module
 from awesomeversion import AwesomeVersion
 
 LOADED_CONST = {}
+RESOLVED_VERSIONS = {}
 
 CONST_VERSIONS = {
     "1.4": "mysensors.const_14",
@@ -15,19 +16,47 @@ CONST_VERSIONS = {
     "2.4": "mysensors.const_24",
 }
 
+# Const versions, newest first, with version tuples for fast comparison.
+CONST_VERSION_TUPLES = {
+    const_version: tuple(int(part) for part in const_version.split("."))
+    for const_version in sorted(CONST_VERSIONS, reverse=True)
+}
+
 SYSTEM_CHILD_ID = 255
 
 
-def get_const(protocol_version):
-    """Return the const module for the protocol_version."""
-    path = next(
+def get_const_version(protocol_version):
+    """Return the const version that applies to the protocol_version.
+
+    The result is cached per protocol_version string.
+    """
+    const_version = RESOLVED_VERSIONS.get(protocol_version)
+    if const_version is not None:
+        return const_version
+    version = AwesomeVersion(protocol_version)
+    const_version = next(
         (
-            CONST_VERSIONS[const_version]
-            for const_version in sorted(CONST_VERSIONS, reverse=True)
-            if AwesomeVersion(protocol_version) >= AwesomeVersion(const_version)
+            const_version
+            for const_version in CONST_VERSION_TUPLES
+            if version >= AwesomeVersion(const_version)
         ),
-        "mysensors.const_14",
+        "1.4",
     )
+    RESOLVED_VERSIONS[protocol_version] = const_version
+    return const_version
+
+
+def get_version_tuple(protocol_version):
+    """Return the const version tuple that applies to the protocol_version.
+
+    Compare the tuple with const version tuples, eg (2, 0), in hot paths.
+    """
+    return CONST_VERSION_TUPLES[get_const_version(protocol_version)]
+
+
+def get_const(protocol_version):
+    """Return the const module for the protocol_version."""
+    path = CONST_VERSIONS[get_const_version(protocol_version)]
     if path in LOADED_CONST:
         return LOADED_CONST[path]
     const = import_module(path)
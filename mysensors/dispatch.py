@@ -0,0 +1,270 @@
+"""Dispatch event callbacks off the message handling path."""
+
+import asyncio
+from collections import OrderedDict
+import inspect
+from itertools import count
+import logging
+import threading
+from timeit import default_timer as timer
+
+from .stats import COUNTER_EVENTS_DROPPED, STAGE_EVENT_CALLBACK
+
+_LOGGER = logging.getLogger(__name__)
+
+POLICY_DROP_OLDEST = "drop_oldest"
+POLICY_DROP_NEWEST = "drop_newest"
+POLICY_COALESCE = "coalesce"
+POLICIES = (POLICY_DROP_OLDEST, POLICY_DROP_NEWEST, POLICY_COALESCE)
+
+
+class EventQueue:
+    """Represent a bounded queue of callback and message pairs.
+
+    When the queue is full, the drop_oldest policy drops the oldest queued
+    event and the drop_newest policy drops the new event. The coalesce
+    policy replaces a queued event for the same callback, node, child,
+    type and sub type with the new event, keeping its place in the queue,
+    and else drops the oldest queued event when full.
+    """
+
+    def __init__(self, maxsize=1000, policy=POLICY_DROP_OLDEST):
+        """Set up event queue."""
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid dispatch policy: {policy}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._items = OrderedDict()
+        self._counter = count()
+
+    def __len__(self):
+        """Return number of queued events."""
+        return len(self._items)
+
+    def put(self, callback, msg):
+        """Queue callback and msg. Return the number of dropped events."""
+        if self.policy == POLICY_COALESCE:
+            key = (callback, msg.node_id, msg.child_id, msg.type, msg.sub_type)
+            if key in self._items:
+                self._items[key] = (callback, msg)
+                return 0
+        else:
+            key = next(self._counter)
+        dropped = 0
+        if len(self._items) >= self.maxsize:
+            dropped = 1
+            if self.policy == POLICY_DROP_NEWEST:
+                self.dropped += dropped
+                return dropped
+            self._items.popitem(last=False)
+        self.dropped += dropped
+        self._items[key] = (callback, msg)
+        return dropped
+
+    def get(self):
+        """Return the oldest callback and msg pair, or None if empty."""
+        if not self._items:
+            return None
+        return self._items.popitem(last=False)[1]
+
+    def clear(self):
+        """Remove all queued events."""
+        self._items.clear()
+
+
+class Dispatcher:
+    """Run event callbacks outside of message handling.
+
+    Events are queued in a bounded event queue and run by up to workers
+    workers. With more than one worker, callbacks for the same node may
+    run out of order.
+    """
+
+    # Subclasses add the methods to start, join and stop the workers.
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, workers=1, maxsize=1000, policy=POLICY_DROP_OLDEST):
+        """Set up dispatcher."""
+        self.workers = workers
+        self.queue = EventQueue(maxsize, policy)
+        self.stats = None
+
+    def dispatch(self, callback, msg):
+        """Queue callback to be called with msg."""
+        raise NotImplementedError
+
+    def _count_dropped(self, dropped):
+        """Log and count dropped events."""
+        if not dropped:
+            return
+        _LOGGER.debug("Event queue is full, dropped %s event", dropped)
+        if self.stats is not None and self.stats.enabled:
+            self.stats.count(COUNTER_EVENTS_DROPPED, amount=dropped)
+
+    def _record(self, start, msg):
+        """Record the duration of a callback since start."""
+        if self.stats is not None and self.stats.enabled:
+            self.stats.record(
+                STAGE_EVENT_CALLBACK, timer() - start, msg.type, msg.sub_type
+            )
+
+
+class SyncDispatcher(Dispatcher):
+    """Run event callbacks in a bounded pool of worker threads."""
+
+    def __init__(self, *args, **kwargs):
+        """Set up dispatcher."""
+        super().__init__(*args, **kwargs)
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._active = 0
+
+    def dispatch(self, callback, msg):
+        """Queue callback to be called with msg in a worker thread."""
+        with self._cond:
+            if not self._threads:
+                self._start()
+            dropped = self.queue.put(callback, msg)
+            self._cond.notify()
+        self._count_dropped(dropped)
+
+    def start(self):
+        """Start the worker threads if not started."""
+        with self._cond:
+            if not self._threads:
+                self._start()
+
+    def _start(self):
+        """Start the worker threads."""
+        self._stop_event.clear()
+        for idx in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"mysensors-dispatch-{idx}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        """Run queued callbacks until stopped."""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.queue or self._stop_event.is_set())
+                if self._stop_event.is_set():
+                    return
+                callback, msg = self.queue.get()
+                self._active += 1
+            start = timer()
+            try:
+                callback(msg)
+            except Exception as exception:  # pylint: disable=broad-except
+                _LOGGER.exception(exception)
+            self._record(start, msg)
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def join(self, timeout=None):
+        """Wait until all queued callbacks have run.
+
+        Return False if timeout passes first.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self.queue and not self._active, timeout
+            )
+
+    def stop(self):
+        """Stop the worker threads and drop queued events."""
+        with self._cond:
+            self._stop_event.set()
+            self.queue.clear()
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+
+class AsyncDispatcher(Dispatcher):
+    """Run event callbacks as tasks in the event loop.
+
+    Coroutine function callbacks are awaited and other callbacks are called
+    in the event loop, or in the default executor if run_in_executor is
+    True. Worker tasks are started on demand, up to workers tasks, and end
+    when the queue is empty. Events dispatched from other threads are
+    handed to the event loop that the dispatcher was started or last used
+    in. Events dispatched before that are run when start is called.
+    """
+
+    def __init__(self, *args, run_in_executor=False, **kwargs):
+        """Set up dispatcher."""
+        super().__init__(*args, **kwargs)
+        self.run_in_executor = run_in_executor
+        self._loop = None
+        self._running = 0
+        self._tasks = set()
+
+    def dispatch(self, callback, msg):
+        """Queue callback to be called with msg in a worker task."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.dispatch, callback, msg)
+            return
+        self._count_dropped(self.queue.put(callback, msg))
+        if loop is not None:
+            self._loop = loop
+            self._spawn(loop)
+
+    def start(self):
+        """Start worker tasks for queued events in the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._spawn(self._loop)
+
+    def _spawn(self, loop):
+        """Start worker tasks for the queued events, up to workers tasks."""
+        while self._running < min(self.workers, len(self.queue)):
+            self._running += 1
+            task = loop.create_task(self._work())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _work(self):
+        """Run queued callbacks until the queue is empty."""
+        loop = asyncio.get_running_loop()
+        try:
+            while self.queue:
+                callback, msg = self.queue.get()
+                start = timer()
+                try:
+                    if inspect.iscoroutinefunction(callback):
+                        await callback(msg)
+                    elif self.run_in_executor:
+                        await loop.run_in_executor(None, callback, msg)
+                    else:
+                        callback(msg)
+                except Exception as exception:  # pylint: disable=broad-except
+                    _LOGGER.exception(exception)
+                self._record(start, msg)
+                # Let other tasks run between callbacks.
+                await asyncio.sleep(0)
+        finally:
+            self._running -= 1
+
+    async def join(self):
+        """Wait until the queue is empty and all worker tasks are done."""
+        self.start()
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    async def stop(self):
+        """Cancel the worker tasks and drop queued events."""
+        self.queue.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
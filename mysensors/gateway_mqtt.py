@@ -1,5 +1,7 @@
 """Implement an MQTT gateway."""
 
+import asyncio
+import functools
 import logging
 
 from mysensors import BaseAsyncGateway, BaseSyncGateway, Gateway, Message
@@ -8,20 +10,151 @@ from .transport import Transport
 
 _LOGGER = logging.getLogger(__name__)
 
+PUBLISH_BATCH_SIZE = 100
+
+
+class TopicMatcher:
+    """Match topics against an MQTT topic filter with + and # wildcards.
+
+    The filter is split once. A filter of a prefix followed only by single
+    level wildcards, like the ones the gateway subscribes to, is matched
+    with one comparison, one slice and one split.
+    """
+
+    # The matcher only prepares the filter for its match method.
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, topic_filter):
+        """Set up topic matcher."""
+        self.topic_filter = topic_filter
+        self._levels = topic_filter.split("/")
+        literal = 0
+        while literal < len(self._levels) and self._levels[literal] not in ("+", "#"):
+            literal += 1
+        self._wildcards = self._levels[literal:]
+        self._start = "/".join(self._levels[:literal] + [""]) if literal else ""
+        self._start_len = len(self._start)
+        self._simple = bool(self._wildcards) and all(
+            level == "+" for level in self._wildcards
+        )
+
+    def match(self, topic):
+        """Return the list of topic levels matched by the wildcards.
+
+        Return None if the topic doesn't match the filter.
+        """
+        if not self._simple:
+            return self._match_levels(topic.split("/"))
+        if not topic.startswith(self._start):
+            return None
+        levels = topic[self._start_len :].split("/")
+        if len(levels) != len(self._wildcards):
+            return None
+        return levels
+
+    def _match_levels(self, topic_levels):
+        """Return the topic levels matched by the wildcards or None."""
+        matched = []
+        for idx, level in enumerate(self._levels):
+            if level == "#":
+                matched.extend(topic_levels[idx:])
+                return matched
+            if idx >= len(topic_levels):
+                return None
+            if level == "+":
+                matched.append(topic_levels[idx])
+            elif level != topic_levels[idx]:
+                return None
+        if len(self._levels) != len(topic_levels):
+            return None
+        return matched
+
+
+_cached_topic_matcher = functools.lru_cache(maxsize=256)(TopicMatcher)
+
+
+def topic_matches(topic_filter, topic):
+    """Return True if topic matches the MQTT topic filter."""
+    return _cached_topic_matcher(topic_filter).match(topic) is not None
+
+
+class TopicIndex:
+    """Index nodes and children to filter topics of a wildcard subscription.
+
+    Topics of message types in always are accepted for all nodes, topics of
+    message types in node_types for known nodes, and topics of message
+    types in child_types for known children. Ids are kept as topic level
+    strings, so a lookup doesn't need to parse the topic.
+    """
+
+    def __init__(self, always, node_types, child_types):
+        """Set up topic index."""
+        self.always = frozenset(always)
+        self.node_types = frozenset(node_types)
+        self.child_types = frozenset(child_types)
+        self._nodes = {}
+
+    def add(self, node_id, child_id=None):
+        """Add a node and optionally one of its children to the index."""
+        children = self._nodes.setdefault(str(node_id), set())
+        if child_id is not None:
+            children.add(str(child_id))
+
+    def clear(self):
+        """Remove all nodes from the index."""
+        self._nodes.clear()
+
+    def match(self, levels):
+        """Return True if the topic levels are for a known node and child."""
+        msg_type = levels[2]
+        if msg_type in self.always:
+            return True
+        children = self._nodes.get(levels[0])
+        if children is None:
+            return False
+        if msg_type in self.node_types:
+            return True
+        return msg_type in self.child_types and levels[1] in children
+
 
 class BaseMQTTGateway(Gateway):
-    """MySensors MQTT client gateway."""
+    """MySensors MQTT client gateway.
+
+    If wildcard_subscription is True, the gateway subscribes to all
+    topics of the in prefix with one subscription, and filters received
+    topics by the nodes and children in a topic index, instead of
+    subscribing to the topics of each node and child.
+    """
 
-    def __init__(self, **kwargs):
+    def __init__(self, wildcard_subscription=False, **kwargs):
         """Set up MQTT client gateway."""
         super().__init__(**kwargs)
         self.const.MessageType.presentation.set_handler(
             self.handlers, self._handle_presentation
         )
+        self.wildcard_subscription = wildcard_subscription
+        message_type = self.const.MessageType
+        self.topic_index = TopicIndex(
+            always=(
+                str(int(message_type.presentation)),
+                str(int(message_type.internal)),
+            ),
+            node_types=(str(int(message_type.stream)),),
+            child_types=(str(int(message_type.set)), str(int(message_type.req))),
+        )
+        self._topic_matcher = None
 
     def init_topics(self):
         """Set up initial subscription of mysensors topics."""
         _LOGGER.info("Setting up initial MQTT topic subscription")
+        if self.wildcard_subscription:
+            self.topic_index.clear()
+            for sensor in self.sensors.values():
+                self.topic_index.add(sensor.sensor_id)
+                for child in sensor.children.values():
+                    self.topic_index.add(sensor.sensor_id, child.id)
+            self.tasks.transport.handle_subscription(["/+/+/+/+/+"])
+            return
         init_topics = [
             "/+/+/0/+/+",
             "/+/+/3/+/+",
@@ -52,6 +185,9 @@ class BaseMQTTGateway(Gateway):
         if msg.child_id == 255 or ret_msg is None:
             return
         # this is a presentation of a child sensor
+        if self.wildcard_subscription:
+            self.topic_index.add(msg.node_id, msg.child_id)
+            return
         topics = [
             f"/{msg.node_id}/{msg.child_id}/{msg_type}/+/+"
             for msg_type in (
@@ -62,35 +198,91 @@ class BaseMQTTGateway(Gateway):
         topics.append(f"/{msg.node_id}/+/{int(self.const.MessageType.stream)}/+/+")
         self.tasks.transport.handle_subscription(topics)
 
+    def _match_topic(self, topic):
+        """Return the topic levels after the in prefix of a subscribed topic.
+
+        Return None if the topic doesn't match.
+        """
+        prefix = self.tasks.transport.in_prefix
+        if self._topic_matcher is None or self._topic_matcher[0] != prefix:
+            self._topic_matcher = prefix, TopicMatcher(f"{prefix}/+/+/+/+/+")
+        matcher = self._topic_matcher[1]
+        topic_levels = matcher.match(topic)
+        if topic_levels is None:
+            return None
+        if self.wildcard_subscription and not self.topic_index.match(topic_levels):
+            return None
+        return topic_levels
+
     def parse_mqtt_to_message(self, topic, payload, qos):
         """Parse a MQTT topic and payload.
 
         Return a mysensors command string.
         """
-        topic_levels = topic.split("/")
-        topic_levels = not_prefix = topic_levels[-5:]
-        prefix_end_idx = topic.find("/".join(not_prefix)) - 1
-        prefix = topic[:prefix_end_idx]
-        if prefix != self.tasks.transport.in_prefix:
+        topic_levels = self._match_topic(topic)
+        if topic_levels is None:
             return None
         if qos and qos > 0:
             ack = "1"
         else:
             ack = "0"
-        topic_levels[3] = ack
-        topic_levels.append(str(payload))
-        return ";".join(topic_levels)
+        node_id, child_id, msg_type, _, sub_type = topic_levels
+        return f"{node_id};{child_id};{msg_type};{ack};{sub_type};{payload}"
+
+    def decode_mqtt(self, topic, payload, qos):
+        """Decode a MQTT topic and payload.
+
+        Return a Message, or None if the topic doesn't match. Like a
+        mysensors command string, the payload is stripped of trailing
+        whitespace and can't hold the delimiter.
+        """
+        topic_levels = self._match_topic(topic)
+        if topic_levels is None:
+            return None
+        node_id, child_id, msg_type, _, sub_type = topic_levels
+        payload = str(payload).rstrip()
+        if ";" in payload:
+            _LOGGER.warning("Not a valid message payload: %s", payload)
+            return None
+        try:
+            return Message(
+                node_id=int(node_id),
+                child_id=int(child_id),
+                type=int(msg_type),
+                ack=1 if qos and qos > 0 else 0,
+                sub_type=int(sub_type),
+                payload=payload,
+            )
+        except ValueError:
+            _LOGGER.warning("Not a valid message topic: %s", topic)
+            return None
 
     def parse_message_to_mqtt(self, data):
-        """Parse a mysensors command string.
+        """Parse a Message or a mysensors command string.
 
         Return a MQTT topic, payload and qos-level as a tuple.
         """
-        msg = Message(data, self)
-        payload = str(msg.payload)
-        msg.payload = ""
+        if isinstance(data, str):
+            node_id, child_id, msg_type, ack, sub_type, payload = data.rstrip().split(
+                ";"
+            )
+        else:
+            msg = data if isinstance(data, Message) else Message(data)
+            node_id, child_id, msg_type, ack, sub_type, payload = (
+                msg.node_id,
+                msg.child_id,
+                msg.type,
+                msg.ack,
+                msg.sub_type,
+                msg.payload,
+            )
+        ack = int(ack)
         # prefix/node/child/type/ack/subtype : payload
-        return f"/{msg.encode('/')}"[:-2], payload, msg.ack
+        return (
+            f"/{int(node_id)}/{int(child_id)}/{int(msg_type)}/{ack}/{int(sub_type)}",
+            str(payload),
+            ack,
+        )
 
     def _get_gateway_id(self):
         """Return a unique id for the gateway."""
@@ -109,6 +301,8 @@ class MQTTGateway(BaseSyncGateway, BaseMQTTGateway):
         in_prefix="",
         out_prefix="",
         retain=True,
+        pub_many_callback=None,
+        sub_many_callback=None,
         **kwargs,
     ):
         """Set up MQTT gateway."""
@@ -119,6 +313,8 @@ class MQTTGateway(BaseSyncGateway, BaseMQTTGateway):
             in_prefix=in_prefix,
             out_prefix=out_prefix,
             retain=retain,
+            pub_many_callback=pub_many_callback,
+            sub_many_callback=sub_many_callback,
         )
         super().__init__(transport, **kwargs)
 
@@ -137,6 +333,8 @@ class AsyncMQTTGateway(BaseAsyncGateway, BaseMQTTGateway):
         in_prefix="",
         out_prefix="",
         retain=True,
+        pub_many_callback=None,
+        sub_many_callback=None,
         **kwargs,
     ):
         """Set up MQTT gateway."""
@@ -147,6 +345,8 @@ class AsyncMQTTGateway(BaseAsyncGateway, BaseMQTTGateway):
             in_prefix=in_prefix,
             out_prefix=out_prefix,
             retain=retain,
+            pub_many_callback=pub_many_callback,
+            sub_many_callback=sub_many_callback,
         )
         super().__init__(transport, **kwargs)
 
@@ -156,9 +356,13 @@ class AsyncMQTTGateway(BaseAsyncGateway, BaseMQTTGateway):
 
 
 class MQTTTransport(Transport):
-    """MySensors MQTT transport."""
+    """MySensors MQTT transport.
 
-    def __init__(
+    The optional batch callbacks are used when many topics are subscribed
+    at once and for messages sent while coalescing.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         gateway,
         pub_callback,
@@ -166,6 +370,9 @@ class MQTTTransport(Transport):
         in_prefix="",
         out_prefix="",
         retain=True,
+        *,
+        pub_many_callback=None,
+        sub_many_callback=None,
     ):
         """Set up MQTT client gateway."""
         super().__init__(gateway, None)
@@ -173,6 +380,12 @@ class MQTTTransport(Transport):
         self._pub_callback = pub_callback
         # Should accept topic, function callback for receive and qos.
         self._sub_callback = sub_callback
+        # Should accept a list of topic, payload, qos and retain tuples.
+        self._pub_many_callback = pub_many_callback
+        # Should accept a list of topic and qos tuples and a function
+        # callback for receive.
+        self._sub_many_callback = sub_many_callback
+        self._publish_buffer = []
         self.in_prefix = in_prefix  # prefix for topics gw -> controller
         self.out_prefix = out_prefix  # prefix for topics controller -> gw
         self._retain = retain  # flag to publish with retain
@@ -187,9 +400,14 @@ class MQTTTransport(Transport):
         """
 
     def handle_subscription(self, topics):
-        """Handle subscription of topics."""
+        """Handle subscription of topics.
+
+        Many topics are subscribed with one call of the subscribe many
+        callback if set.
+        """
         if not isinstance(topics, list):
             topics = [topics]
+        subscriptions = []
         for topic in topics:
             topic = self.in_prefix + topic
             topic_levels = topic.split("/")
@@ -197,6 +415,17 @@ class MQTTTransport(Transport):
                 qos = int(topic_levels[-2])
             except ValueError:
                 qos = 0
+            subscriptions.append((topic, qos))
+        if self._sub_many_callback is not None and len(subscriptions) > 1:
+            try:
+                _LOGGER.debug("Subscribing to %s topics", len(subscriptions))
+                self._sub_many_callback(subscriptions, self.recv)
+            except Exception as exception:  # pylint: disable=broad-except
+                _LOGGER.exception(
+                    "Subscribe to %s topics failed: %s", len(subscriptions), exception
+                )
+            return
+        for topic, qos in subscriptions:
             try:
                 _LOGGER.debug("Subscribing to: %s, qos: %s", topic, qos)
                 self._sub_callback(topic, self.recv, qos)
@@ -208,24 +437,46 @@ class MQTTTransport(Transport):
 
         Call this method when a message is received from the MQTT broker.
         """
-        data = self.gateway.parse_mqtt_to_message(topic, payload, qos)
-        if data is None:
+        msg = self.gateway.decode_mqtt(topic, payload, qos)
+        if msg is None:
             return
-        _LOGGER.debug("Receiving %s", data)
-        self.gateway.tasks.add_job(self.gateway.logic, data)
+        _LOGGER.debug("Receiving %s", msg)
+        self.gateway.tasks.add_job(self.gateway.logic, msg)
 
     def send(self, message):
-        """Publish a command string to the gateway via MQTT."""
+        """Publish a Message or command string to the gateway via MQTT.
+
+        Messages sent while coalescing are published together with the
+        publish many callback if set.
+        """
         if not message:
             return
         topic, payload, qos = self.gateway.parse_message_to_mqtt(message)
         topic = self.out_prefix + topic
+        self._count_sent(message)
+        _LOGGER.debug("Publishing %s: %s", topic, payload)
+        if self._pub_many_callback is not None and self._coalesce_depth:
+            self._publish_buffer.append((topic, payload, qos, self._retain))
+            if len(self._publish_buffer) >= PUBLISH_BATCH_SIZE:
+                self.flush()
+            return
         try:
-            _LOGGER.debug("Publishing %s", message.strip())
             self._pub_callback(topic, payload, qos, self._retain)
         except Exception as exception:  # pylint: disable=broad-except
             _LOGGER.exception("Publish to %s failed: %s", topic, exception)
 
+    def flush(self):
+        """Publish all buffered messages with one call."""
+        if not self._publish_buffer:
+            return
+        messages, self._publish_buffer = self._publish_buffer, []
+        try:
+            self._pub_many_callback(messages)
+        except Exception as exception:  # pylint: disable=broad-except
+            _LOGGER.exception(
+                "Publish of %s messages failed: %s", len(messages), exception
+            )
+
 
 class MQTTSyncTransport(MQTTTransport):
     """TCP sync version of transport class."""
@@ -241,3 +492,25 @@ class MQTTAsyncTransport(MQTTTransport):
     async def connect(self):
         """Connect to the transport."""
         self.gateway.init_topics()
+
+    def send(self, message):
+        """Publish a Message or command string to the gateway via MQTT.
+
+        Messages sent in the same event loop iteration are published together
+        with the publish many callback if set.
+        """
+        if message and self._pub_many_callback is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None and not self._coalesce_depth:
+                self._coalesce_depth += 1
+                loop.call_soon(self._end_coalesce)
+        super().send(message)
+
+    def _end_coalesce(self):
+        """End coalescing of messages sent in the last loop iteration."""
+        self._coalesce_depth -= 1
+        if not self._coalesce_depth:
+            self.flush()
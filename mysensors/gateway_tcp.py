@@ -3,7 +3,7 @@
 import asyncio
 import ipaddress
 import logging
-import select
+import selectors
 import socket
 import time
 
@@ -15,6 +15,10 @@ from .transport import AsyncTransport, BaseMySensorsProtocol, SyncTransport
 
 _LOGGER = logging.getLogger(__name__)
 
+TCP_CHECK_INTERVAL = 1.0
+TCP_RECV_SIZE = 65536
+TCP_WRITE_TIMEOUT = 10.0
+
 
 class BaseTCPGateway(Gateway):
     """MySensors base TCP gateway."""
@@ -197,9 +201,12 @@ async def async_connect(transport):
 class AsyncTCPMySensorsProtocol(BaseMySensorsProtocol, asyncio.Protocol):
     """Async TCP protocol class."""
 
+    write_ready_factory = asyncio.Event
+
     def connection_lost(self, exc):
         """Handle lost connection."""
         _LOGGER.debug("Connection lost with %s", self.transport)
+        self.write_ready.set()
         if self.gateway.cancel_check_conn:
             self.gateway.cancel_check_conn()
             self.gateway.cancel_check_conn = None
@@ -219,19 +226,41 @@ class TCPTransport(serial.threaded.ReaderThread):
         # make socket non blocking
         self.sock.setblocking(False)
         self._check_connection = check_conn
-
-    def _check_socket(self, timeout=None):
-        """Check if socket is readable/writable."""
-        sock = self.sock
-        available_socks = select.select([sock], [sock], [sock], timeout)
-        if available_socks[2]:
-            raise OSError
-        return available_socks
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.sock, selectors.EVENT_READ)
 
     def write(self, data):
-        """Write data to the socket."""
+        """Write data to the socket.
+
+        Pause writing on the protocol while waiting for the socket to
+        accept more data.
+        """
+        protocol = self.protocol
+        paused = False
+        selector = None
         with self._lock:
-            self.sock.sendall(data)
+            view = memoryview(data)
+            try:
+                while view:
+                    try:
+                        view = view[self.sock.send(view) :]
+                    except BlockingIOError:
+                        pass
+                    if not view:
+                        break
+                    if selector is None:
+                        if protocol is not None:
+                            protocol.pause_writing()
+                            paused = True
+                        selector = selectors.DefaultSelector()
+                        selector.register(self.sock, selectors.EVENT_WRITE)
+                    if not selector.select(TCP_WRITE_TIMEOUT):
+                        raise OSError("Timed out writing to gateway")
+            finally:
+                if selector is not None:
+                    selector.close()
+                if paused:
+                    protocol.resume_writing()
 
     def run(self):
         """Transport thread loop."""
@@ -243,31 +272,37 @@ class TCPTransport(serial.threaded.ReaderThread):
             self.alive = False
             self.protocol.connection_lost(exc)
             self._connection_made.set()
+            self._selector.close()
             return
         error = None
         self._connection_made.set()
+        next_check = time.monotonic()
         while self.alive:
             data = None
             try:
-                available_socks = self._check_socket()
-                if available_socks[0]:
-                    data = self.sock.recv(120)
+                events = self._selector.select(max(next_check - time.monotonic(), 0))
+                if events:
+                    data = self.sock.recv(TCP_RECV_SIZE)
+                    if not data:
+                        raise OSError(f"Connection closed by {self.sock.getpeername()}")
             except Exception as exc:
                 error = exc
                 break
-            else:
-                if data:
-                    try:
-                        self.protocol.data_received(data)
-                    except Exception as exc:
-                        error = exc
-                        break
+            if data:
+                try:
+                    self.protocol.data_received(data)
+                except Exception as exc:
+                    error = exc
+                    break
+            if time.monotonic() < next_check:
+                continue
             try:
                 self._check_connection()
             except OSError as exc:
                 error = exc
                 break
-            time.sleep(0.02)  # short sleep to avoid burning 100% cpu
+            next_check = time.monotonic() + TCP_CHECK_INTERVAL
         self.alive = False
+        self._selector.close()
         self.protocol.connection_lost(error)
         self.protocol = None
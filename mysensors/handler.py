@@ -5,6 +5,8 @@ import logging
 import time
 
 from .const import SYSTEM_CHILD_ID
+from .scheduler import PRIORITY_BULK
+from .stats import COUNTER_OTA_BLOCKS
 from .util import Registry
 
 _LOGGER = logging.getLogger(__name__)
@@ -20,7 +22,7 @@ def handle_smartsleep(msg):
 
     while sensor.queue:
         job = sensor.queue.popleft()
-        msg.gateway.tasks.add_job(str, job)
+        msg.gateway.tasks.add_job(str, job, priority=PRIORITY_BULK)
 
     for child in sensor.children.values():
         new_child_state = sensor.new_state.get(child.id)
@@ -40,7 +42,7 @@ def handle_smartsleep(msg):
             if msg_to_send is None:
                 continue
 
-            msg.gateway.tasks.add_job(msg_to_send.encode)
+            msg.gateway.tasks.add_job(msg_to_send.encode, priority=PRIORITY_BULK)
 
 
 @HANDLERS.register("presentation")
@@ -79,6 +81,10 @@ def handle_set(msg):
         return None
 
     sensor = msg.gateway.sensors[msg.node_id]
+    coalescer = msg.gateway.update_coalescer
+    previous = None
+    if coalescer is not None:
+        previous = sensor.children[msg.child_id].values.get(msg.sub_type)
 
     sensor.update_child_value(
         msg.child_id,
@@ -86,7 +92,8 @@ def handle_set(msg):
         msg.payload,
     )
 
-    msg.gateway.alert(msg)
+    if coalescer is None or coalescer.update(msg, previous):
+        msg.gateway.alert(msg)
 
     # Check if reboot is true
     if sensor.reboot:
@@ -153,7 +160,10 @@ def handle_firmware_config_request(msg):
 @HANDLERS.register("ST_FIRMWARE_REQUEST")
 def handle_firmware_request(msg):
     """Process a firmware request message."""
-    return msg.gateway.tasks.ota.respond_fw(msg)
+    resp = msg.gateway.tasks.ota.respond_fw(msg)
+    if resp is not None and msg.gateway.stats.enabled:
+        msg.gateway.stats.count(COUNTER_OTA_BLOCKS)
+    return resp
 
 
 @HANDLERS.register("I_ID_REQUEST")
@@ -0,0 +1,132 @@
+"""Host many async gateways in one event loop."""
+
+import asyncio
+from collections.abc import Mapping
+
+from . import BaseAsyncGateway
+from .metrics import MetricsExporter
+
+
+class HubSensors(Mapping):
+    """Represent the sensors of all gateways of a hub.
+
+    Sensors are keyed by gateway id and node id. The view reflects the
+    current sensors of the gateways.
+    """
+
+    def __init__(self, gateways):
+        """Set up sensors view."""
+        self._gateways = gateways
+
+    def __getitem__(self, key):
+        """Return the sensor of a gateway id and node id pair."""
+        try:
+            gateway_id, node_id = key
+            return self._gateways[gateway_id].sensors[node_id]
+        except (KeyError, TypeError, ValueError):
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        """Iterate over gateway id and node id pairs."""
+        for gateway_id, gateway in list(self._gateways.items()):
+            for node_id in list(gateway.sensors):
+                yield gateway_id, node_id
+
+    def __len__(self):
+        """Return the number of sensors of all gateways."""
+        return sum(len(gateway.sensors) for gateway in self._gateways.values())
+
+
+class HubMetricsExporter(MetricsExporter):
+    """Serve the metrics of all gateways of a hub, labelled by gateway id."""
+
+    def _gateways(self):
+        """Return gateway id and gateway pairs to export."""
+        return list(self.gateway.gateways.items())
+
+
+class GatewayHub:
+    """Host many async gateways in the event loop that runs the hub.
+
+    Gateways are added with a gateway id before the hub is started. They
+    share the event loop, one task that saves the persistence files of all
+    gateways every save_interval seconds and, if metrics_port is set, one
+    metrics exporter. Gateways of the same protocol version already share
+    their constants and message validators.
+    """
+
+    def __init__(self, metrics_port=None, save_interval=10.0):
+        """Set up hub."""
+        self.gateways = {}
+        self.sensors = HubSensors(self.gateways)
+        self.save_interval = save_interval
+        self.metrics = None
+        if metrics_port is not None:
+            self.metrics = HubMetricsExporter(self, port=metrics_port)
+        self._save_task = None
+
+    def add_gateway(self, gateway_id, gateway):
+        """Add an async gateway with gateway_id to the hub."""
+        if not isinstance(gateway, BaseAsyncGateway):
+            raise TypeError(f"Not an async gateway: {gateway}")
+        if gateway_id in self.gateways:
+            raise ValueError(f"Gateway id {gateway_id} is already in use")
+        persistence = gateway.tasks.persistence
+        if persistence and any(
+            other.tasks.persistence
+            and other.tasks.persistence.persistence_file == persistence.persistence_file
+            for other in self.gateways.values()
+        ):
+            raise ValueError(
+                f"Persistence file {persistence.persistence_file} is already in use"
+            )
+        if self.metrics:
+            gateway.stats.enabled = True
+        self.gateways[gateway_id] = gateway
+
+    async def start_persistence(self):
+        """Load the persistence files of all gateways and schedule saving."""
+        await asyncio.gather(
+            *(
+                gateway.start_persistence(schedule_save=False)
+                for gateway in self.gateways.values()
+            )
+        )
+        loop = asyncio.get_running_loop()
+        self._save_task = loop.create_task(self._save_on_schedule())
+
+    async def start(self):
+        """Start all gateways and the metrics exporter."""
+        if self.metrics:
+            self.metrics.start()
+        await asyncio.gather(*(gateway.start() for gateway in self.gateways.values()))
+
+    async def stop(self):
+        """Stop all gateways and the metrics exporter.
+
+        The gateways save their persistence files when stopped.
+        """
+        if self._save_task is not None:
+            self._save_task.cancel()
+            await self._save_task
+            self._save_task = None
+        await asyncio.gather(*(gateway.stop() for gateway in self.gateways.values()))
+        if self.metrics:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.metrics.stop)
+
+    def save_sensors(self):
+        """Save the persistence files of all gateways with persistence."""
+        for gateway in list(self.gateways.values()):
+            if gateway.tasks.persistence:
+                gateway.tasks.persistence.save_sensors()
+
+    async def _save_on_schedule(self):
+        """Save sensors and sleep until next save."""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.save_sensors)
+                await asyncio.sleep(self.save_interval)
+            except asyncio.CancelledError:
+                break
@@ -9,11 +9,118 @@ from .const import SYSTEM_CHILD_ID, get_const
 _LOGGER = logging.getLogger(__name__)
 
 BROADCAST_ID = 255
+MESSAGE_ATTRS = ("node_id", "child_id", "type", "ack", "sub_type", "payload")
+ENCODING = "utf-8"
+
+LOADED_VALIDATORS = {}
+
+
+def get_validator(protocol_version):
+    """Return the compiled message validator for the protocol_version."""
+    validator = LOADED_VALIDATORS.get(protocol_version)
+    if validator is not None:
+        return validator
+    const = get_const(protocol_version)
+    validator = next(
+        (loaded for loaded in LOADED_VALIDATORS.values() if loaded.const is const),
+        None,
+    )
+    if validator is None:
+        validator = MessageValidator(const)
+    LOADED_VALIDATORS[protocol_version] = validator  # Cache the validator
+    return validator
+
+
+class MessageValidator:
+    """Validate messages using tables precompiled from a const module.
+
+    The tables hold the valid message type and sub-type combinations and
+    the payload validator for each combination. A message that passes the
+    tables is accepted with a few dict and set lookups. Anything else is
+    handed back to the full schema in Message.validate, which decides if
+    the message is invalid and produces the error.
+    """
+
+    # A validator is a callable table, validate is its only entry point.
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, const):
+        """Set up the validator tables."""
+        self.const = const
+        internal = const.MessageType.internal
+        stream = const.MessageType.stream
+        system_types = {
+            const.MessageType.presentation,
+            internal,
+            stream,
+        }
+        id_sub_types = {const.Internal.I_ID_REQUEST, const.Internal.I_ID_RESPONSE}
+        # (type, sub_type, child_is_system): (check_child_range, payload validator)
+        self.valid_payloads = {}
+        for msg_type, sub_types in const.VALID_MESSAGE_TYPES.items():
+            for sub_type in sub_types:
+                valid_payload = vol.Schema(
+                    const.VALID_PAYLOADS.get(msg_type, {}).get(sub_type, "")
+                )
+                for child_is_system in (False, True):
+                    if child_is_system and msg_type not in system_types:
+                        continue
+                    if msg_type == internal and sub_type in id_sub_types:
+                        check_child_range = False
+                    elif msg_type in (internal, stream):
+                        if not child_is_system:
+                            continue
+                        check_child_range = False
+                    else:
+                        check_child_range = not child_is_system
+                    self.valid_payloads[
+                        msg_type.value, sub_type.value, child_is_system
+                    ] = (check_child_range, valid_payload)
+
+    def validate(self, msg):
+        """Return a validated copy of msg or None if not accepted by the tables."""
+        node_id = msg.node_id
+        child_id = msg.child_id
+        msg_type = msg.type
+        ack = msg.ack
+        sub_type = msg.sub_type
+        payload = msg.payload
+        if (
+            not isinstance(node_id, int)
+            or not isinstance(child_id, int)
+            or not isinstance(msg_type, int)
+            or not isinstance(sub_type, int)
+        ):
+            return None
+        if payload is None or ack not in (0, 1) or not 0 <= node_id <= BROADCAST_ID:
+            return None
+        entry = self.valid_payloads.get(
+            (msg_type, sub_type, child_id == SYSTEM_CHILD_ID)
+        )
+        if entry is None:
+            return None
+        check_child_range, valid_payload = entry
+        if check_child_range and not 0 <= child_id <= SYSTEM_CHILD_ID:
+            return None
+        try:
+            payload = valid_payload(payload)
+        except vol.Invalid:
+            return None
+        return msg.__class__(
+            node_id=int(node_id),
+            child_id=int(child_id),
+            type=int(msg_type),
+            ack=ack,
+            sub_type=sub_type,
+            payload=payload,
+        )
 
 
 class Message:
     """Represent a message from the gateway."""
 
+    __slots__ = (*MESSAGE_ATTRS, "gateway")
+
     def __init__(self, data=None, gateway=None, **kwargs):
         """Set up message."""
         self.node_id = kwargs.get("node_id", 0)
@@ -33,9 +140,20 @@ class Message:
             f'{self.ack};{self.sub_type};{self.payload}">'
         )
 
+    def as_dict(self):
+        """Return a dict with the message attributes."""
+        return {attr: getattr(self, attr) for attr in MESSAGE_ATTRS}
+
     def copy(self, **kwargs):
         """Copy a message, optionally replace attributes with kwargs."""
-        msg = Message(self.encode(), self.gateway)
+        msg = self.__class__.__new__(self.__class__)
+        msg.node_id = int(self.node_id)
+        msg.child_id = int(self.child_id)
+        msg.type = int(self.type)
+        msg.ack = int(self.ack)
+        msg.sub_type = int(self.sub_type)
+        msg.payload = str(self.payload)
+        msg.gateway = self.gateway
         for key, val in kwargs.items():
             setattr(msg, key, val)
         return msg
@@ -47,13 +165,30 @@ class Message:
         return self
 
     def decode(self, data, delimiter=";"):
-        """Decode a message from command string."""
+        """Decode a message from command string.
+
+        Data can also be bytes, bytearray or memoryview, as received from the
+        transport. Then only the payload is decoded to text. A memoryview is
+        copied to bytes once, to split it.
+        """
         try:
-            list_data = data.rstrip().split(delimiter)
-            self.payload = list_data.pop()
-            self.node_id, self.child_id, self.type, self.ack, self.sub_type = [
-                int(f) for f in list_data
-            ]
+            if isinstance(data, str):
+                node_id, child_id, msg_type, ack, sub_type, payload = (
+                    data.rstrip().split(delimiter)
+                )
+            else:
+                if isinstance(data, memoryview):
+                    data = data.tobytes()
+                node_id, child_id, msg_type, ack, sub_type, payload = (
+                    data.rstrip().split(delimiter.encode())
+                )
+                payload = payload.decode(ENCODING, "replace")
+            self.node_id = int(node_id)
+            self.child_id = int(child_id)
+            self.type = int(msg_type)
+            self.ack = int(ack)
+            self.sub_type = int(sub_type)
+            self.payload = payload
         except ValueError:
             _LOGGER.warning(
                 "Error decoding message from gateway, bad data received: %s",
@@ -65,30 +200,50 @@ class Message:
         """Encode a command string from message."""
         try:
             return (
-                delimiter.join(
-                    [
-                        str(f)
-                        for f in [
-                            int(self.node_id),
-                            int(self.child_id),
-                            int(self.type),
-                            int(self.ack),
-                            int(self.sub_type),
-                            self.payload,
-                        ]
-                    ]
-                )
-                + "\n"
+                f"{int(self.node_id)}{delimiter}{int(self.child_id)}{delimiter}"
+                f"{int(self.type)}{delimiter}{int(self.ack)}{delimiter}"
+                f"{int(self.sub_type)}{delimiter}{self.payload!s}\n"
             )
         except ValueError:
             _LOGGER.error("Error encoding message to gateway")
             return None
 
+    def encode_into(self, buffer, delimiter=b";"):
+        """Append the encoded command bytes of message to a bytearray.
+
+        Return the buffer, or None if the message can not be encoded.
+        """
+        try:
+            buffer += b"%d%b%d%b%d%b%d%b%d%b%b\n" % (
+                int(self.node_id),
+                delimiter,
+                int(self.child_id),
+                delimiter,
+                int(self.type),
+                delimiter,
+                int(self.ack),
+                delimiter,
+                int(self.sub_type),
+                delimiter,
+                str(self.payload).encode(ENCODING),
+            )
+        except ValueError:
+            _LOGGER.error("Error encoding message to gateway")
+            return None
+        return buffer
+
     def validate(self, protocol_version):
         """Validate message."""
         if self.gateway is not None:
             _LOGGER.warning("Can not validate message if Message.gateway is set")
             return None
+        valid = get_validator(protocol_version).validate(self)
+        if valid is not None:
+            return valid
+        return self._validate_schema(protocol_version)
+
+    def _validate_schema(self, protocol_version):
+        """Validate message against the full schema."""
         const = get_const(protocol_version)
         valid_node_ids = vol.All(
             vol.Coerce(int),
@@ -0,0 +1,247 @@
+"""Export gateway metrics as OpenMetrics text over HTTP."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import threading
+
+from .stats import (
+    BUCKETS,
+    COUNTER_DECODE_FAILURES,
+    COUNTER_EVENTS_DROPPED,
+    COUNTER_MESSAGES_SENT,
+    COUNTER_OTA_BLOCKS,
+    COUNTER_RECONNECTS,
+    COUNTER_UPDATES_COALESCED,
+    COUNTER_VALIDATION_FAILURES,
+    STAGE_DECODE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+METRICS_PATH = "/metrics"
+PREFIX = "mysensors"
+
+# Counter name in gateway stats, metric name and help text.
+COUNTERS = (
+    (COUNTER_MESSAGES_SENT, "messages_sent", "Messages sent to the gateway."),
+    (COUNTER_DECODE_FAILURES, "decode_failures", "Received lines not decoded."),
+    (
+        COUNTER_VALIDATION_FAILURES,
+        "validation_failures",
+        "Received messages that failed validation.",
+    ),
+    (COUNTER_RECONNECTS, "reconnects", "Reconnects of the transport."),
+    (COUNTER_OTA_BLOCKS, "ota_blocks_served", "Firmware blocks sent to nodes."),
+    (COUNTER_EVENTS_DROPPED, "events_dropped", "Event callbacks dropped."),
+    (
+        COUNTER_UPDATES_COALESCED,
+        "updates_coalesced",
+        "Child value updates that didn't alert.",
+    ),
+)
+
+
+def _labels(**labels):
+    """Return labels formatted as an OpenMetrics label set."""
+    items = [(name, value) for name, value in labels.items() if value is not None]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+def _float(value):
+    """Return a float formatted for OpenMetrics."""
+    return repr(float(value))
+
+
+class MetricsExporter:
+    """Serve gateway metrics as OpenMetrics text from a local HTTP endpoint.
+
+    The exporter enables recording of gateway stats. The server runs in a
+    thread, so it can serve both sync and async gateways. Port 0 picks a
+    free port, see server_address.
+    """
+
+    def __init__(self, gateway, host="127.0.0.1", port=9464):
+        """Set up metrics exporter."""
+        self.gateway = gateway
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+        for _, exported in self._gateways():
+            exported.stats.enabled = True
+
+    @property
+    def server_address(self):
+        """Return the host and port that the server is bound to."""
+        if self._server is None:
+            return None
+        return self._server.server_address[:2]
+
+    def start(self):
+        """Start serving metrics."""
+        if self._server is not None:
+            return
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            """Handle metrics requests."""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Respond with metrics."""
+                if self.path.split("?", 1)[0] != METRICS_PATH:
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                """Log requests at debug level."""
+                _LOGGER.debug(format, *args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mysensors-metrics", daemon=True
+        )
+        self._thread.start()
+        _LOGGER.info("Serving metrics at %s:%s", *self.server_address)
+
+    def stop(self):
+        """Stop serving metrics."""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def render(self):
+        """Return the gateway metrics as OpenMetrics text."""
+        gateways = []
+        for gateway_id, gateway in self._gateways():
+            stats = gateway.stats
+            counters = sorted(stats.counters().items(), key=_sort_key)
+            histograms = sorted(stats.histograms().items(), key=_sort_key)
+            gateways.append((gateway_id, gateway, counters, histograms))
+        lines = []
+        _render_received(lines, gateways)
+        _render_counters(lines, gateways)
+        _render_queues(lines, gateways)
+        _render_stages(lines, gateways)
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def _gateways(self):
+        """Return gateway id and gateway pairs to export.
+
+        The gateway id labels the metrics of a gateway, unless it's None.
+        """
+        return [(None, self.gateway)]
+
+
+def _family(lines, name, metric_type, help_text):
+    """Append the type and help lines of a metric family to lines."""
+    lines.append(f"# TYPE {PREFIX}_{name} {metric_type}")
+    lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+
+
+def _render_received(lines, gateways):
+    """Append the received messages counter to lines."""
+    _family(
+        lines, "messages_received", "counter", "Messages received from the gateway."
+    )
+    for gateway_id, _, _, histograms in gateways:
+        for (stage, msg_type, sub_type), histogram in histograms:
+            if stage == STAGE_DECODE and msg_type is not None:
+                labels = _labels(gateway=gateway_id, type=msg_type, sub_type=sub_type)
+                lines.append(
+                    f"{PREFIX}_messages_received_total{labels} {histogram.count}"
+                )
+
+
+def _render_counters(lines, gateways):
+    """Append the counters of gateway stats to lines."""
+    for key, name, help_text in COUNTERS:
+        _family(lines, name, "counter", help_text)
+        for gateway_id, _, counters, _ in gateways:
+            for (counter, msg_type, sub_type), value in counters:
+                if counter == key:
+                    labels = _labels(
+                        gateway=gateway_id, type=msg_type, sub_type=sub_type
+                    )
+                    lines.append(f"{PREFIX}_{name}_total{labels} {value}")
+
+
+def _render_queues(lines, gateways):
+    """Append the queue gauges to lines."""
+    _family(lines, "queue_depth", "gauge", "Jobs waiting in the gateway task queue.")
+    for gateway_id, gateway, _, _ in gateways:
+        labels = _labels(gateway=gateway_id)
+        lines.append(f"{PREFIX}_queue_depth{labels} {len(gateway.tasks.queue)}")
+    schedulers = [
+        (gateway_id, gateway.tasks.scheduler)
+        for gateway_id, gateway, _, _ in gateways
+        if gateway.tasks.scheduler is not None
+    ]
+    if schedulers:
+        _family(
+            lines,
+            "scheduler_queue_depth",
+            "gauge",
+            "Messages waiting in the outbound scheduler.",
+        )
+    for gateway_id, scheduler in schedulers:
+        labels = _labels(gateway=gateway_id)
+        lines.append(f"{PREFIX}_scheduler_queue_depth{labels} {len(scheduler)}")
+    _family(
+        lines,
+        "smart_sleep_queue_size",
+        "gauge",
+        "Messages queued for smart sleep nodes.",
+    )
+    for gateway_id, gateway, _, _ in gateways:
+        for sensor in list(gateway.sensors.values()):
+            if sensor.is_smart_sleep_node or sensor.queue:
+                labels = _labels(gateway=gateway_id, node_id=sensor.sensor_id)
+                lines.append(
+                    f"{PREFIX}_smart_sleep_queue_size{labels} {len(sensor.queue)}"
+                )
+
+
+def _render_stages(lines, gateways):
+    """Append the stage duration histograms to lines."""
+    _family(
+        lines,
+        "stage_duration_seconds",
+        "histogram",
+        "Time spent in stages of message handling.",
+    )
+    name = f"{PREFIX}_stage_duration_seconds"
+    for gateway_id, _, _, histograms in gateways:
+        for (stage, msg_type, _), histogram in histograms:
+            if msg_type is not None:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                labels = _labels(gateway=gateway_id, stage=stage, le=_float(bound))
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _labels(gateway=gateway_id, stage=stage, le="+Inf")
+            lines.append(f"{name}_bucket{labels} {histogram.count}")
+            labels = _labels(gateway=gateway_id, stage=stage)
+            lines.append(f"{name}_count{labels} {histogram.count}")
+            lines.append(f"{name}_sum{labels} {_float(histogram.sum)}")
+
+
+def _sort_key(item):
+    """Return a sort key for items keyed by name, message type and sub type."""
+    (name, msg_type, sub_type), _ = item
+    return name, msg_type is not None, msg_type or 0, sub_type or 0
@@ -4,19 +4,87 @@ import json
 import logging
 import os
 import pickle
+import sqlite3
+import threading
+from timeit import default_timer as timer
 
 from .sensor import ChildSensor, Sensor
+from .stats import STAGE_PERSISTENCE_SAVE
 
 _LOGGER = logging.getLogger(__name__)
 
+JOURNAL_MIN_RECORDS = 100
+MIGRATE_EXTENSIONS = (".pickle", ".json")
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensors (
+    sensor_id INTEGER PRIMARY KEY,
+    type INTEGER,
+    sketch_name TEXT,
+    sketch_version TEXT,
+    battery_level INTEGER,
+    protocol_version TEXT,
+    heartbeat INTEGER
+);
+CREATE TABLE IF NOT EXISTS children (
+    sensor_id INTEGER NOT NULL,
+    child_id INTEGER NOT NULL,
+    type INTEGER,
+    description TEXT,
+    PRIMARY KEY (sensor_id, child_id)
+);
+CREATE TABLE IF NOT EXISTS child_values (
+    sensor_id INTEGER NOT NULL,
+    child_id INTEGER NOT NULL,
+    value_type INTEGER NOT NULL,
+    value TEXT,
+    PRIMARY KEY (sensor_id, child_id, value_type)
+);
+"""
+SQLITE_UPSERT_SENSOR = """
+INSERT INTO sensors VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (sensor_id) DO UPDATE SET
+    type = excluded.type,
+    sketch_name = excluded.sketch_name,
+    sketch_version = excluded.sketch_version,
+    battery_level = excluded.battery_level,
+    protocol_version = excluded.protocol_version,
+    heartbeat = excluded.heartbeat
+"""
+SQLITE_UPSERT_CHILD = """
+INSERT INTO children VALUES (?, ?, ?, ?)
+ON CONFLICT (sensor_id, child_id) DO UPDATE SET
+    type = excluded.type,
+    description = excluded.description
+"""
+SQLITE_UPSERT_VALUE = """
+INSERT INTO child_values VALUES (?, ?, ?, ?)
+ON CONFLICT (sensor_id, child_id, value_type) DO UPDATE SET
+    value = excluded.value
+"""
+
 
 class Persistence:
-    """Organize persistence file saving and loading."""
+    """Organize persistence file saving and loading.
+
+    Files that support appending only get the nodes, children and values
+    changed since the last save, as reported by the change tracker in
+    changes. Without a change
+    tracker, every save is a full snapshot.
+    """
+
+    # pylint: disable=too-many-instance-attributes
 
     def __init__(self, sensors, schedule_factory, persistence_file="mysensors.pickle"):
         """Set up Persistence instance."""
         self._sensors = sensors
+        self._journal_records = 0
+        self._lock = threading.Lock()
+        self._token = 0
+        self.changes = None
+        self.need_snapshot = False
         self.need_save = True
+        self.stats = None
         self.persistence_file = persistence_file
         self.persistence_bak = f"{self.persistence_file}.bak"
         self.schedule_save_sensors = schedule_factory(self.save_sensors)
@@ -45,18 +113,280 @@ class Persistence:
         with open(filename, "r", encoding="utf-8") as file_handle:
             self._sensors.update(json.load(file_handle, cls=MySensorsJSONDecoder))
 
+    def _save_journal(self, filename):
+        """Save a snapshot of all sensors to journal file."""
+        with open(filename, "w", encoding="utf-8") as file_handle:
+            json.dump(self._sensors, file_handle, cls=MySensorsJSONEncoder)
+            file_handle.write("\n")
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+        self._journal_records = 0
+
+    def _append_journal(self, filename, changes):
+        """Append records of the changed nodes, children and values to journal file.
+
+        Node records come before child records and child records before value
+        records, so that a record is appended after the records it needs.
+        """
+        records = []
+        for change in sorted(changes, key=_change_level):
+            record = self._journal_record(*change)
+            if record is not None:
+                records.append(json.dumps(record) + "\n")
+        if not records:
+            return
+        with open(filename, "a", encoding="utf-8") as file_handle:
+            file_handle.writelines(records)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+        self._journal_records += len(records)
+
+    def _journal_record(self, node_id, child_id, value_type):
+        """Return a journal record of the current state of a change, or None."""
+        sensor = self._sensors.get(node_id)
+        if sensor is None:
+            return None
+        if child_id is None:
+            return {
+                "node_id": node_id,
+                "type": sensor.type,
+                "sketch_name": sensor.sketch_name,
+                "sketch_version": sensor.sketch_version,
+                "battery_level": sensor.battery_level,
+                "protocol_version": sensor.protocol_version,
+                "heartbeat": sensor.heartbeat,
+            }
+        child = sensor.children.get(child_id)
+        if child is None:
+            return None
+        if value_type is None:
+            return {
+                "node_id": node_id,
+                "child_id": child_id,
+                "type": child.type,
+                "description": child.description,
+            }
+        if value_type not in child.values:
+            return None
+        return {
+            "node_id": node_id,
+            "child_id": child_id,
+            "value_type": value_type,
+            "value": child.values[value_type],
+        }
+
+    def _load_journal(self, filename):
+        """Load sensors from journal file.
+
+        The first line holds a snapshot of all sensors and each following
+        line holds a later state of a node, a child or a child value.
+        """
+        with open(filename, "r", encoding="utf-8") as file_handle:
+            lines = file_handle.readlines()
+        if not lines:
+            raise EOFError(f"Empty journal file {filename}")
+        self._journal_records = 0
+        for line_no, line in enumerate(lines, 1):
+            try:
+                record = json.loads(line, cls=MySensorsJSONDecoder)
+            except ValueError:
+                if line_no < len(lines):
+                    raise
+                # The last record may be cut short by a crash during append.
+                _LOGGER.warning("Skipping incomplete last record in %s", filename)
+                break
+            if line_no == 1:
+                self._sensors.update(record)
+                continue
+            self._journal_records += 1
+            if isinstance(record, Sensor):
+                # Journals of earlier versions hold whole sensors.
+                self._sensors[record.sensor_id] = record
+            else:
+                self._replay_journal_record(record)
+
+    def _replay_journal_record(self, record):
+        """Apply a node, child or child value record to the sensors."""
+        node_id = record.pop("node_id")
+        child_id = record.pop("child_id", None)
+        if child_id is None:
+            sensor = self._sensors.setdefault(node_id, Sensor(node_id))
+            for key, val in record.items():
+                setattr(sensor, key, val)
+            return
+        sensor = self._sensors.get(node_id)
+        if sensor is None:
+            _LOGGER.warning("Skipping journal record of unknown node %s", node_id)
+            return
+        if "value_type" not in record:
+            child = sensor.children.get(child_id)
+            if child is None:
+                sensor.children[child_id] = ChildSensor(
+                    child_id, record["type"], record["description"]
+                )
+            else:
+                child.type = record["type"]
+                child.description = record["description"]
+            return
+        child = sensor.children.get(child_id)
+        if child is None:
+            _LOGGER.warning(
+                "Skipping journal record of unknown child %s of node %s",
+                child_id,
+                node_id,
+            )
+            return
+        child.values[record["value_type"]] = record["value"]
+
+    def _upsert_sqlite(self, filename, sensor_rows, child_rows, value_rows):
+        """Insert or update sensor, child and value rows in sqlite file."""
+        conn = sqlite3.connect(filename)
+        try:
+            with conn:
+                conn.executescript(SQLITE_SCHEMA)
+                conn.executemany(SQLITE_UPSERT_SENSOR, sensor_rows)
+                conn.executemany(SQLITE_UPSERT_CHILD, child_rows)
+                conn.executemany(SQLITE_UPSERT_VALUE, value_rows)
+        finally:
+            conn.close()
+
+    def _save_sqlite(self, filename):
+        """Save all sensors to sqlite file."""
+        sensors = list(self._sensors.values())
+        self._upsert_sqlite(
+            filename,
+            [_sensor_row(sensor) for sensor in sensors],
+            [
+                (sensor.sensor_id, child.id, child.type, child.description)
+                for sensor in sensors
+                for child in sensor.children.values()
+            ],
+            [
+                (sensor.sensor_id, child.id, value_type, value)
+                for sensor in sensors
+                for child in sensor.children.values()
+                for value_type, value in child.values.items()
+            ],
+        )
+
+    def _append_sqlite(self, filename, changes):
+        """Upsert the rows of the changed nodes, children and values to sqlite file."""
+        sensor_rows = []
+        child_rows = []
+        value_rows = []
+        for node_id, child_id, value_type in changes:
+            sensor = self._sensors.get(node_id)
+            if sensor is None:
+                continue
+            if child_id is None:
+                sensor_rows.append(_sensor_row(sensor))
+                continue
+            child = sensor.children.get(child_id)
+            if child is None:
+                continue
+            if value_type is None:
+                child_rows.append((node_id, child_id, child.type, child.description))
+            elif value_type in child.values:
+                value_rows.append(
+                    (node_id, child_id, value_type, child.values[value_type])
+                )
+        if sensor_rows or child_rows or value_rows:
+            self._upsert_sqlite(filename, sensor_rows, child_rows, value_rows)
+
+    def _load_sqlite(self, filename):
+        """Load sensors from sqlite file."""
+        conn = sqlite3.connect(filename)
+        try:
+            sensors = {}
+            for row in conn.execute("SELECT * FROM sensors"):
+                sensor = Sensor(row[0])
+                (
+                    sensor.type,
+                    sensor.sketch_name,
+                    sensor.sketch_version,
+                    sensor.battery_level,
+                    sensor.protocol_version,
+                    sensor.heartbeat,
+                ) = row[1:]
+                sensors[sensor.sensor_id] = sensor
+            for sensor_id, child_id, child_type, description in conn.execute(
+                "SELECT * FROM children"
+            ):
+                sensors[sensor_id].children[child_id] = ChildSensor(
+                    child_id, child_type, description
+                )
+            for sensor_id, child_id, value_type, value in conn.execute(
+                "SELECT * FROM child_values"
+            ):
+                sensors[sensor_id].children[child_id].values[value_type] = value
+        except (sqlite3.DatabaseError, KeyError) as exc:
+            raise ValueError(f"Bad sqlite file {filename}: {exc}") from exc
+        finally:
+            conn.close()
+        self._sensors.update(sensors)
+
+    _save_db = _save_sqlite
+    _append_db = _append_sqlite
+    _load_db = _load_sqlite
+
+    def _needs_snapshot(self, ext):
+        """Return True if a full snapshot should be saved.
+
+        Files that support appending only get a new snapshot when the
+        appended records outnumber the sensors, to compact the file,
+        when sensors have been removed or when changes aren't tracked.
+        """
+        if (
+            self.need_snapshot
+            or self.changes is None
+            or not hasattr(self, f"_append_{ext[1:]}")
+        ):
+            return True
+        return self._journal_records >= max(JOURNAL_MIN_RECORDS, len(self._sensors))
+
+    def _changes_since_save(self):
+        """Return the current change token and the changes since last save."""
+        if self.changes is None:
+            return 0, []
+        return self.changes.changes_since(self._token)
+
     def save_sensors(self):
         """Save sensors to file."""
-        if not self.need_save:
-            return
+        with self._lock:
+            if not self.need_save and (
+                self.changes is None or self.changes.token == self._token
+            ):
+                return
+            if self.stats is None or not self.stats.enabled:
+                self._save_sensors()
+                return
+            start = timer()
+            try:
+                self._save_sensors()
+            finally:
+                self.stats.record(STAGE_PERSISTENCE_SAVE, timer() - start)
+
+    def _save_sensors(self):
+        """Save sensors to file as a snapshot or by appending changes."""
         fname = os.path.realpath(self.persistence_file)
         exists = os.path.isfile(fname)
         dirname = os.path.dirname(fname)
         if not os.access(dirname, os.W_OK) or exists and not os.access(fname, os.W_OK):
             _LOGGER.error("Permission denied when writing to %s", fname)
             return
+        token, changes = self._changes_since_save()
+        if exists and not self._needs_snapshot(os.path.splitext(fname)[1]):
+            _LOGGER.debug("Appending sensors to persistence file %s", fname)
+            self.need_save = False
+            self._perform_file_action(fname, "append", changes)
+            self._token = token
+            return
+        self.need_snapshot = False
         split_fname = os.path.splitext(fname)
         tmp_fname = f"{split_fname[0]}.tmp{split_fname[1]}"
+        if os.path.isfile(tmp_fname):
+            # A file left by an interrupted save would be updated, not replaced.
+            os.remove(tmp_fname)
         _LOGGER.debug("Saving sensors to persistence file %s", fname)
         self._perform_file_action(tmp_fname, "save")
         if exists:
@@ -64,6 +394,7 @@ class Persistence:
         os.rename(tmp_fname, fname)
         if exists:
             os.remove(self.persistence_bak)
+        self._token = token
         self.need_save = False
 
     def _load_sensors(self, path=None):
@@ -95,12 +426,35 @@ class Persistence:
                     _LOGGER.warning(
                         "Failed to load sensors from file: %s", self.persistence_file
                     )
+                    self._migrate_sensors()
             except (EOFError, ValueError):
                 _LOGGER.error("Bad file contents: %s", self.persistence_file)
                 _LOGGER.warning("Removing file: %s", self.persistence_file)
                 os.remove(self.persistence_file)
 
-    def _perform_file_action(self, filename, action):
+    def _migrate_sensors(self):
+        """Load sensors from a pickle or json file with the same base name.
+
+        Only sqlite persistence files are migrated. The sensors will be saved
+        to the sqlite file on the next save.
+        """
+        base, ext = os.path.splitext(self.persistence_file)
+        if ext not in (".db", ".sqlite"):
+            return
+        for migrate_ext in MIGRATE_EXTENSIONS:
+            path = f"{base}{migrate_ext}"
+            if not os.path.isfile(path):
+                continue
+            _LOGGER.info("Migrating sensors from %s to %s", path, self.persistence_file)
+            try:
+                self._perform_file_action(path, "load")
+            except (EOFError, ValueError):
+                _LOGGER.error("Bad file contents: %s", path)
+                continue
+            self.need_save = True
+            return
+
+    def _perform_file_action(self, filename, action, *args):
         """Perform action on specific file types.
 
         Dynamic dispatch function for performing actions on
@@ -112,7 +466,26 @@ class Persistence:
         except AttributeError as exc:
             # pylint: disable-next=broad-exception-raised
             raise Exception(f"Unsupported file type {ext[1:]}") from exc
-        func(filename)
+        func(filename, *args)
+
+
+def _sensor_row(sensor):
+    """Return the sqlite row of a sensor."""
+    return (
+        sensor.sensor_id,
+        sensor.type,
+        sensor.sketch_name,
+        sensor.sketch_version,
+        sensor.battery_level,
+        sensor.protocol_version,
+        sensor.heartbeat,
+    )
+
+
+def _change_level(change):
+    """Return 0 for a node, 1 for a child and 2 for a child value change."""
+    _, child_id, value_type = change
+    return (child_id is not None) + (value_type is not None)
 
 
 class MySensorsJSONEncoder(json.JSONEncoder):
@@ -0,0 +1,165 @@
+"""Pace outbound messages to what the radio network can forward."""
+
+from collections import deque
+import logging
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+PRIORITY_INTERNAL = 0  # internal and stream (OTA) messages
+PRIORITY_SET = 1  # set and req commands
+PRIORITY_BULK = 2  # bulk flushes, eg of smart sleep node queues
+PRIORITIES = (PRIORITY_INTERNAL, PRIORITY_SET, PRIORITY_BULK)
+
+INTERNAL_TYPES = ("3", "4")
+
+
+class TokenBucket:
+    """Represent a token bucket refilled at a fixed rate."""
+
+    def __init__(self, rate, burst=1.0, now=None):
+        """Set up token bucket."""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        """Refill tokens for the time passed since last refill."""
+        if now <= self.last:
+            return
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def delay(self, now):
+        """Return seconds until a token is available."""
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def consume(self, now):
+        """Take a token. Return True if a token was available."""
+        if self.delay(now):
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class OutboundScheduler:
+    """Schedule outbound messages with rate limits and priorities.
+
+    A global token bucket limits the total message rate and a token bucket
+    per node limits the rate to each node. Messages are sent in priority
+    order. Within a priority, messages to the same node keep their order,
+    while a node that is rate limited doesn't hold back other nodes.
+    A rate of None disables that limit. Submit and poll may be called from
+    different threads.
+    """
+
+    def __init__(self, rate=None, node_rate=None, burst=1.0, node_burst=1.0):
+        """Set up scheduler."""
+        self.rate = rate
+        self.burst = burst
+        self.node_rate = node_rate
+        self.node_burst = node_burst
+        self._bucket = None
+        self._lock = threading.RLock()
+        self._node_buckets = {}
+        self._queues = {priority: deque() for priority in PRIORITIES}
+
+    def __len__(self):
+        """Return number of queued messages."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def submit(self, message, priority=None):
+        """Queue a command string, that may hold many lines, for sending.
+
+        If priority is None, the priority is chosen from the message type.
+        """
+        if not message:
+            return
+        with self._lock:
+            for line in message.splitlines(keepends=True):
+                fields = line.split(";", 3)
+                if len(fields) < 4:
+                    _LOGGER.warning("Not scheduling invalid message: %s", line.strip())
+                    continue
+                line_priority = priority
+                if line_priority is None:
+                    line_priority = (
+                        PRIORITY_INTERNAL
+                        if fields[2] in INTERNAL_TYPES
+                        else PRIORITY_SET
+                    )
+                self._queues[line_priority].append((fields[0], line))
+
+    def _node_bucket(self, node_id, now):
+        """Return the token bucket for node_id."""
+        bucket = self._node_buckets.get(node_id)
+        if bucket is None:
+            bucket = TokenBucket(self.node_rate, self.node_burst, now)
+            self._node_buckets[node_id] = bucket
+        return bucket
+
+    def _delay(self, node_id, now):
+        """Return seconds until a message to node_id may be sent."""
+        if self._bucket is not None and self._bucket.delay(now):
+            return self._bucket.delay(now)
+        if self.node_rate:
+            return self._node_bucket(node_id, now).delay(now)
+        return 0.0
+
+    def _consume(self, node_id, now):
+        """Take the tokens for sending a message to node_id."""
+        if self._bucket is not None:
+            self._bucket.consume(now)
+        if self.node_rate:
+            self._node_bucket(node_id, now).consume(now)
+
+    def _poll_queue(self, queue, send, now):
+        """Send the allowed messages of queue and keep the others in order.
+
+        Return seconds until the next kept message may be sent, or None.
+        """
+        next_delay = None
+        blocked_nodes = set()
+        kept = deque()
+        while queue:
+            node_id, line = queue.popleft()
+            delay = None if node_id in blocked_nodes else self._delay(node_id, now)
+            if delay == 0.0:
+                self._consume(node_id, now)
+                send(line)
+                continue
+            blocked_nodes.add(node_id)
+            kept.append((node_id, line))
+            if delay is not None and (next_delay is None or delay < next_delay):
+                next_delay = delay
+        queue.extend(kept)
+        return next_delay
+
+    def poll(self, send, now=None):
+        """Send messages that are allowed by the rate limits.
+
+        Return seconds until the next queued message may be sent,
+        or None if the queue is empty.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            if self.rate and self._bucket is None:
+                self._bucket = TokenBucket(self.rate, self.burst, now)
+            next_delay = None
+            for priority in PRIORITIES:
+                queue = self._queues[priority]
+                if not queue:
+                    continue
+                delay = self._poll_queue(queue, send, now)
+                if delay is not None and (next_delay is None or delay < next_delay):
+                    next_delay = delay
+                if queue and self._bucket is not None and self._bucket.delay(now):
+                    # The global limit is reached, lower priorities have to wait.
+                    return next_delay
+            return next_delay
@@ -2,6 +2,7 @@
 
 import logging
 from collections import deque
+import threading
 
 import voluptuous as vol
 
@@ -11,6 +12,56 @@ from .validation import is_battery_level, is_heartbeat, safe_is_version
 
 _LOGGER = logging.getLogger(__name__)
 
+LOADED_SCHEMAS = {}
+_UNSET = object()
+
+TRACKED_ATTRS = {
+    "type",
+    "sketch_name",
+    "sketch_version",
+    "_battery_level",
+    "_protocol_version",
+    "_heartbeat",
+}
+
+
+class ChangeTracker:
+    """Track changed nodes, children and values by change token.
+
+    A change is a tuple of node id, child id and value type. Child id is None
+    for a change of a node attribute and value type is None for a change of a
+    child presentation. Each change gets a new token from an increasing
+    counter, so a caller can store the last token it has seen and ask for all
+    changes since that token.
+    """
+
+    def __init__(self):
+        """Set up change tracker."""
+        self._changes = {}
+        self._lock = threading.Lock()
+        self.token = 0
+
+    def mark(self, node_id, child_id=None, value_type=None):
+        """Mark a node, child or value as changed."""
+        key = (node_id, child_id, value_type)
+        with self._lock:
+            self.token += 1
+            # Reinsert to keep the changes ordered by token.
+            self._changes.pop(key, None)
+            self._changes[key] = self.token
+
+    def changes_since(self, token=0):
+        """Return the current token and a list of changes since token."""
+        changes = []
+        with self._lock:
+            for key in reversed(self._changes):
+                if self._changes[key] <= token:
+                    break
+                changes.append(key)
+            current = self.token
+        changes.reverse()
+        return current, changes
+
 
 class Sensor:
     """Represent a sensor."""
@@ -19,6 +70,7 @@ class Sensor:
 
     def __init__(self, sensor_id):
         """Set up sensor."""
+        self.tracker = None
         self.sensor_id = sensor_id
         self.children = {}
         self.type = None
@@ -34,6 +86,7 @@ class Sensor:
     def __getstate__(self):
         """Get state to save as pickle."""
         state = self.__dict__.copy()
+        state.pop("tracker", None)
         for attr in ("_battery_level", "_heartbeat", "_protocol_version"):
             value = state.pop(attr, None)
             prop = attr
@@ -46,6 +99,7 @@ class Sensor:
 
     def __setstate__(self, state):
         """Set state when loading pickle."""
+        self.tracker = None
         # Restore instance attributes
         for key, val in state.items():
             setattr(self, key, val)
@@ -56,6 +110,13 @@ class Sensor:
         if "_heartbeat" not in self.__dict__:
             self.heartbeat = 0
 
+    def __setattr__(self, name, value):
+        """Set attribute and mark tracked attributes as changed if they differ."""
+        changed = name in TRACKED_ATTRS and self.__dict__.get(name, _UNSET) != value
+        super().__setattr__(name, value)
+        if changed:
+            self.mark_changed()
+
     def __repr__(self):
         """Return the representation."""
         return f"<Sensor sensor_id={self.sensor_id}, children: {self.children}>"
@@ -95,6 +156,11 @@ class Sensor:
         """Set valid protocol version."""
         self._protocol_version = safe_is_version(value)
 
+    def mark_changed(self, child_id=None, value_type=None):
+        """Mark the node, a child or a child value as changed."""
+        if self.tracker is not None:
+            self.tracker.mark(self.sensor_id, child_id, value_type)
+
     def add_child_sensor(self, child_id, child_type, description=""):
         """Create and add a child sensor."""
         if child_id in self.children:
@@ -106,6 +172,7 @@ class Sensor:
             )
             return None
         self.children[child_id] = ChildSensor(child_id, child_type, description)
+        self.mark_changed(child_id)
         return child_id
 
     def get_desired_value(self, child_id, value_type):
@@ -154,7 +221,9 @@ class Sensor:
             return
 
         child = self.children[child_id]
-        child.values[value_type] = value
+        if child.values.get(value_type, _UNSET) != value:
+            child.values[value_type] = value
+            self.mark_changed(child_id, value_type)
 
         if child_id not in self.new_state:
             return
@@ -222,20 +291,45 @@ class ChildSensor:
         )
 
     def get_schema(self, protocol_version):
-        """Return the child schema for the correct const version."""
+        """Return the child schema for the correct const version.
+
+        The schema is cached per const version and child type and shared
+        between child sensors.
+        """
         const = get_const(protocol_version)
+        key = (const, self.type)
+        if key in LOADED_SCHEMAS:
+            return LOADED_SCHEMAS[key]
         custom_schema = vol.Schema(
             {
                 typ.value: const.VALID_SETREQ[typ]
                 for typ in const.VALID_TYPES[const.Presentation.S_CUSTOM]
             }
         )
-        return custom_schema.extend(
+        schema = custom_schema.extend(
             {typ.value: const.VALID_SETREQ[typ] for typ in const.VALID_TYPES[self.type]}
         )
+        LOADED_SCHEMAS[key] = schema  # Cache the schema
+        return schema
 
     def validate(self, protocol_version, values=None):
         """Validate child value types and values against protocol_version."""
         if values is None:
             values = self.values
         return self.get_schema(protocol_version)(values)
+
+
+def validate_all(gateway):
+    """Validate the values of all children of all sensors of the gateway.
+
+    Return a dict of the errors keyed by tuples of node id and child id.
+    Children that are valid are not included.
+    """
+    errors = {}
+    for sensor in list(gateway.sensors.values()):
+        for child in list(sensor.children.values()):
+            try:
+                child.validate(gateway.protocol_version)
+            except (vol.Invalid, KeyError) as exc:
+                errors[(sensor.sensor_id, child.id)] = exc
+    return errors
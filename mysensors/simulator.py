@@ -0,0 +1,725 @@
+"""Simulate a network of MySensors nodes without hardware.
+
+The simulated network takes the place of the gateway hardware and the radio
+network. It can be connected directly to the protocol of a sync or async
+gateway, served over a TCP socket to a TCP gateway or routed through an in
+memory MQTT broker to an MQTT gateway. Nodes present themselves, report
+values at a configurable interval, can use smart sleep and run OTA firmware
+updates. The network records throughput and the latency of requests that
+expect a reply from the gateway.
+"""
+
+import asyncio
+from collections import deque
+import heapq
+import logging
+import os
+import random
+import socket
+import statistics
+import threading
+import time
+
+from . import BaseAsyncGateway, BaseSyncGateway
+from .const import SYSTEM_CHILD_ID, get_const
+from .gateway_mqtt import MQTTGateway, topic_matches
+from .gateway_tcp import TCPGateway
+from .message import BROADCAST_ID, Message
+from .ota import fw_hex_to_int, fw_int_to_hex
+from .transport import AsyncTransport, SyncTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+GATEWAY_ID = 0
+GATEWAY_VERSION = "2.3.2"
+DEFAULT_CHILDREN = ((1, "S_TEMP", "V_TEMP"), (2, "S_HUM", "V_HUM"))
+FW_TYPE = 1
+FW_VER = 1
+FW_SIZE = 1024
+POLL_INTERVAL = 0.1
+BOOTLOADER_VERSION = 0x0201
+
+
+def summarize(samples):
+    """Return count, mean and percentiles in microseconds of samples in seconds."""
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+
+    def percentile(fraction):
+        """Return the sample at fraction of the sorted samples."""
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1e6
+
+    return {
+        "count": len(samples),
+        "mean": statistics.fmean(samples) * 1e6,
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": samples[-1] * 1e6,
+    }
+
+
+class SimulatedNode:
+    """Represent a simulated node.
+
+    A node without node_id requests an id from the gateway when it boots.
+    Children are tuples of child id, presentation type name and value type
+    name. A smart sleep node notifies the gateway after each report that it
+    goes back to sleep.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        node_id=None,
+        protocol_version="2.2",
+        children=DEFAULT_CHILDREN,
+        report_interval=10.0,
+        smart_sleep=False,
+        time_request=True,
+        sketch_name="Simulated node",
+    ):
+        """Set up simulated node."""
+        self.node_id = node_id
+        self.protocol_version = protocol_version
+        self.const = get_const(protocol_version)
+        self.children = children
+        self.report_interval = report_interval
+        self.smart_sleep = smart_sleep
+        self.time_request = time_request
+        self.sketch_name = sketch_name
+        self.fw_type = FW_TYPE
+        self.fw_ver = FW_VER
+        self.heartbeat = 0
+        self.booted = False
+        self._update = None  # firmware type, version and next block
+
+    @property
+    def report_size(self):
+        """Return the number of lines sent at each report."""
+        return len(self.children) + bool(self.time_request) + bool(self.smart_sleep)
+
+    def _line(self, child_id, msg_type, sub_type, payload=""):
+        """Return a command string sent by the node."""
+        node_id = BROADCAST_ID if self.node_id is None else self.node_id
+        return f"{node_id};{child_id};{int(msg_type)};0;{int(sub_type)};{payload}\n"
+
+    def _internal(self, sub_type, payload=""):
+        """Return an internal command string sent by the node."""
+        return self._line(
+            SYSTEM_CHILD_ID, self.const.MessageType.internal, sub_type, payload
+        )
+
+    def boot(self):
+        """Return the lines sent by the node when it boots."""
+        const = self.const
+        if self.node_id is None:
+            return [self._internal(const.Internal.I_ID_REQUEST)]
+        self.booted = True
+        self._update = None
+        lines = [
+            self._line(
+                SYSTEM_CHILD_ID,
+                const.MessageType.presentation,
+                const.Presentation.S_ARDUINO_NODE,
+                self.protocol_version,
+            ),
+            self._internal(const.Internal.I_SKETCH_NAME, self.sketch_name),
+            self._internal(const.Internal.I_SKETCH_VERSION, f"{self.fw_ver}.0"),
+        ]
+        lines.extend(
+            self._line(
+                child_id,
+                const.MessageType.presentation,
+                const.Presentation[child_type],
+            )
+            for child_id, child_type, _ in self.children
+        )
+        lines.extend(self.report())
+        return lines
+
+    def report(self):
+        """Return the lines sent by the node at a report."""
+        const = self.const
+        if not self.booted or self._update is not None:
+            return []
+        lines = [
+            self._line(
+                child_id,
+                const.MessageType.set,
+                const.SetReq[value_type],
+                f"{random.uniform(0, 100):.1f}",
+            )
+            for child_id, _, value_type in self.children
+        ]
+        if self.time_request:
+            lines.append(self._internal(const.Internal.I_TIME))
+        if self.smart_sleep:
+            self.heartbeat += 1
+            sub_type = getattr(
+                const.Internal,
+                "I_PRE_SLEEP_NOTIFICATION",
+                getattr(const.Internal, "I_HEARTBEAT_RESPONSE", None),
+            )
+            if sub_type is not None:
+                lines.append(self._internal(sub_type, self.heartbeat))
+        return lines
+
+    def _firmware_request(self):
+        """Return a request for the next firmware block."""
+        fw_type, fw_ver, block = self._update
+        return self._line(
+            SYSTEM_CHILD_ID,
+            self.const.MessageType.stream,
+            self.const.Stream.ST_FIRMWARE_REQUEST,
+            fw_int_to_hex(fw_type, fw_ver, block),
+        )
+
+    def receive(self, msg):
+        """Handle a message from the gateway and return the lines sent in reply."""
+        if msg.type == self.const.MessageType.internal:
+            return self._receive_internal(msg)
+        if msg.type == self.const.MessageType.stream:
+            return self._receive_stream(msg)
+        return []
+
+    def _receive_internal(self, msg):
+        """Handle an internal message and return the lines sent in reply."""
+        const = self.const
+        if msg.sub_type == const.Internal.I_ID_RESPONSE and self.node_id is None:
+            self.node_id = int(msg.payload)
+            return self.boot()
+        if msg.sub_type == const.Internal.I_REBOOT and self.booted:
+            self.booted = False
+            return [
+                self._line(
+                    SYSTEM_CHILD_ID,
+                    const.MessageType.stream,
+                    const.Stream.ST_FIRMWARE_CONFIG_REQUEST,
+                    fw_int_to_hex(self.fw_type, self.fw_ver, 0, 0, BOOTLOADER_VERSION),
+                )
+            ]
+        return []
+
+    def _receive_stream(self, msg):
+        """Handle a firmware stream message and return the lines sent in reply."""
+        const = self.const
+        if msg.sub_type == const.Stream.ST_FIRMWARE_CONFIG_RESPONSE:
+            fw_type, fw_ver, blocks, _ = fw_hex_to_int(msg.payload, 4)
+            self._update = fw_type, fw_ver, blocks - 1
+            return [self._firmware_request()]
+        if msg.sub_type != const.Stream.ST_FIRMWARE_RESPONSE or not self._update:
+            return []
+        fw_type, fw_ver, block = fw_hex_to_int(msg.payload[:12], 3)
+        if (fw_type, fw_ver, block) != self._update:
+            return []
+        if not block:
+            self.fw_type, self.fw_ver = fw_type, fw_ver
+            return self.boot()
+        self._update = fw_type, fw_ver, block - 1
+        return [self._firmware_request()]
+
+
+class SimulatedNetwork:
+    """Represent a network of simulated nodes behind a gateway.
+
+    The network acts as the connection transport of a gateway protocol.
+    Lines from the nodes are delivered to the gateway and lines written by
+    the gateway are handled by the addressed nodes.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, nodes, protocol_version="2.2"):
+        """Set up simulated network."""
+        self.nodes = list(nodes)
+        self.const = get_const(protocol_version)
+        self._nodes_by_id = {
+            node.node_id: node for node in self.nodes if node.node_id is not None
+        }
+        self._lock = threading.RLock()
+        self._replied = threading.Condition(self._lock)
+        self._deliver = None
+        self._outbox = deque()
+        self._delivering = False
+        self._read_buffer = b""
+        self._pending = {}
+        self._schedule = []
+        internal = self.const.MessageType.internal
+        stream = self.const.MessageType.stream
+        self._replies = {
+            (internal, self.const.Internal.I_TIME): (
+                internal,
+                self.const.Internal.I_TIME,
+            ),
+            (internal, self.const.Internal.I_ID_REQUEST): (
+                internal,
+                self.const.Internal.I_ID_RESPONSE,
+            ),
+            (stream, self.const.Stream.ST_FIRMWARE_CONFIG_REQUEST): (
+                stream,
+                self.const.Stream.ST_FIRMWARE_CONFIG_RESPONSE,
+            ),
+            (stream, self.const.Stream.ST_FIRMWARE_REQUEST): (
+                stream,
+                self.const.Stream.ST_FIRMWARE_RESPONSE,
+            ),
+        }
+        self.connected = threading.Event()
+        self.latencies = []
+        self.sent = 0
+        self.received = 0
+        self.ota_blocks = 0
+        self.started = None
+        self.stopped = None
+
+    @property
+    def is_connected(self):
+        """Return True if the network is connected to a gateway."""
+        return self.connected.is_set()
+
+    def attach(self, deliver):
+        """Deliver lines from the nodes as bytes to the deliver callable."""
+        self._deliver = deliver
+        self.connected.set()
+
+    def connection_made(self, protocol):
+        """Connect the network to a gateway protocol."""
+        self.attach(protocol.data_received)
+        protocol.connection_made(self)
+
+    def close(self):
+        """Close the connection to the gateway."""
+        self._deliver = None
+        self.connected.clear()
+
+    def wait_connected(self, timeout=None):
+        """Block until the network is connected. Return True if connected."""
+        return self.connected.wait(timeout)
+
+    def send(self, lines):
+        """Deliver lines from the nodes to the gateway."""
+        if not lines:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            for line in lines:
+                node_id, _, msg_type, _, sub_type, _ = line.split(";")
+                reply = self._replies.get((int(msg_type), int(sub_type)))
+                if reply is not None:
+                    key = (int(node_id), *reply)
+                    self._pending.setdefault(key, deque()).append(now)
+            self.sent += len(lines)
+            self._outbox.append("".join(lines).encode())
+            if self._delivering:
+                # Lines sent while delivering are delivered by the outer call.
+                return
+            self._delivering = True
+        try:
+            while True:
+                with self._lock:
+                    if not self._outbox or self._deliver is None:
+                        self._outbox.clear()
+                        return
+                    data = self._outbox.popleft()
+                    deliver = self._deliver
+                deliver(data)
+        finally:
+            with self._lock:
+                self._delivering = False
+
+    def write(self, data):
+        """Handle data written by the gateway."""
+        now = time.perf_counter()
+        replies = []
+        with self._lock:
+            self._read_buffer += bytes(data)
+            *lines, self._read_buffer = self._read_buffer.split(b"\n")
+            for line in lines:
+                try:
+                    msg = Message(line)
+                except ValueError:
+                    continue
+                self.received += 1
+                sent_at = self._pending.get((msg.node_id, msg.type, msg.sub_type))
+                if sent_at:
+                    self.latencies.append(now - sent_at.popleft())
+                    self._replied.notify_all()
+                replies.extend(self._receive(msg))
+        self.send(replies)
+
+    def _receive(self, msg):
+        """Route a message from the gateway and return the reply lines."""
+        const = self.const
+        if msg.node_id == GATEWAY_ID:
+            if (
+                msg.type == const.MessageType.internal
+                and msg.sub_type == const.Internal.I_VERSION
+            ):
+                return [
+                    f"0;255;3;0;{int(const.Internal.I_VERSION)};{GATEWAY_VERSION}\n"
+                ]
+            return []
+        if msg.node_id == BROADCAST_ID:
+            node = next((node for node in self.nodes if node.node_id is None), None)
+            if node is None:
+                return []
+            replies = node.receive(msg)
+            if node.node_id is not None:
+                self._nodes_by_id[node.node_id] = node
+                self._schedule_report(node, time.monotonic())
+            return replies
+        node = self._nodes_by_id.get(msg.node_id)
+        if node is None:
+            return []
+        if (
+            msg.type == const.MessageType.stream
+            and msg.sub_type == const.Stream.ST_FIRMWARE_RESPONSE
+        ):
+            self.ota_blocks += 1
+        return node.receive(msg)
+
+    def _schedule_report(self, node, now):
+        """Schedule the next report of node at a random offset."""
+        heapq.heappush(
+            self._schedule,
+            (now + random.uniform(0, node.report_interval), id(node), node),
+        )
+
+    def start(self):
+        """Boot all nodes and schedule their reports."""
+        now = time.monotonic()
+        self.started = now
+        lines = []
+        with self._lock:
+            for node in self.nodes:
+                lines.extend(node.boot())
+                if node.node_id is not None:
+                    self._schedule_report(node, now)
+        self.send(lines)
+
+    def poll(self, now=None):
+        """Send due reports. Return seconds until the next report is due."""
+        if now is None:
+            now = time.monotonic()
+        lines = []
+        with self._lock:
+            while self._schedule and self._schedule[0][0] <= now:
+                due, key, node = heapq.heappop(self._schedule)
+                lines.extend(node.report())
+                heapq.heappush(self._schedule, (due + node.report_interval, key, node))
+            delay = self._schedule[0][0] - now if self._schedule else None
+        self.send(lines)
+        return delay
+
+    def _next_delay(self, now, end):
+        """Send due reports and return seconds to sleep until the next poll."""
+        delay = self.poll(now)
+        if delay is None:
+            delay = POLL_INTERVAL
+        return min(end - now, delay, POLL_INTERVAL)
+
+    def run(self, duration):
+        """Boot the nodes and send reports for duration seconds."""
+        self.start()
+        end = self.started + duration
+        while (now := time.monotonic()) < end:
+            time.sleep(self._next_delay(now, end))
+        self.stopped = time.monotonic()
+
+    async def async_run(self, duration):
+        """Boot the nodes and send reports for duration seconds."""
+        self.start()
+        end = self.started + duration
+        while (now := time.monotonic()) < end:
+            await asyncio.sleep(self._next_delay(now, end))
+        self.stopped = time.monotonic()
+
+    def wait_replies(self, count, timeout=None):
+        """Block until count replies have been received.
+
+        Return True if the replies were received before timeout.
+        """
+        with self._replied:
+            return self._replied.wait_for(
+                lambda: len(self.latencies) >= count, timeout=timeout
+            )
+
+    async def async_wait_replies(self, count, timeout=None):
+        """Wait until count replies have been received.
+
+        Return True if the replies were received before timeout.
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        while len(self.latencies) < count:
+            if end is not None and time.monotonic() >= end:
+                return False
+            await asyncio.sleep(0)
+        return True
+
+    def stats(self):
+        """Return throughput and latency statistics."""
+        with self._lock:
+            end = self.stopped if self.stopped is not None else time.monotonic()
+            duration = end - self.started if self.started is not None else 0.0
+            return {
+                "nodes": len(self.nodes),
+                "duration": duration,
+                "sent": self.sent,
+                "received": self.received,
+                "sent_per_second": self.sent / duration if duration else 0.0,
+                "received_per_second": self.received / duration if duration else 0.0,
+                "ota_blocks": self.ota_blocks,
+                "latency": summarize(self.latencies),
+            }
+
+
+class NetworkServer:
+    """Serve a simulated network over TCP, like an ethernet gateway."""
+
+    def __init__(self, network, host="127.0.0.1", port=0):
+        """Set up network server."""
+        self.network = network
+        self._sock = socket.create_server((host, port))
+        self.address = self._sock.getsockname()[:2]
+        self._thread = None
+        self._conn = None
+
+    def start(self):
+        """Start serving the network to the next connecting gateway."""
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving the network."""
+        self.network.close()
+        if self._conn is not None:
+            self._conn.close()
+        self._sock.close()
+
+    def _serve(self):
+        """Accept a gateway connection and relay data to the network."""
+        try:
+            self._conn, _ = self._sock.accept()
+        except OSError:
+            return
+        self.network.attach(self._conn.sendall)
+        while True:
+            try:
+                data = self._conn.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            self.network.write(data)
+        self.network.close()
+
+
+class MQTTBroker:
+    """Route MQTT messages in memory between subscribers."""
+
+    def __init__(self):
+        """Set up broker."""
+        self._subscriptions = []
+        self._lock = threading.Lock()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Publish a message to all matching subscriptions."""
+        # pylint: disable=unused-argument
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for topic_filter, callback, sub_qos in subscriptions:
+            if topic_matches(topic_filter, topic):
+                callback(topic, payload, min(qos, sub_qos))
+
+    def subscribe(self, topic, callback, qos=0):
+        """Subscribe callback to topic."""
+        with self._lock:
+            if (topic, callback, qos) not in self._subscriptions:
+                self._subscriptions.append((topic, callback, qos))
+
+    def attach_network(self, network, in_prefix, out_prefix):
+        """Connect network as the MQTT gateway hardware.
+
+        The prefixes are the ones of the MQTT gateway transport. The network
+        publishes on in_prefix and subscribes to out_prefix.
+        """
+
+        def deliver(data):
+            """Publish lines from the nodes."""
+            for line in data.decode().splitlines():
+                *fields, payload = line.split(";")
+                self.publish(f"{in_prefix}/{'/'.join(fields)}", payload)
+
+        def receive(topic, payload, qos):
+            """Pass a message from the gateway to the network."""
+            # pylint: disable=unused-argument
+            fields = topic.split("/")[-5:]
+            network.write(f"{';'.join(fields)};{payload}\n".encode())
+
+        self.subscribe(f"{out_prefix}/#", receive)
+        network.attach(deliver)
+
+
+def sync_connect(transport):
+    """Connect the gateway protocol to the simulated network."""
+    transport.gateway.network.connection_made(transport.protocol)
+
+
+async def async_connect(transport):
+    """Connect the gateway protocol to the simulated network."""
+    transport.gateway.network.connection_made(transport.protocol)
+
+
+class SimulatorGateway(BaseSyncGateway):
+    """MySensors gateway connected to a simulated network."""
+
+    def __init__(self, network, **kwargs):
+        """Set up simulator gateway."""
+        self.network = network
+        transport = SyncTransport(self, sync_connect, **kwargs)
+        super().__init__(transport, **kwargs)
+
+
+class AsyncSimulatorGateway(BaseAsyncGateway):
+    """MySensors async gateway connected to a simulated network."""
+
+    def __init__(self, network, **kwargs):
+        """Set up async simulator gateway."""
+        self.network = network
+        transport = AsyncTransport(self, async_connect, **kwargs)
+        super().__init__(transport, **kwargs)
+
+
+def make_nodes(
+    count,
+    protocol_version="2.2",
+    rate=10.0,
+    smart_sleep=0,
+    request_id=False,
+):
+    """Return count nodes reporting rate lines per second in total.
+
+    The first smart_sleep nodes are smart sleep nodes. If request_id is
+    True, the nodes request an id from the gateway when they boot.
+    """
+    nodes = [
+        SimulatedNode(
+            node_id=None if request_id else node_id,
+            protocol_version=protocol_version,
+            smart_sleep=node_id <= smart_sleep,
+        )
+        for node_id in range(1, count + 1)
+    ]
+    lines_per_report = sum(node.report_size for node in nodes)
+    for node in nodes:
+        node.report_interval = lines_per_report / rate
+    return nodes
+
+
+def _start_ota(gateway, node_ids, fw_size):
+    """Start firmware updates of node_ids if the nodes are presented.
+
+    Return True if the updates were started.
+    """
+    if not all(node_id in gateway.sensors for node_id in node_ids):
+        return False
+    gateway.tasks.ota.make_update(
+        list(node_ids), FW_TYPE, FW_VER + 1, os.urandom(fw_size)
+    )
+    return True
+
+
+def _sync_start_ota(gateway, node_ids, fw_size, timeout):
+    """Start firmware updates of node_ids when the nodes are presented."""
+    end = time.monotonic() + timeout
+    while not _start_ota(gateway, node_ids, fw_size):
+        if time.monotonic() >= end:
+            _LOGGER.warning("Nodes not presented, not starting firmware updates")
+            return
+        time.sleep(0.01)
+
+
+async def _async_start_ota(gateway, node_ids, fw_size, timeout):
+    """Start firmware updates of node_ids when the nodes are presented."""
+    end = time.monotonic() + timeout
+    while not _start_ota(gateway, node_ids, fw_size):
+        if time.monotonic() >= end:
+            _LOGGER.warning("Nodes not presented, not starting firmware updates")
+            return
+        await asyncio.sleep(0.01)
+
+
+def simulate(
+    network,
+    gateway_type="sync",
+    duration=10.0,
+    ota_nodes=(),
+    fw_size=FW_SIZE,
+    timeout=5.0,
+    **kwargs,
+):
+    """Run a gateway of gateway_type against network for duration seconds.
+
+    Gateway type is one of sync, async, tcp or mqtt. Return the network
+    statistics.
+    """
+    if gateway_type == "async":
+        return asyncio.run(
+            _async_simulate(network, duration, ota_nodes, fw_size, timeout, **kwargs)
+        )
+    server = None
+    if gateway_type == "sync":
+        gateway = SimulatorGateway(network, **kwargs)
+    elif gateway_type == "tcp":
+        server = NetworkServer(network)
+        server.start()
+        gateway = TCPGateway(*server.address, **kwargs)
+    elif gateway_type == "mqtt":
+        broker = MQTTBroker()
+        broker.attach_network(network, "mygateway1-out", "mygateway1-in")
+        gateway = MQTTGateway(
+            broker.publish,
+            broker.subscribe,
+            in_prefix="mygateway1-out",
+            out_prefix="mygateway1-in",
+            **kwargs,
+        )
+    else:
+        raise ValueError(f"Unknown gateway type {gateway_type}")
+    gateway.start()
+    try:
+        if not network.wait_connected(timeout):
+            raise TimeoutError("Gateway did not connect to the simulated network")
+        if ota_nodes:
+            threading.Thread(
+                target=_sync_start_ota,
+                args=(gateway, ota_nodes, fw_size, timeout),
+                daemon=True,
+            ).start()
+        network.run(duration)
+    finally:
+        gateway.stop()
+        if server is not None:
+            server.stop()
+    return network.stats()
+
+
+async def _async_simulate(network, duration, ota_nodes, fw_size, timeout, **kwargs):
+    """Run an async gateway against network for duration seconds."""
+    gateway = AsyncSimulatorGateway(network, **kwargs)
+    await gateway.start()
+    ota_task = None
+    try:
+        if ota_nodes:
+            ota_task = asyncio.create_task(
+                _async_start_ota(gateway, ota_nodes, fw_size, timeout)
+            )
+        await network.async_run(duration)
+    finally:
+        if ota_task is not None:
+            ota_task.cancel()
+        await gateway.stop()
+    return network.stats()
@@ -0,0 +1,212 @@
+"""Record time spent in the stages of message handling."""
+
+import bisect
+import threading
+from timeit import default_timer as timer
+
+STAGE_DECODE = "decode"
+STAGE_VALIDATE = "validate"
+STAGE_HANDLER = "handler"
+STAGE_EVENT_CALLBACK = "event_callback"
+STAGE_PERSISTENCE_SAVE = "persistence_save"
+STAGE_TRANSPORT_WRITE = "transport_write"
+STAGES = (
+    STAGE_DECODE,
+    STAGE_VALIDATE,
+    STAGE_HANDLER,
+    STAGE_EVENT_CALLBACK,
+    STAGE_PERSISTENCE_SAVE,
+    STAGE_TRANSPORT_WRITE,
+)
+
+COUNTER_MESSAGES_SENT = "messages_sent"
+COUNTER_DECODE_FAILURES = "decode_failures"
+COUNTER_VALIDATION_FAILURES = "validation_failures"
+COUNTER_RECONNECTS = "reconnects"
+COUNTER_OTA_BLOCKS = "ota_blocks"
+COUNTER_EVENTS_DROPPED = "events_dropped"
+COUNTER_UPDATES_COALESCED = "updates_coalesced"
+
+# Upper bounds in seconds of the histogram buckets, from 1 us to about 16 s.
+BUCKETS = tuple(1e-6 * 2**exp for exp in range(25))
+
+
+class Histogram:
+    """Represent a histogram of durations with logarithmic buckets."""
+
+    def __init__(self):
+        """Set up histogram."""
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, duration):
+        """Add a duration in seconds."""
+        self.counts[bisect.bisect_left(BUCKETS, duration)] += 1
+        self.count += 1
+        self.sum += duration
+        if self.min is None or duration < self.min:
+            self.min = duration
+        if self.max is None or duration > self.max:
+            self.max = duration
+
+    def percentile(self, fraction):
+        """Return an estimate of the percentile at fraction in seconds.
+
+        The estimate is the upper bound of the bucket holding the percentile,
+        limited by the largest duration.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        cumulative = 0
+        for idx, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                if idx == len(BUCKETS):
+                    return self.max
+                return min(BUCKETS[idx], self.max)
+        return self.max
+
+    def summary(self):
+        """Return count, sum, mean, min, max and percentiles in seconds."""
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+        }
+
+
+class StageTimer:
+    """Time the consecutive stages of handling one message.
+
+    A stage that is marked more than once, around another stage, is
+    recorded once with the sum of its durations.
+    """
+
+    def __init__(self, stats):
+        """Set up stage timer."""
+        self._stats = stats
+        self._last = timer()
+        self._stages = {}
+        self.msg_type = None
+        self.sub_type = None
+
+    def mark(self, stage, msg=None):
+        """Mark the end of stage, that started at the end of the last stage.
+
+        Pass the message, when known, to record the stages per message type.
+        """
+        now = timer()
+        self._stages[stage] = self._stages.get(stage, 0.0) + now - self._last
+        self._last = now
+        if msg is not None:
+            self.msg_type = msg.type
+            self.sub_type = msg.sub_type
+
+    def record(self):
+        """Record the marked stages."""
+        for stage, duration in self._stages.items():
+            self._stats.record(stage, duration, self.msg_type, self.sub_type)
+        self._stages = {}
+
+
+class GatewayStats:
+    """Record durations of message handling stages and count events.
+
+    Durations are recorded in histograms per stage, and per stage, message
+    type and sub type. Counters are kept in the same way per name.
+    Recording is off until enabled is set to True, and then costs an
+    attribute lookup per stage.
+    """
+
+    def __init__(self, enabled=False):
+        """Set up gateway stats."""
+        self.enabled = enabled
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def timer(self):
+        """Return a stage timer that starts now."""
+        return StageTimer(self)
+
+    def record(self, stage, duration, msg_type=None, sub_type=None):
+        """Record duration in seconds of stage for message type and sub type."""
+        keys = [(stage, None, None)]
+        if msg_type is not None:
+            keys.append((stage, int(msg_type), int(sub_type)))
+        with self._lock:
+            for key in keys:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram()
+                histogram.add(duration)
+
+    def count(self, name, msg_type=None, sub_type=None, amount=1):
+        """Add amount to the counter name for message type and sub type."""
+        key = (name, msg_type, sub_type)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def count_lines(self, name, message):
+        """Count each line of a command string or bytes per type and sub type."""
+        if isinstance(message, (bytes, bytearray)):
+            message = message.decode(errors="replace")
+        for line in message.splitlines():
+            fields = line.split(";", 5)
+            if len(fields) < 5:
+                continue
+            try:
+                self.count(name, int(fields[2]), int(fields[4]))
+            except ValueError:
+                continue
+
+    def counters(self):
+        """Return a dict of counts keyed by name, message type and sub type.
+
+        Message type and sub type are None for counters of events that are
+        not counted per message type.
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def histograms(self):
+        """Return a dict of histograms keyed by stage, message type and sub type.
+
+        Message type and sub type are None for the histogram of all messages
+        of a stage.
+        """
+        with self._lock:
+            return dict(self._histograms)
+
+    def reset(self):
+        """Remove all recorded durations and counts."""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def summary(self):
+        """Return a summary of the recorded durations per stage.
+
+        Each stage holds the summary of all messages and the summaries per
+        message type and sub type, keyed by "type;sub_type".
+        """
+        result = {}
+        for (stage, msg_type, sub_type), histogram in sorted(
+            self.histograms().items(),
+            key=lambda item: (item[0][0], item[0][1] is not None, item[0][1:]),
+        ):
+            stage_result = result.setdefault(stage, {"all": None, "types": {}})
+            if msg_type is None:
+                stage_result["all"] = histogram.summary()
+            else:
+                stage_result["types"][f"{msg_type};{sub_type}"] = histogram.summary()
+        return result
@@ -4,9 +4,9 @@ import asyncio
 from collections import deque
 import logging
 import threading
-import time
 from timeit import default_timer as timer
 
+from .message import Message
 from .ota import OTAFirmware, load_fw
 from .persistence import Persistence
 
@@ -33,30 +33,32 @@ class Tasks:
             )
         else:
             self.persistence = None
+        self.scheduler = None
         self.transport = transport
 
     def _schedule_factory(self, save_sensors):
         """Return function to schedule saving sensors."""
         raise NotImplementedError
 
-    def add_job(self, func, *args):
+    def add_job(self, func, *args, priority=None):
         """Add a job that should return a reply to be sent."""
         raise NotImplementedError
 
     def run_job(self, job=None):
         """Run a job, either passed in or from the queue.
 
-        A job is a tuple of function and optional args. Keyword arguments
-        can be passed via use of functools.partial. The job should return a
-        string that should be sent by the gateway protocol. The function will
-        be called with the arguments and the result will be returned.
+        A job is a tuple of function and optional args, optionally followed
+        by the priority of the reply. Keyword arguments can be passed via use
+        of functools.partial. The job should return a string that should be
+        sent by the gateway protocol. The function will be called with the
+        arguments and the result will be returned.
         """
         if job is None:
             if not self.queue:
                 return None
             job = self.queue.popleft()
         start = timer()
-        func, args = job
+        func, args = job[:2]
         reply = func(*args)
         end = timer()
         if end - start > 0.1:
@@ -68,6 +70,29 @@ class Tasks:
             )
         return reply
 
+    def call_later(self, delay, func, *args):
+        """Call func with args after delay seconds. Return a cancel function."""
+        raise NotImplementedError
+
+    def send(self, reply, priority=None):
+        """Send a reply via the outbound scheduler if set, else directly.
+
+        The reply is a Message or a command string. Priority is one of the
+        priorities in the scheduler module. If None, the scheduler chooses
+        priority from the message type.
+        """
+        if self.scheduler is None:
+            self.transport.send(reply)
+            return
+        if isinstance(reply, Message):
+            reply = reply.encode()
+        self.scheduler.submit(reply, priority)
+        self._scheduler_submitted()
+
+    def _scheduler_submitted(self):
+        """Handle that a reply was submitted to the outbound scheduler."""
+        raise NotImplementedError
+
 
 class SyncTasks(Tasks):
     """Sync version of tasks class."""
@@ -77,30 +102,66 @@ class SyncTasks(Tasks):
         super().__init__(*args, **kwargs)
         self._cancel_save = None
         self._stop_event = threading.Event()
+        self._queue_cond = threading.Condition()
+        self._poll_thread = None
+        self._scheduler_pending = False
 
-    def add_job(self, func, *args):
+    def add_job(self, func, *args, priority=None):
         """Add a job that should return a reply to be sent.
 
         A job is a tuple of function and optional args. Keyword arguments
         can be passed via use of functools.partial. The job should return a
         string that should be sent by the gateway protocol.
         """
-        self.queue.append((func, args))
+        job = (func, args) if priority is None else (func, args, priority)
+        with self._queue_cond:
+            self.queue.append(job)
+            self._queue_cond.notify()
+
+    def call_later(self, delay, func, *args):
+        """Queue a job of func with args after delay seconds.
+
+        Return a function that cancels the call.
+        """
+        timer_thread = threading.Timer(delay, self.add_job, args=(func, *args))
+        timer_thread.daemon = True
+        timer_thread.start()
+        return timer_thread.cancel
+
+    def _scheduler_submitted(self):
+        """Wake the poll thread to send the scheduled reply."""
+        with self._queue_cond:
+            self._scheduler_pending = True
+            self._queue_cond.notify()
 
     def start(self):
         """Start the connection to a transport."""
         self.transport.connect()
-        poll_thread = threading.Thread(target=self._poll_queue)
-        poll_thread.start()
+        self._poll_thread = threading.Thread(target=self._poll_queue)
+        self._poll_thread.start()
 
     def _poll_queue(self):
-        """Poll the queue for work."""
+        """Wait for work in the queue and run all queued jobs.
+
+        Wake up when the outbound scheduler, if set, may send again.
+        """
+        delay = None
         while not self._stop_event.is_set():
-            reply = self.run_job()
-            self.transport.send(reply)
-            if self.queue:
-                continue
-            time.sleep(0.02)
+            with self._queue_cond:
+                self._queue_cond.wait_for(
+                    lambda: self.queue
+                    or self._scheduler_pending
+                    or self._stop_event.is_set(),
+                    timeout=delay,
+                )
+                self._scheduler_pending = False
+            with self.transport.coalesce():
+                while self.queue and not self._stop_event.is_set():
+                    job = self.queue.popleft()
+                    reply = self.run_job(job)
+                    self.send(reply, *job[2:])
+                if self.scheduler is not None:
+                    delay = self.scheduler.poll(self.transport.send)
 
     def _schedule_factory(self, save_sensors):
         """Return function to schedule saving sensors."""
@@ -125,7 +186,9 @@ class SyncTasks(Tasks):
         """Stop the background thread."""
         _LOGGER.info("Stopping gateway")
         self.transport.disconnect()
-        self._stop_event.set()
+        with self._queue_cond:
+            self._stop_event.set()
+            self._queue_cond.notify_all()
         if not self.persistence:
             return
         if self._cancel_save is not None:
@@ -150,6 +213,7 @@ class AsyncTasks(Tasks):
         """Set up Tasks."""
         super().__init__(*args, **kwargs)
         self._cancel_save = None
+        self._cancel_scheduler_poll = None
 
     async def start(self):
         """Start the connection to a transport."""
@@ -162,6 +226,9 @@ class AsyncTasks(Tasks):
         if self.transport.connect_task and not self.transport.connect_task.cancelled():
             self.transport.connect_task.cancel()
             self.transport.connect_task = None
+        if self._cancel_scheduler_poll is not None:
+            self._cancel_scheduler_poll()
+            self._cancel_scheduler_poll = None
         if not self.persistence:
             return
         if self._cancel_save is not None:
@@ -170,7 +237,7 @@ class AsyncTasks(Tasks):
         loop = asyncio.get_running_loop()
         await loop.run_in_executor(None, self.persistence.save_sensors)
 
-    def add_job(self, func, *args):
+    def add_job(self, func, *args, priority=None):
         """Add a job that should return a reply to be sent.
 
         A job is a tuple of function and optional args. Keyword arguments
@@ -181,7 +248,27 @@ class AsyncTasks(Tasks):
         """
         job = func, args
         reply = self.run_job(job)
-        self.transport.send(reply)
+        self.send(reply, priority)
+
+    def call_later(self, delay, func, *args):
+        """Call func with args after delay seconds in the event loop.
+
+        Return a function that cancels the call.
+        """
+        loop = asyncio.get_running_loop()
+        return loop.call_later(delay, func, *args).cancel
+
+    def _scheduler_submitted(self):
+        """Send scheduled replies and schedule the next poll of the scheduler."""
+        if self._cancel_scheduler_poll is not None:
+            self._cancel_scheduler_poll()
+            self._cancel_scheduler_poll = None
+        delay = self.scheduler.poll(self.transport.send)
+        if delay is None:
+            return
+        loop = asyncio.get_running_loop()
+        handle = loop.call_later(delay, self._scheduler_submitted)
+        self._cancel_scheduler_poll = handle.cancel
 
     def _schedule_factory(self, save_sensors):
         """Return function to schedule saving sensors."""
@@ -210,13 +297,17 @@ class AsyncTasks(Tasks):
 
         return schedule_save
 
-    async def start_persistence(self):
-        """Load persistence file and schedule saving of persistence file."""
+    async def start_persistence(self, schedule_save=True):
+        """Load persistence file and schedule saving of persistence file.
+
+        If schedule_save is False, saving is left to the caller.
+        """
         if not self.persistence:
             return
         loop = asyncio.get_running_loop()
         await loop.run_in_executor(None, self.persistence.safe_load_sensors)
-        await self.persistence.schedule_save_sensors()
+        if schedule_save:
+            await self.persistence.schedule_save_sensors()
 
     async def update_fw(self, nids, fw_type, fw_ver, fw_path=None):
         """Start update firmware of all node_ids in nids in executor."""
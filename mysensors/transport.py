@@ -1,13 +1,21 @@
 """Organize MySensors transports."""
 
 import asyncio
+from contextlib import contextmanager
 import logging
 import threading
+from timeit import default_timer as timer
 
 import serial.threaded
 
+from .message import Message
+from .stats import COUNTER_MESSAGES_SENT, COUNTER_RECONNECTS, STAGE_TRANSPORT_WRITE
+
 _LOGGER = logging.getLogger(__name__)
 
+WRITE_HIGH_WATERMARK = 4096
+WRITE_LOW_WATERMARK = 1024
+
 
 class Transport:
     """Handle gateway transport.
@@ -16,17 +24,69 @@ class Transport:
     are related to the gateway transport type.
     """
 
-    # pylint: disable=unused-argument
-
-    def __init__(self, gateway, connect, timeout=1.0, reconnect_timeout=10.0, **kwargs):
+    # pylint: disable=too-many-instance-attributes, unused-argument
+
+    def __init__(
+        self,
+        gateway,
+        connect,
+        timeout=1.0,
+        reconnect_timeout=10.0,
+        write_high_watermark=WRITE_HIGH_WATERMARK,
+        write_low_watermark=WRITE_LOW_WATERMARK,
+        **kwargs,
+    ):
         """Set up transport."""
         self._connect = connect
+        self._coalesce_depth = 0
+        self._connected_before = False
+        self._write_buffer = bytearray()
         self.can_log = False
         self.connect_task = None
         self.gateway = gateway
         self.protocol = None
         self.reconnect_timeout = reconnect_timeout
         self.timeout = timeout
+        self.write_high_watermark = write_high_watermark
+        self.write_low_watermark = write_low_watermark
+
+    @property
+    def writing_paused(self):
+        """Return True if the gateway can't keep up with written data."""
+        return bool(self.protocol and self.protocol.writing_paused)
+
+    @contextmanager
+    def coalesce(self):
+        """Coalesce messages sent within the context into one write."""
+        self._coalesce_depth += 1
+        try:
+            yield
+        finally:
+            self._coalesce_depth -= 1
+            if not self._coalesce_depth:
+                self.flush()
+
+    def _count_connect(self):
+        """Count a connect after the first one as a reconnect."""
+        if not self._connected_before:
+            self._connected_before = True
+            return
+        stats = getattr(self.gateway, "stats", None)
+        if stats is not None and stats.enabled:
+            stats.count(COUNTER_RECONNECTS)
+
+    def _count_sent(self, message):
+        """Count the sent messages per type and sub type.
+
+        Message is a Message, command string or bytes.
+        """
+        stats = getattr(self.gateway, "stats", None)
+        if stats is None or not stats.enabled:
+            return
+        if isinstance(message, Message):
+            stats.count(COUNTER_MESSAGES_SENT, message.type, message.sub_type)
+        else:
+            stats.count_lines(COUNTER_MESSAGES_SENT, message)
 
     def disconnect(self):
         """Disconnect from the transport."""
@@ -38,19 +98,71 @@ class Transport:
         self.protocol = None
 
     def send(self, message):
-        """Write a message to the gateway."""
+        """Write a message, as a Message, command string or bytes, to the gateway.
+
+        Messages are encoded into a reusable write buffer. Messages sent
+        while coalescing are buffered and written together, unless the
+        buffer reaches the high watermark.
+        """
+        if self._buffer(message):
+            self.flush()
+
+    def _buffer(self, message):
+        """Encode message into the write buffer.
+
+        Return True if the write buffer should be written now.
+        """
         if not message or not self.protocol or not self.protocol.transport:
+            return False
+        if isinstance(message, Message):
+            if message.encode_into(self._write_buffer) is None:
+                return False
+            if not self.can_log:
+                _LOGGER.debug("Sending %s", message)
+        else:
+            if not self.can_log:
+                _LOGGER.debug("Sending %s", message.strip())
+            self._write_buffer += (
+                message.encode() if isinstance(message, str) else message
+            )
+        self._count_sent(message)
+        return (
+            not self._coalesce_depth
+            or len(self._write_buffer) >= self.write_high_watermark
+        )
+
+    def flush(self):
+        """Write all buffered messages to the gateway in one write."""
+        data = self._take_buffer()
+        if data:
+            self._write(data)
+
+    def _take_buffer(self):
+        """Return and clear the buffered data, or None if empty."""
+        if not self._write_buffer:
+            return None
+        # Return a copy, since a transport may keep a reference to the data.
+        data = bytes(self._write_buffer)
+        self._write_buffer.clear()
+        return data
+
+    def _write(self, data):
+        """Write data to the gateway."""
+        if not self.protocol or not self.protocol.transport:
             return
-        if not self.can_log:
-            _LOGGER.debug("Sending %s", message.strip())
+        stats = getattr(self.gateway, "stats", None)
+        start = timer() if stats is not None and stats.enabled else None
         try:
-            self.protocol.transport.write(message.encode())
+            self.protocol.transport.write(data)
         except OSError as exc:
             _LOGGER.error(
                 "Failed writing to transport %s: %s", self.protocol.transport, exc
             )
             self.protocol.transport.close()
             self.protocol.conn_lost_callback()
+        finally:
+            if start is not None:
+                stats.record(STAGE_TRANSPORT_WRITE, timer() - start)
 
 
 class SyncTransport(Transport):
@@ -59,18 +171,51 @@ class SyncTransport(Transport):
     def __init__(self, *args, **kwargs):
         """Set up transport."""
         super().__init__(*args, **kwargs)
-        self._lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
         self.protocol = BaseMySensorsProtocol(self.gateway, self.connect)
 
     def connect(self):
         """Connect to the transport."""
+        self._count_connect()
         connect_thread = threading.Thread(target=self._connect, args=(self,))
         connect_thread.start()
 
     def send(self, message):
         """Write a message to the gateway."""
         with self._lock:
-            super().send(message)
+            flush = self._buffer(message)
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered messages to the gateway in one write.
+
+        If writing is paused, wait up to timeout seconds for the gateway to
+        resume writing. If it doesn't, keep the messages buffered until the
+        next flush. Messages can be buffered by other threads meanwhile.
+        """
+        if not self.wait_writable(self.timeout):
+            _LOGGER.warning(
+                "Writing to gateway is paused, keeping %s bytes buffered",
+                len(self._write_buffer),
+            )
+            return
+        with self._write_lock:
+            with self._lock:
+                data = self._take_buffer()
+            if data:
+                self._write(data)
+
+    def wait_writable(self, timeout=None):
+        """Block until the gateway can accept more data or timeout passes.
+
+        Return True if writing is not paused.
+        """
+        protocol = self.protocol
+        if protocol is None:
+            return True
+        return protocol.write_ready.wait(timeout)
 
 
 class AsyncTransport(Transport):
@@ -91,19 +236,55 @@ class AsyncTransport(Transport):
 
     async def connect(self):
         """Connect to the transport."""
+        self._count_connect()
         await self._connect(self)
 
+    def send(self, message):
+        """Write a message to the gateway.
+
+        Messages sent in the same event loop iteration are written together.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            super().send(message)
+            return
+        if message and not self._coalesce_depth:
+            self._coalesce_depth += 1
+            loop.call_soon(self._end_coalesce)
+        super().send(message)
+
+    def _end_coalesce(self):
+        """End coalescing of messages sent in the last loop iteration."""
+        self._coalesce_depth -= 1
+        if not self._coalesce_depth:
+            self.flush()
+
+    async def drain(self):
+        """Wait until the gateway can accept more data."""
+        if self.protocol is None:
+            return
+        await self.protocol.write_ready.wait()
+
 
 class BaseMySensorsProtocol(serial.threaded.LineReader):
     """MySensors base protocol class."""
 
     TERMINATOR = b"\n"
+    write_ready_factory = threading.Event
 
     def __init__(self, gateway, conn_lost_callback):
         """Set up base protocol."""
         super().__init__()
         self.gateway = gateway
         self.conn_lost_callback = conn_lost_callback
+        self.write_ready = self.write_ready_factory()
+        self.write_ready.set()
+
+    @property
+    def writing_paused(self):
+        """Return True if writing to the transport is paused."""
+        return not self.write_ready.is_set()
 
     def __repr__(self):
         """Return the representation."""
@@ -116,14 +297,55 @@ class BaseMySensorsProtocol(serial.threaded.LineReader):
             _LOGGER.info("Connected to %s", self.transport.serial)
         else:
             _LOGGER.info("Connected to %s", self.transport)
+        set_write_buffer_limits = getattr(
+            self.transport, "set_write_buffer_limits", None
+        )
+        if set_write_buffer_limits is not None:
+            set_write_buffer_limits(
+                high=self.gateway.tasks.transport.write_high_watermark,
+                low=self.gateway.tasks.transport.write_low_watermark,
+            )
+        self.write_ready.set()
         self._connection_made()
 
+    def pause_writing(self):
+        """Pause writing when the transport buffer is above the high watermark."""
+        _LOGGER.debug("Pausing writing to %s", self.transport)
+        self.write_ready.clear()
+
+    def resume_writing(self):
+        """Resume writing when the transport buffer is below the low watermark."""
+        _LOGGER.debug("Resuming writing to %s", self.transport)
+        self.write_ready.set()
+
+    def data_received(self, data):
+        """Buffer received data and handle all complete lines together."""
+        self.buffer.extend(data)
+        if self.TERMINATOR not in self.buffer:
+            return
+        *packets, self.buffer = self.buffer.split(self.TERMINATOR)
+        if len(packets) == 1:
+            self.handle_packet(packets[0])
+            return
+        self.handle_lines(packets)
+
+    def handle_packet(self, packet):
+        """Handle a received line as bytes, without decoding it to text."""
+        self.handle_line(packet)
+
     def handle_line(self, line):
-        """Handle incoming string data one line at a time."""
+        """Handle incoming data one line at a time."""
         if not self.gateway.tasks.transport.can_log:
-            _LOGGER.debug("Receiving %s", line)
+            _LOGGER.debug("Receiving %s", _line_text(line))
         self.gateway.tasks.add_job(self.gateway.logic, line)
 
+    def handle_lines(self, lines):
+        """Handle many lines of incoming data as one job."""
+        if not self.gateway.tasks.transport.can_log:
+            for line in lines:
+                _LOGGER.debug("Receiving %s", _line_text(line))
+        self.gateway.tasks.add_job(self.gateway.logic_many, lines)
+
     def connection_lost(self, exc):
         """Handle lost connection."""
         _LOGGER.debug("Connection lost with %s", self.transport.serial)
@@ -138,6 +360,7 @@ class BaseMySensorsProtocol(serial.threaded.LineReader):
 
     def _connection_lost(self, exc):
         """Call connection lost callbacks."""
+        self.write_ready.set()
         if self.gateway.on_conn_lost is not None:
             self.gateway.on_conn_lost(self.gateway, exc)
         if exc:
@@ -149,7 +372,16 @@ class BaseMySensorsProtocol(serial.threaded.LineReader):
 class AsyncMySensorsProtocol(BaseMySensorsProtocol, asyncio.Protocol):
     """Async serial protocol class."""
 
+    write_ready_factory = asyncio.Event
+
     def connection_lost(self, exc):
         """Handle lost connection."""
         _LOGGER.debug("Connection lost with %s", self.transport)
         self._connection_lost(exc)
+
+
+def _line_text(line):
+    """Return a received line as text for logging."""
+    if isinstance(line, str):
+        return line
+    return bytes(line).decode("utf-8", "replace")
@@ -0,0 +1,60 @@
+"""Test node id allocator."""
+
+from mysensors.allocator import NodeIdAllocator
+
+
+def test_allocate_lowest_free_id():
+    """Test that the lowest free id is allocated."""
+    allocator = NodeIdAllocator()
+    assert allocator.allocate() == 1
+    assert allocator.allocate() == 2
+    allocator.claim(3)
+    assert allocator.allocate() == 4
+    allocator.release(2)
+    assert allocator.is_free(2)
+    assert allocator.allocate() == 2
+    assert not allocator.is_free(2)
+
+
+def test_allocate_no_free_id():
+    """Test that None is returned when all ids are used."""
+    allocator = NodeIdAllocator(max_id=3)
+    assert [allocator.allocate() for _ in range(4)] == [1, 2, 3, None]
+
+
+def test_reserve():
+    """Test that reserved ids are not allocated or released."""
+    allocator = NodeIdAllocator(max_id=5)
+    allocator.reserve(1, 3)
+    allocator.reserve(5)
+    assert allocator.allocate() == 4
+    assert allocator.allocate() is None
+    allocator.claim(2)
+    allocator.release(2)
+    assert not allocator.is_free(2)
+    allocator.sync([])
+    assert allocator.allocate() == 4
+
+
+def test_sync():
+    """Test that sync marks the given ids as used."""
+    allocator = NodeIdAllocator()
+    allocator.allocate()
+    allocator.sync([2, 3])
+    assert allocator.allocate() == 1
+    assert allocator.allocate() == 4
+
+
+def test_recycle():
+    """Test recycling the id of the node silent the longest."""
+    allocator = NodeIdAllocator(max_id=3)
+    assert allocator.recycle(now=100) is None
+    allocator.recycle_after = 60
+    for node_id in range(1, 4):
+        allocator.claim(node_id, now=node_id)
+    allocator.seen(1, now=50)
+    assert allocator.recycle(now=61) is None
+    assert allocator.recycle(now=62) == 2
+    assert not allocator.is_free(2)
+    assert allocator.recycle(now=63) == 3
+    assert allocator.recycle(now=63) is None
@@ -0,0 +1,18 @@
+"""Test the benchmark suite."""
+
+import json
+
+from benchmarks.__main__ import BENCHMARKS, main
+
+
+def test_run_benchmarks(tmp_path):
+    """Test that all benchmarks run and write a JSON report."""
+    output = tmp_path / "report.json"
+    main(["--scale", "0.001", "--output", str(output)])
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert report["unit"] == "us"
+    assert list(report["results"]) == list(BENCHMARKS)
+    assert report["results"]["logic"]["set_2.0"] > 0
+    assert report["results"]["sensor"]["logic_set_unchanged"] > 0
+    assert report["results"]["persistence"]["save_sqlite_1000"] > 0
+    assert report["results"]["gateway"]["async_latency"]["p99"] > 0
@@ -0,0 +1,149 @@
+"""Test coalescing of child value updates."""
+
+import pytest
+
+from mysensors import BaseSyncGateway
+from mysensors.coalesce import UpdateCoalescer
+
+# pylint: disable=redefined-outer-name
+
+
+class FakeTimers:
+    """Represent timers that fire when told to."""
+
+    def __init__(self):
+        """Set up timers."""
+        self.calls = []
+
+    def call_later(self, delay, func, *args):
+        """Store the call and return a cancel function."""
+        call = [delay, func, args, False]
+        self.calls.append(call)
+
+        def cancel():
+            call[3] = True
+
+        return cancel
+
+    def fire(self):
+        """Run all calls that are not cancelled."""
+        calls, self.calls = self.calls, []
+        for _, func, args, cancelled in calls:
+            if not cancelled:
+                func(*args)
+
+
+@pytest.fixture
+def timers():
+    """Return fake timers."""
+    return FakeTimers()
+
+
+@pytest.fixture
+def gateway(timers):
+    """Return a gateway with a presented power meter that records alerts."""
+    _gateway = BaseSyncGateway(None, protocol_version="2.2")
+    _gateway.tasks.call_later = timers.call_later
+    _gateway.logic("1;255;0;0;17;2.2.0\n")
+    _gateway.logic("1;1;0;0;13;\n")
+    _gateway.alerts = []
+    _gateway.event_callback = lambda msg: _gateway.alerts.append(msg.payload)
+    return _gateway
+
+
+def test_no_coalescer(gateway):
+    """Test that every update alerts by default."""
+    for payload in ("10", "10", "10"):
+        gateway.logic(f"1;1;1;0;17;{payload}\n")
+    assert gateway.alerts == ["10", "10", "10"]
+
+
+def test_suppress_unchanged(gateway):
+    """Test that unchanged values don't alert."""
+    gateway.stats.enabled = True
+    gateway.update_coalescer = UpdateCoalescer()
+    for payload in ("10", "10", "11", "11", "10"):
+        gateway.logic(f"1;1;1;0;17;{payload}\n")
+    assert gateway.alerts == ["10", "11", "10"]
+    assert gateway.sensors[1].children[1].values[17] == "10"
+    assert gateway.stats.counters()[("updates_coalesced", None, None)] == 2
+
+
+def test_throttle(gateway, timers):
+    """Test that updates within the throttle window alert once at its end."""
+    gateway.update_coalescer = UpdateCoalescer(throttle=1.0)
+    for payload in ("10", "11", "12", "13"):
+        gateway.logic(f"1;1;1;0;17;{payload}\n")
+    assert gateway.alerts == ["10"]
+    assert gateway.sensors[1].children[1].values[17] == "13"
+    timers.fire()
+    assert gateway.alerts == ["10", "13"]
+    # The alert at the end of the window starts a new window.
+    gateway.logic("1;1;1;0;17;14\n")
+    assert gateway.alerts == ["10", "13"]
+    timers.fire()
+    assert gateway.alerts == ["10", "13", "14"]
+    timers.fire()
+    assert not timers.calls
+    gateway.logic("1;1;1;0;17;15\n")
+    assert gateway.alerts == ["10", "13", "14", "15"]
+
+
+def test_throttle_back_to_alerted_value(gateway, timers):
+    """Test that a held value equal to the alerted value is dropped."""
+    gateway.update_coalescer = UpdateCoalescer(throttle=1.0)
+    for payload in ("10", "11", "10"):
+        gateway.logic(f"1;1;1;0;17;{payload}\n")
+    timers.fire()
+    assert gateway.alerts == ["10"]
+
+
+def test_debounce(gateway, timers):
+    """Test that only the last update of a burst alerts."""
+    gateway.update_coalescer = UpdateCoalescer(debounce=0.5)
+    for payload in ("10", "11", "12"):
+        gateway.logic(f"1;1;1;0;17;{payload}\n")
+    assert gateway.alerts == []
+    timers.fire()
+    assert gateway.alerts == ["12"]
+
+
+def test_debounce_stale_timer(gateway, timers):
+    """Test that a cancelled timer that still calls back doesn't alert."""
+    gateway.update_coalescer = UpdateCoalescer(debounce=0.5)
+    gateway.logic("1;1;1;0;17;10\n")
+    stale = timers.calls[0]
+    gateway.logic("1;1;1;0;17;11\n")
+    stale[1](*stale[2])
+    assert gateway.alerts == []
+    timers.fire()
+    assert gateway.alerts == ["11"]
+
+
+def test_throttle_stale_timer(gateway, timers):
+    """Test that a stale throttle timer doesn't end the current window."""
+    gateway.update_coalescer = UpdateCoalescer(throttle=1.0)
+    gateway.logic("1;1;1;0;17;10\n")
+    stale = timers.calls[0]
+    gateway.logic("1;1;1;0;17;11\n")
+    timers.fire()
+    gateway.logic("1;1;1;0;17;12\n")
+    stale[1](*stale[2])
+    assert gateway.alerts == ["10", "11"]
+    timers.fire()
+    assert gateway.alerts == ["10", "11", "12"]
+
+
+def test_flush(gateway, timers):
+    """Test that flush alerts held updates and cancels timers."""
+    gateway.update_coalescer = UpdateCoalescer(suppress_unchanged=False, debounce=1)
+    gateway.logic("1;1;1;0;17;10\n")
+    gateway.update_coalescer.flush()
+    assert gateway.alerts == ["10"]
+    assert all(call[3] for call in timers.calls)
+
+
+def test_debounce_and_throttle():
+    """Test that debounce and throttle can't both be set."""
+    with pytest.raises(ValueError):
+        UpdateCoalescer(debounce=1, throttle=1)
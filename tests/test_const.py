@@ -0,0 +1,40 @@
+"""Test const helpers."""
+
+import pytest
+
+from mysensors import const as const_helpers
+from mysensors.const import get_const, get_const_version, get_version_tuple
+
+
+@pytest.mark.parametrize(
+    "protocol_version, const_version",
+    [
+        ("1.4", "1.4"),
+        ("1.4.1", "1.4"),
+        ("1.5.4", "1.5"),
+        ("2.0", "2.0"),
+        ("2.0.0-beta", "1.5"),
+        ("2.1.1", "2.1"),
+        ("2.3.2", "2.2"),
+        ("2.4", "2.4"),
+        ("3.0", "2.4"),
+        ("1.0", "1.4"),
+    ],
+)
+def test_get_const_version(protocol_version, const_version):
+    """Test resolving the const version of a protocol version."""
+    assert get_const_version(protocol_version) == const_version
+    assert get_version_tuple(protocol_version) == tuple(
+        int(part) for part in const_version.split(".")
+    )
+    module_name = f"mysensors.const_{const_version.replace('.', '')}"
+    assert get_const(protocol_version).__name__ == module_name
+
+
+def test_get_const_version_cached(monkeypatch):
+    """Test that the const version is resolved once per version string."""
+    monkeypatch.setattr(const_helpers, "RESOLVED_VERSIONS", {})
+    assert get_const_version("2.3.2") == "2.2"
+    assert const_helpers.RESOLVED_VERSIONS == {"2.3.2": "2.2"}
+    const_helpers.RESOLVED_VERSIONS["2.3.2"] = "2.0"
+    assert get_const_version("2.3.2") == "2.0"
@@ -0,0 +1,165 @@
+"""Test event callback dispatch."""
+
+import asyncio
+import threading
+
+import pytest
+
+from mysensors import BaseAsyncGateway, BaseSyncGateway
+from mysensors.dispatch import (
+    POLICY_COALESCE,
+    POLICY_DROP_NEWEST,
+    AsyncDispatcher,
+    EventQueue,
+    SyncDispatcher,
+)
+from mysensors.message import Message
+
+
+def make_msg(node_id, payload="1"):
+    """Return a set message for node_id."""
+    return Message(f"{node_id};1;1;0;2;{payload}\n")
+
+
+def test_queue_drop_oldest():
+    """Test that the oldest event is dropped from a full queue."""
+    queue = EventQueue(maxsize=2)
+    assert queue.put(print, make_msg(1)) == 0
+    assert queue.put(print, make_msg(2)) == 0
+    assert queue.put(print, make_msg(3)) == 1
+    assert [queue.get()[1].node_id for _ in range(2)] == [2, 3]
+    assert queue.get() is None
+    assert queue.dropped == 1
+
+
+def test_queue_drop_newest():
+    """Test that the new event is dropped when the queue is full."""
+    queue = EventQueue(maxsize=1, policy=POLICY_DROP_NEWEST)
+    queue.put(print, make_msg(1))
+    assert queue.put(print, make_msg(2)) == 1
+    assert queue.get()[1].node_id == 1
+    assert not queue
+
+
+def test_queue_coalesce():
+    """Test that events for the same value are coalesced."""
+    queue = EventQueue(maxsize=2, policy=POLICY_COALESCE)
+    queue.put(print, make_msg(1, "0"))
+    queue.put(print, make_msg(2))
+    assert queue.put(print, make_msg(1, "1")) == 0
+    assert len(queue) == 2
+    _, msg = queue.get()
+    assert (msg.node_id, msg.payload) == (1, "1")
+    assert queue.put(print, make_msg(3)) == 0
+    assert queue.put(print, make_msg(4)) == 1
+    assert queue.dropped == 1
+
+
+def test_queue_bad_policy():
+    """Test that an unknown policy is rejected."""
+    with pytest.raises(ValueError):
+        EventQueue(policy="unknown")
+
+
+def test_sync_gateway_dispatch():
+    """Test that a slow event callback doesn't block message handling."""
+    release = threading.Event()
+    calls = []
+
+    def event_callback(msg):
+        """Block until released."""
+        release.wait(5)
+        calls.append((msg.node_id, threading.current_thread().name))
+
+    gateway = BaseSyncGateway(
+        None, event_callback=event_callback, protocol_version="2.2"
+    )
+    gateway.stats.enabled = True
+    gateway.event_dispatcher = SyncDispatcher(maxsize=1)
+    gateway.logic("1;255;0;0;17;2.2.0\n")
+    gateway.logic("2;255;0;0;17;2.2.0\n")
+    gateway.logic("3;255;0;0;17;2.2.0\n")
+    assert not calls
+    release.set()
+    assert gateway.event_dispatcher.join(5)
+    assert calls[-1] == (3, "mysensors-dispatch-0")
+    assert gateway.stats.counters()[("events_dropped", None, None)] >= 1
+    assert gateway.stats.summary()["event_callback"]["types"]["0;17"]["count"]
+    gateway.event_dispatcher.stop()
+
+
+def test_sync_dispatcher_callback_error(caplog):
+    """Test that errors in callbacks are logged."""
+    dispatcher = SyncDispatcher()
+
+    def event_callback(msg):
+        """Raise an error."""
+        raise ValueError("bad callback")
+
+    dispatcher.dispatch(event_callback, make_msg(1))
+    assert dispatcher.join(5)
+    dispatcher.stop()
+    assert "bad callback" in caplog.text
+
+
+def test_async_gateway_dispatch():
+    """Test that event callbacks run as tasks for async gateways."""
+    calls = []
+
+    async def event_callback(msg):
+        """Record message after a sleep."""
+        await asyncio.sleep(0)
+        calls.append(msg.node_id)
+
+    async def run():
+        """Run gateway logic in the event loop."""
+        gateway = BaseAsyncGateway(
+            None, event_callback=event_callback, protocol_version="2.2"
+        )
+        gateway.event_dispatcher = AsyncDispatcher(workers=2)
+        gateway.logic("1;255;0;0;17;2.2.0\n")
+        gateway.logic("2;255;0;0;17;2.2.0\n")
+        assert not calls
+        await gateway.event_dispatcher.join()
+        assert sorted(calls) == [1, 2]
+
+        sync_calls = []
+        gateway.event_callback = lambda msg: sync_calls.append(
+            threading.current_thread() is threading.main_thread()
+        )
+        gateway.logic("3;255;0;0;17;2.2.0\n")
+        await gateway.event_dispatcher.join()
+        assert sync_calls == [True]
+        gateway.event_dispatcher.run_in_executor = True
+        gateway.logic("4;255;0;0;17;2.2.0\n")
+        await gateway.event_dispatcher.join()
+        assert sync_calls == [True, False]
+        await gateway.event_dispatcher.stop()
+
+    asyncio.run(run())
+
+
+def test_async_dispatch_without_running_loop():
+    """Test dispatching before start and from other threads."""
+    calls = []
+    dispatcher = AsyncDispatcher()
+    dispatcher.dispatch(calls.append, make_msg(1))
+
+    async def run():
+        """Start the dispatcher and dispatch from another thread."""
+        await asyncio.sleep(0)
+        assert not calls
+        dispatcher.start()
+        await dispatcher.join()
+        assert [msg.node_id for msg in calls] == [1]
+        thread = threading.Thread(
+            target=dispatcher.dispatch, args=(calls.append, make_msg(2))
+        )
+        thread.start()
+        await asyncio.get_running_loop().run_in_executor(None, thread.join)
+        await asyncio.sleep(0)
+        await dispatcher.join()
+        assert [msg.node_id for msg in calls] == [1, 2]
+        await dispatcher.stop()
+
+    asyncio.run(run())
@@ -1,12 +1,19 @@
 """Test mysensors MQTT gateway with unittest."""
 
+import asyncio
 import logging
 import time
 from unittest import mock
 
 import pytest
 
-from mysensors.gateway_mqtt import MQTTGateway
+from mysensors.cli.gateway_mqtt import BaseMQTTClient
+from mysensors.gateway_mqtt import (
+    AsyncMQTTGateway,
+    MQTTGateway,
+    TopicMatcher,
+    topic_matches,
+)
 from mysensors.sensor import Sensor
 
 # pylint: disable=redefined-outer-name
@@ -236,3 +243,196 @@ def test_get_gateway_id(mock_pub, mock_sub):
     )
     gateway_id = gateway.get_gateway_id()
     assert gateway_id == "test/test-in"
+
+
+def test_wildcard_subscription(mock_pub, mock_sub):
+    """Test that wildcard subscription subscribes once and filters topics."""
+    gateway = get_gateway(mock_pub, mock_sub, wildcard_subscription=True)
+    sensor = get_sensor(1, gateway)
+    sensor.add_child_sensor(1, gateway.const.Presentation.S_HUM)
+    sensor.children[1].values[gateway.const.SetReq.V_HUM] = "20"
+    gateway.init_topics()
+    assert mock_sub.mock_calls == [
+        mock.call("/+/+/+/+/+", gateway.tasks.transport.recv, 0)
+    ]
+    assert gateway.parse_mqtt_to_message("/1/1/2/0/1", "", 0) == "1;1;2;0;1;"
+    assert gateway.parse_mqtt_to_message("/1/2/2/0/1", "", 0) is None
+    assert gateway.parse_mqtt_to_message("/2/1/1/0/1", "20", 0) is None
+    assert gateway.parse_mqtt_to_message("/1/255/4/0/0", "01", 1) == "1;255;4;1;0;01"
+    assert gateway.parse_mqtt_to_message("/2/255/3/0/3", "", 0) == "2;255;3;0;3;"
+    gateway.logic("1;2;0;0;7;Humidity Sensor\n")
+    assert mock_sub.call_count == 1
+    assert gateway.parse_mqtt_to_message("/1/2/1/0/1", "30", 0) == "1;2;1;0;1;30"
+
+
+@pytest.mark.parametrize(
+    "topic_filter, topic, result",
+    [
+        ("in/+/+/0/+/+", "in/1/255/0/0/17", True),
+        ("in/+/+/0/+/+", "in/1/255/1/0/17", False),
+        ("in/#", "in/1/255/1/0/17", True),
+        ("in/+", "in/1/255", False),
+        ("in/1/255", "in/1", False),
+        ("mygateway1-out/#", "mygateway1-out/1/1/1/0/0", True),
+        ("mygateway1-out/#", "mygateway1-out", True),
+        ("mygateway1-out/+/+/1/+/+", "mygateway1-out/1/1/1/0/0", True),
+        ("mygateway1-out/+/+/1/+/+", "mygateway1-out/1/1/2/0/0", False),
+        ("mygateway1-out/1/1/1/0/0", "mygateway1-out/1/1/1/0/0", True),
+        ("mygateway1-out/1/1/1/0", "mygateway1-out/1/1/1/0/0", False),
+        ("mygateway1-out/1/1/1/0/0/1", "mygateway1-out/1/1/1/0/0", False),
+        ("/+/+/+/+/+", "/1/1/1/0/0", True),
+        ("/+/+/+/+/+", "1/1/1/0/0", False),
+    ],
+)
+def test_topic_matches(topic_filter, topic, result):
+    """Test matching MQTT topic filters with wildcards."""
+    assert topic_matches(topic_filter, topic) is result
+
+
+@pytest.mark.parametrize(
+    "topic_filter, topic, levels",
+    [
+        ("in/+/+/+/+/+", "in/1/255/0/0/17", ["1", "255", "0", "0", "17"]),
+        ("in/+/255/+", "in/1/255/0", ["1", "0"]),
+        ("in/+/#", "in/1/255/0", ["1", "255", "0"]),
+        ("in/1/255", "in/1/255", []),
+        ("in/+/+/+/+/+", "out/1/255/0/0/17", None),
+    ],
+)
+def test_topic_matcher_levels(topic_filter, topic, levels):
+    """Test topic matcher returns the topic levels matched by wildcards."""
+    assert TopicMatcher(topic_filter).match(topic) == levels
+
+
+def test_parse_mqtt_to_message_levels(gateway):
+    """Test that topics without five levels after the prefix are ignored."""
+    assert gateway.parse_mqtt_to_message("/1/1/2/0", "", 0) is None
+    assert gateway.parse_mqtt_to_message("/x/1/1/2/0/1", "", 0) is None
+    assert gateway.parse_mqtt_to_message("/1/1/2/0/1", 20, 0) == "1;1;2;0;1;20"
+
+
+def test_decode_mqtt(gateway):
+    """Test decoding a topic and payload directly to a message."""
+    msg = gateway.decode_mqtt("/1/2/1/1/0", 20.5, 1)
+    assert msg.as_dict() == {
+        "node_id": 1,
+        "child_id": 2,
+        "type": 1,
+        "ack": 1,
+        "sub_type": 0,
+        "payload": "20.5",
+    }
+    assert gateway.decode_mqtt("wrong/1/2/1/1/0", "", 0) is None
+    assert gateway.decode_mqtt("/1/x/1/1/0", "", 0) is None
+    assert gateway.decode_mqtt("/1/2/1/1/0", "20.5 \r\n", 0).payload == "20.5"
+    assert gateway.decode_mqtt("/1/2/1/1/0", "20;5", 0) is None
+
+
+def test_parse_message_to_mqtt(gateway):
+    """Test encoding messages and command strings to topic, payload and qos."""
+    expected = ("/1/2/1/1/0", "20.5", 1)
+    assert gateway.parse_message_to_mqtt("1;2;1;1;0;20.5\n") == expected
+    assert gateway.parse_message_to_mqtt(b"1;2;1;1;0;20.5\n") == expected
+    msg = gateway.decode_mqtt("/1/2/1/1/0", "20.5", 1)
+    assert gateway.parse_message_to_mqtt(msg) == expected
+    with pytest.raises(ValueError):
+        gateway.parse_message_to_mqtt("1;2;1;1;20.5\n")
+
+
+def test_send_message(gateway, mock_pub):
+    """Test publishing a message without encoding it to a command string."""
+    gateway.tasks.transport.send(gateway.decode_mqtt("/1/1/1/0/1", "20", 0))
+    assert mock_pub.call_args == mock.call("/1/1/1/0/1", "20", 0, True)
+
+
+def test_subscribe_many(mock_pub, mock_sub):
+    """Test subscribing to many topics with one call."""
+    sub_many = mock.Mock()
+    gateway = get_gateway(mock_pub, mock_sub, sub_many_callback=sub_many)
+    sensor = get_sensor(1, gateway)
+    sensor.add_child_sensor(1, gateway.const.Presentation.S_HUM)
+    gateway.tasks.persistence = mock.Mock()
+    gateway.init_topics()
+    recv = gateway.tasks.transport.recv
+    assert sub_many.mock_calls == [
+        mock.call([("/+/+/0/+/+", 0), ("/+/+/3/+/+", 0)], recv),
+        mock.call([("/1/1/1/+/+", 0), ("/1/1/2/+/+", 0), ("/1/+/4/+/+", 0)], recv),
+    ]
+    gateway.tasks.transport.handle_subscription("/1/2/1/+/+")
+    assert mock_sub.mock_calls == [mock.call("/1/2/1/+/+", recv, 0)]
+
+
+def test_publish_many(mock_pub, mock_sub):
+    """Test publishing messages sent while coalescing with one call."""
+    pub_many = mock.Mock()
+    gateway = get_gateway(mock_pub, mock_sub, pub_many_callback=pub_many)
+    transport = gateway.tasks.transport
+    with transport.coalesce():
+        transport.send("1;1;1;0;1;20\n")
+        transport.send("1;1;1;0;1;21\n")
+        assert not pub_many.called
+    assert pub_many.mock_calls == [
+        mock.call([("/1/1/1/0/1", "20", 0, True), ("/1/1/1/0/1", "21", 0, True)])
+    ]
+    transport.send("1;1;1;0;1;22\n")
+    assert mock_pub.mock_calls == [mock.call("/1/1/1/0/1", "22", 0, True)]
+
+
+def test_publish_many_batch_size(mock_pub, mock_sub):
+    """Test that a full publish buffer is published while coalescing."""
+    pub_many = mock.Mock()
+    gateway = get_gateway(mock_pub, mock_sub, pub_many_callback=pub_many)
+    transport = gateway.tasks.transport
+    with mock.patch("mysensors.gateway_mqtt.PUBLISH_BATCH_SIZE", 2):
+        with transport.coalesce():
+            for payload in range(3):
+                transport.send(f"1;1;1;0;1;{payload}\n")
+            assert len(pub_many.call_args[0][0]) == 2
+    assert len(pub_many.call_args[0][0]) == 1
+    assert pub_many.call_count == 2
+
+
+def test_async_publish_many(mock_pub, mock_sub):
+    """Test publishing replies of one event loop iteration with one call."""
+    pub_many = mock.Mock()
+    gateway = AsyncMQTTGateway(mock_pub, mock_sub, pub_many_callback=pub_many)
+    transport = gateway.tasks.transport
+
+    async def run():
+        with mock.patch(
+            "mysensors.handler.time.localtime", return_value=time.gmtime(0)
+        ):
+            transport.recv("/1/255/3/0/1", "", 0)
+            transport.recv("/2/255/3/0/1", "", 0)
+        assert not pub_many.called
+        await asyncio.sleep(0)
+        assert pub_many.mock_calls == [
+            mock.call([("/1/255/3/0/1", "0", 0, True), ("/2/255/3/0/1", "0", 0, True)])
+        ]
+        transport.send("1;1;1;0;1;20\n")
+        transport.send("1;1;1;0;1;21\n")
+        await asyncio.sleep(0)
+        assert pub_many.call_count == 2
+        assert not mock_pub.called
+
+    asyncio.run(run())
+
+
+def test_cli_client_subscribe_many():
+    """Test that the CLI MQTT client subscribes to many topics at once."""
+    with mock.patch("paho.mqtt.client.Client") as client_class:
+        mqttc = BaseMQTTClient("localhost")
+    client = client_class.return_value
+    callback = mock.Mock()
+    mqttc.subscribe("/1/1/1/+/+", callback, 0)
+    mqttc.subscribe_many([("/1/1/1/+/+", 0), ("/1/1/2/+/+", 1)], callback)
+    assert client.subscribe.mock_calls == [
+        mock.call([("/1/1/1/+/+", 0)]),
+        mock.call([("/1/1/2/+/+", 1)]),
+    ]
+    assert client.message_callback_add.call_count == 2
+    message_callback = client.message_callback_add.call_args[0][1]
+    message_callback(client, None, mock.Mock(topic="/1/1/2/0/1", payload=b"20", qos=1))
+    assert callback.call_args == mock.call("/1/1/2/0/1", "20", 1)
+    mqttc.publish_many([("/1/1/1/0/1", "20", 0, True), ("/1/1/1/0/1", "21", 0, True)])
+    assert client.publish.call_count == 2
@@ -0,0 +1,85 @@
+"""Test mysensors TCP gateway."""
+
+import socket
+import threading
+from unittest import mock
+
+import pytest
+
+from mysensors.gateway_tcp import TCPTransport
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+def sockets():
+    """Return a connected pair of sockets."""
+    sock, peer = socket.socketpair()
+    yield sock, peer
+    sock.close()
+    peer.close()
+
+
+def test_tcp_transport_read(sockets):
+    """Test that the TCP transport reads data and checks connection."""
+    sock, peer = sockets
+    protocol = mock.MagicMock()
+    check_conn = mock.MagicMock()
+    transport = TCPTransport(sock, lambda: protocol, check_conn)
+    transport.start()
+    transport.connect()
+    assert protocol.connection_made.call_args == mock.call(transport)
+    peer.sendall(b"1;255;3;0;1;123\n" * 1000)
+    peer.close()
+    transport.join(2)
+    assert not transport.is_alive()
+    received = b"".join(call.args[0] for call in protocol.data_received.mock_calls)
+    assert received == b"1;255;3;0;1;123\n" * 1000
+    assert check_conn.call_count >= 1
+    assert protocol.connection_lost.call_count == 1
+    assert isinstance(protocol.connection_lost.call_args.args[0], OSError)
+
+
+def test_tcp_transport_check_connection_error(sockets):
+    """Test that the TCP transport stops if connection check fails."""
+    sock, _ = sockets
+    protocol = mock.MagicMock()
+    error = OSError("No response")
+    check_conn = mock.MagicMock(side_effect=error)
+    transport = TCPTransport(sock, lambda: protocol, check_conn)
+    transport.start()
+    transport.join(2)
+    assert not transport.is_alive()
+    assert check_conn.call_count == 1
+    assert protocol.connection_lost.call_args == mock.call(error)
+
+
+def test_tcp_transport_write(sockets):
+    """Test that the TCP transport writes data."""
+    sock, peer = sockets
+    transport = TCPTransport(sock, mock.MagicMock, mock.MagicMock())
+    transport.write(b"1;255;3;0;1;123\n")
+    assert peer.recv(100) == b"1;255;3;0;1;123\n"
+
+
+def test_tcp_transport_write_blocked(sockets):
+    """Test that the TCP transport pauses writing while the socket is full."""
+    sock, peer = sockets
+    protocol = mock.MagicMock()
+    transport = TCPTransport(sock, lambda: protocol, mock.MagicMock())
+    transport.protocol = protocol
+    data = b"1;255;3;0;1;123\n" * 100000
+    received = bytearray()
+
+    def read_peer():
+        """Read all data from the peer socket."""
+        while len(received) < len(data):
+            received.extend(peer.recv(65536))
+
+    reader = threading.Thread(target=read_peer)
+    reader.start()
+    transport.write(data)
+    reader.join(2)
+    assert bytes(received) == data
+    assert protocol.pause_writing.call_count == 1
+    assert protocol.resume_writing.call_count == 1
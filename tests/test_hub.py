@@ -0,0 +1,119 @@
+"""Test gateway hub."""
+
+import asyncio
+from unittest import mock
+
+import pytest
+
+from mysensors import BaseAsyncGateway, BaseSyncGateway
+from mysensors.hub import GatewayHub, HubMetricsExporter
+
+
+def make_gateway(persistence_file=None):
+    """Return an async gateway with a mock transport."""
+    transport = mock.MagicMock()
+    transport.connect = mock.AsyncMock()
+    return BaseAsyncGateway(
+        transport,
+        persistence=persistence_file is not None,
+        persistence_file=persistence_file,
+        protocol_version="2.2",
+    )
+
+
+def test_sensors():
+    """Test the sensors view keyed by gateway id and node id."""
+    hub = GatewayHub()
+    hub.add_gateway("serial", make_gateway())
+    hub.add_gateway("tcp", make_gateway())
+    assert not hub.sensors
+    hub.gateways["serial"].logic("1;255;0;0;17;2.2.0\n")
+    hub.gateways["tcp"].logic("1;255;0;0;17;2.2.0\n")
+    hub.gateways["tcp"].logic("2;255;0;0;17;2.2.0\n")
+    assert len(hub.sensors) == 3
+    assert sorted(hub.sensors) == [("serial", 1), ("tcp", 1), ("tcp", 2)]
+    assert hub.sensors["tcp", 2] is hub.gateways["tcp"].sensors[2]
+    assert hub.sensors["serial", 1] is not hub.sensors["tcp", 1]
+    assert ("serial", 2) not in hub.sensors
+    assert ("other", 1) not in hub.sensors
+    assert 1 not in hub.sensors
+
+
+def test_add_gateway():
+    """Test that gateways must be async with unique ids and persistence files."""
+    hub = GatewayHub()
+    hub.add_gateway("serial", make_gateway("serial.json"))
+    with pytest.raises(ValueError):
+        hub.add_gateway("serial", make_gateway())
+    with pytest.raises(ValueError):
+        hub.add_gateway("tcp", make_gateway("serial.json"))
+    with pytest.raises(TypeError):
+        hub.add_gateway("sync", BaseSyncGateway(mock.MagicMock()))
+    hub.add_gateway("tcp", make_gateway())
+    assert list(hub.gateways) == ["serial", "tcp"]
+
+
+def test_metrics():
+    """Test one metrics exporter labelled by gateway id."""
+    hub = GatewayHub(metrics_port=0)
+    assert isinstance(hub.metrics, HubMetricsExporter)
+    hub.add_gateway("serial", make_gateway())
+    hub.add_gateway("tcp", make_gateway())
+    assert all(gateway.stats.enabled for gateway in hub.gateways.values())
+    hub.gateways["serial"].logic("1;255;0;0;17;2.2.0\n")
+    hub.gateways["tcp"].logic("1;255;0;0;17;2.2.0\n")
+    hub.gateways["tcp"].logic("2;255;0;0;17;2.2.0\n")
+    lines = hub.metrics.render().splitlines()
+    assert lines.count("# TYPE mysensors_messages_received counter") == 1
+    assert (
+        'mysensors_messages_received_total{gateway="serial",type="0",sub_type="17"} 1'
+        in lines
+    )
+    assert (
+        'mysensors_messages_received_total{gateway="tcp",type="0",sub_type="17"} 2'
+        in lines
+    )
+    assert 'mysensors_queue_depth{gateway="serial"} 0' in lines
+    assert 'mysensors_queue_depth{gateway="tcp"} 0' in lines
+    assert (
+        'mysensors_stage_duration_seconds_count{gateway="tcp",stage="decode"} 2'
+        in lines
+    )
+
+
+def test_start_stop(tmp_path):
+    """Test one save task for all gateways."""
+    serial_file = str(tmp_path / "serial.json")
+    tcp_file = str(tmp_path / "tcp.json")
+    hub = GatewayHub(save_interval=0.01)
+    hub.add_gateway("serial", make_gateway(serial_file))
+    hub.add_gateway("tcp", make_gateway(tcp_file))
+    hub.add_gateway("memory", make_gateway())
+
+    async def run():
+        """Start the hub, update sensors and stop the hub."""
+        tasks_before = len(asyncio.all_tasks())
+        await hub.start_persistence()
+        await hub.start()
+        assert len(asyncio.all_tasks()) == tasks_before + 1
+        for gateway in hub.gateways.values():
+            gateway.tasks.transport.connect.assert_awaited_once_with()
+        with mock.patch.object(
+            hub, "save_sensors", wraps=hub.save_sensors
+        ) as save_sensors:
+            hub.gateways["serial"].logic("1;255;0;0;17;2.2.0\n")
+            hub.gateways["tcp"].logic("2;255;0;0;17;2.2.0\n")
+            await asyncio.sleep(0.05)
+        assert save_sensors.call_count > 1
+        await hub.stop()
+
+    asyncio.run(run())
+    for gateway_id, node_id in (("serial", 1), ("tcp", 2)):
+        gateway = make_gateway(str(tmp_path / f"{gateway_id}.json"))
+
+        async def load(gateway=gateway):
+            """Load persisted sensors."""
+            await gateway.start_persistence(schedule_save=False)
+
+        asyncio.run(load())
+        assert list(gateway.sensors) == [node_id]
@@ -1,5 +1,6 @@
 """Test mysensors messages."""
 
+import itertools
 from unittest import mock
 
 import pytest
@@ -7,6 +8,7 @@ import voluptuous as vol
 
 from mysensors import Gateway, Message, get_const, Sensor
 from mysensors.const_14 import Internal, MessageType
+from mysensors.message import get_validator
 from mysensors.task import SyncTasks
 
 PRES_FIXTURES_14 = {
@@ -354,3 +356,137 @@ def test_validate_internal(protocol_version, name, payload):
         assert ret is None, f"Version: {protocol_version} Message: {msg}"
     else:
         assert ret, f"Version: {protocol_version} Message: {msg}"
+
+
+@pytest.mark.parametrize("protocol_version", ["1.4", "1.5", "2.0", "2.1", "2.2", "2.4"])
+def test_validate_compiled_matches_schema(protocol_version):
+    """Test that the compiled validator agrees with the full schema."""
+    const = get_const(protocol_version)
+    validator = get_validator(protocol_version)
+    assert validator is get_validator(protocol_version)
+    payloads = ["", "1", "1.4", "stable", "-1"]
+    for msg_type in list(const.MessageType) + [5]:
+        sub_types = [
+            int(member) for member in const.VALID_MESSAGE_TYPES.get(msg_type, [])
+        ]
+        for sub_type in sub_types + [max(sub_types, default=0) + 1]:
+            for node_id, child_id, ack, payload in itertools.chain(
+                itertools.product((1,), (0, 255), (0,), payloads),
+                itertools.product((0, 255, 256), (1, 256, -1), (1, 2), ("1",)),
+            ):
+                msg = Message(
+                    node_id=node_id,
+                    child_id=child_id,
+                    type=msg_type,
+                    ack=ack,
+                    sub_type=sub_type,
+                    payload=payload,
+                )
+                try:
+                    # Compare against the full schema without the tables.
+                    # pylint: disable-next=protected-access
+                    expected = str(msg._validate_schema(protocol_version))
+                except vol.Invalid:
+                    expected = None
+                valid = validator.validate(msg)
+                if valid is not None:
+                    assert str(valid) == expected, msg
+                try:
+                    result = str(msg.validate(protocol_version))
+                except vol.Invalid:
+                    result = None
+                assert result == expected, msg
+
+
+def test_validate_error_message():
+    """Test that an invalid message raises the full schema error."""
+    msg = get_message("1;0;1;0;3;bad\n")
+    with pytest.raises(vol.MultipleInvalid) as exc:
+        msg.validate("2.0")
+    assert exc.value.path == ["payload"]
+    msg = get_message("1;255;1;0;0;20.0\n")
+    with pytest.raises(vol.MultipleInvalid) as exc:
+        msg.validate("2.0")
+    assert str(exc.value) == (
+        "When child_id is 255, 1 is not a valid message type "
+        "for object value @ data['type']"
+    )
+
+
+def test_copy():
+    """Test copy of message."""
+    gateway = get_gateway()
+    msg = Message(gateway=gateway).modify(
+        node_id=1,
+        child_id=255,
+        type=MessageType.internal,
+        sub_type=Internal.I_BATTERY_LEVEL,
+        payload=57,
+    )
+    copy = msg.copy(ack=1)
+    assert copy is not msg
+    assert copy.gateway is gateway
+    assert copy.encode() == "1;255;3;1;0;57\n"
+    assert copy.payload == "57"
+    assert msg.ack == 0
+
+
+def test_message_slots():
+    """Test that message attributes are slotted."""
+    msg = get_message("1;255;3;0;0;57\n")
+    assert not hasattr(msg, "__dict__")
+    with pytest.raises(AttributeError):
+        # Assigning an unknown attribute is the behavior under test.
+        msg.bad_attr = 1  # pylint: disable=assigning-non-slot
+    assert msg.as_dict() == {
+        "node_id": 1,
+        "child_id": 255,
+        "type": 3,
+        "ack": 0,
+        "sub_type": 0,
+        "payload": "57",
+    }
+
+
+def test_decode_extra_delimiter():
+    """Test decode of message with delimiter in payload."""
+    with pytest.raises(ValueError):
+        get_message("1;255;3;0;0;57;58\n")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"1;255;3;0;0;57\n",
+        bytearray(b"1;255;3;0;0;57\n"),
+        memoryview(b"1;255;3;0;0;57\n"),
+    ],
+)
+def test_decode_bytes(data):
+    """Test decode of message from bytes."""
+    msg = get_message(data)
+    assert msg.node_id == 1
+    assert msg.child_id == 255
+    assert msg.type == MessageType.internal
+    assert msg.sub_type == Internal.I_BATTERY_LEVEL
+    assert msg.ack == 0
+    assert msg.payload == "57"
+    assert get_message(b"1;1;1;0;47;\xc3\xa5\xff\n").payload == "å�"
+
+
+def test_decode_bytes_bad_message():
+    """Test decode of bad message from bytes."""
+    with pytest.raises(ValueError):
+        get_message(b"bad;bad;bad;bad;bad;bad\n")
+
+
+def test_encode_into():
+    """Test encode of message into a bytearray."""
+    buffer = bytearray(b"0;0;0;0;0;\n")
+    msg = get_message("1;255;3;0;0;57\n")
+    assert msg.encode_into(buffer) is buffer
+    msg.payload = "å"
+    msg.encode_into(buffer)
+    assert buffer == b"0;0;0;0;0;\n1;255;3;0;0;57\n1;255;3;0;0;\xc3\xa5\n"
+    msg.sub_type = "bad"
+    assert msg.encode_into(buffer) is None
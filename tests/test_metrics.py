@@ -0,0 +1,80 @@
+"""Test metrics exporter."""
+
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from mysensors import BaseSyncGateway
+from mysensors.metrics import CONTENT_TYPE, MetricsExporter
+from mysensors.scheduler import OutboundScheduler
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture
+def gateway():
+    """Return gateway instance."""
+    return BaseSyncGateway(
+        None,
+        persistence=False,
+        persistence_file=None,
+        protocol_version="2.2",
+        metrics_port=0,
+    )
+
+
+def test_gateway_metrics_port(gateway):
+    """Test that a metrics port sets up an exporter that enables stats."""
+    assert isinstance(gateway.metrics, MetricsExporter)
+    assert gateway.stats.enabled
+    assert gateway.metrics.server_address is None
+
+
+def test_render(gateway):
+    """Test rendering of metrics as OpenMetrics text."""
+    gateway.logic("1;255;0;0;17;2.2.0\n")
+    gateway.logic("1;255;0;0;17;2.2.0\n")
+    gateway.logic("1;1;1;0;99;20.0\n")
+    gateway.logic("bad\n")
+    gateway.stats.count("ota_blocks")
+    gateway.tasks.add_job(str)
+    gateway.tasks.scheduler = OutboundScheduler()
+    sensor = gateway.sensors[1]
+    sensor.new_state[1] = None
+    sensor.queue.append("1;1;1;0;2;1\n")
+    lines = gateway.metrics.render().splitlines()
+    assert lines[-1] == "# EOF"
+    assert "# TYPE mysensors_messages_received counter" in lines
+    assert 'mysensors_messages_received_total{type="0",sub_type="17"} 2' in lines
+    assert 'mysensors_validation_failures_total{type="1",sub_type="99"} 1' in lines
+    assert "mysensors_decode_failures_total 1" in lines
+    assert "mysensors_ota_blocks_served_total 1" in lines
+    assert "mysensors_queue_depth 1" in lines
+    assert "mysensors_scheduler_queue_depth 0" in lines
+    assert 'mysensors_smart_sleep_queue_size{node_id="1"} 1' in lines
+    assert "# TYPE mysensors_stage_duration_seconds histogram" in lines
+    assert 'mysensors_stage_duration_seconds_count{stage="decode"} 3' in lines
+    assert (
+        'mysensors_stage_duration_seconds_bucket{stage="decode",le="+Inf"} 3' in lines
+    )
+
+
+def test_serve(gateway):
+    """Test serving metrics over HTTP."""
+    exporter = gateway.metrics
+    exporter.start()
+    try:
+        host, port = exporter.server_address
+        with urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+            body = response.read().decode()
+        assert body.endswith("# EOF\n")
+        with pytest.raises(HTTPError) as exc_info:
+            with urlopen(f"http://{host}:{port}/other", timeout=5):
+                pass
+        assert exc_info.value.code == 404
+        exc_info.value.close()
+    finally:
+        exporter.stop()
+    assert exporter.server_address is None
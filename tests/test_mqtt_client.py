@@ -0,0 +1,346 @@
+"""Test the asyncio MQTT client of the command line interface."""
+
+import asyncio
+import struct
+
+import pytest
+
+from mysensors.cli.gateway_mqtt import async_start_mqtt_client
+from mysensors.cli.mqtt_client import (
+    CONNACK,
+    CONNECT,
+    DISCONNECT,
+    PINGREQ,
+    PINGRESP,
+    PUBACK,
+    PUBLISH,
+    SUBACK,
+    SUBSCRIBE,
+    AsyncioMQTTClient,
+    encode_length,
+    encode_string,
+    packet,
+)
+
+
+class BrokerStub:
+    """Represent an in-process MQTT broker that records received packets."""
+
+    def __init__(self, return_code=0, ack=True):
+        """Set up broker stub."""
+        self.return_code = return_code
+        self.ack = ack
+        self.packets = []
+        self.writer = None
+        self.server = None
+        self.received = None
+
+    @property
+    def port(self):
+        """Return the port that the broker listens on."""
+        return self.server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        """Start listening."""
+        self.received = asyncio.Queue()
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+
+    async def stop(self):
+        """Stop listening."""
+        if self.writer is not None:
+            self.writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        """Handle a client connection."""
+        self.writer = writer
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    digit = (await reader.readexactly(1))[0]
+                    length += (digit & 0x7F) * multiplier
+                    if not digit & 0x80:
+                        break
+                    multiplier *= 128
+                body = await reader.readexactly(length)
+                self.reply(header[0] >> 4, header[0] & 0x0F, body)
+                self.packets.append((header[0] >> 4, header[0] & 0x0F, body))
+                await self.received.put(header[0] >> 4)
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            writer.close()
+
+    def reply(self, packet_type, flags, body):
+        """Reply to a packet from the client."""
+        if packet_type == CONNECT:
+            self.writer.write(packet(CONNACK, bytes((0, self.return_code))))
+        elif packet_type == SUBSCRIBE:
+            count = 0
+            idx = 2
+            while idx < len(body):
+                (length,) = struct.unpack("!H", body[idx : idx + 2])
+                idx += length + 3
+                count += 1
+            self.writer.write(packet(SUBACK, body[:2] + bytes(count)))
+        elif packet_type == PUBLISH and flags & 0x06 and self.ack:
+            (length,) = struct.unpack("!H", body[:2])
+            self.writer.write(packet(PUBACK, body[2 + length : 4 + length]))
+        elif packet_type == PINGREQ:
+            self.writer.write(packet(PINGRESP))
+
+    def send(self, data):
+        """Send data to the client."""
+        self.writer.write(data)
+
+    async def wait_for(self, packet_type):
+        """Wait until the broker has received a packet of packet_type."""
+        while await asyncio.wait_for(self.received.get(), 1) != packet_type:
+            pass
+
+    def of_type(self, packet_type):
+        """Return received packets of packet_type."""
+        return [pkt for pkt in self.packets if pkt[0] == packet_type]
+
+
+def run_with_broker(test, broker=None, **kwargs):
+    """Run coroutine function test with a started broker and client."""
+    broker = broker or BrokerStub()
+
+    async def run():
+        await broker.start()
+        client = AsyncioMQTTClient("127.0.0.1", broker.port, **kwargs)
+        try:
+            await client.start()
+            await test(broker, client)
+        finally:
+            await client.stop()
+            await broker.stop()
+
+    asyncio.run(run())
+    return broker
+
+
+@pytest.mark.parametrize(
+    "length, data",
+    [(0, b"\x00"), (127, b"\x7f"), (128, b"\x80\x01"), (16383, b"\xff\x7f")],
+)
+def test_encode_length(length, data):
+    """Test encode remaining length."""
+    assert encode_length(length) == data
+
+
+def test_connect():
+    """Test connect and disconnect."""
+
+    async def test(broker, client):
+        await broker.wait_for(CONNECT)
+        assert not client.disconnected.done()
+
+    broker = run_with_broker(test, client_id="test")
+    _, flags, body = broker.packets[0]
+    assert flags == 0
+    assert body.startswith(encode_string("MQTT") + bytes((4, 2, 0, 60)))
+    assert body.endswith(encode_string("test"))
+    assert broker.packets[-1][0] == DISCONNECT
+
+
+def test_connect_refused():
+    """Test broker refusing the connection."""
+
+    async def run():
+        broker = BrokerStub(return_code=5)
+        await broker.start()
+        client = AsyncioMQTTClient("127.0.0.1", broker.port)
+        try:
+            with pytest.raises(OSError):
+                await client.start()
+        finally:
+            await broker.stop()
+
+    asyncio.run(run())
+
+
+def test_subscribe_many():
+    """Test subscribe to many topics with one request and receive messages."""
+    calls = []
+
+    def callback(topic, payload, qos):
+        calls.append((topic, payload, qos))
+
+    async def test(broker, client):
+        client.subscribe_many(
+            [("mygateway1-out/1/1/+/+/+", 0), ("mygateway1-out/2/1/+/+/+", 2)],
+            callback,
+        )
+        client.subscribe("mygateway1-out/1/1/+/+/+", callback, 0)
+        await broker.wait_for(SUBSCRIBE)
+        broker.send(
+            packet(
+                PUBLISH,
+                encode_string("mygateway1-out/1/1/1/0/0") + b"20.0",
+            )
+            + packet(
+                PUBLISH,
+                encode_string("mygateway1-out/3/1/1/0/0") + b"30.0",
+            )
+            + packet(
+                PUBLISH,
+                encode_string("mygateway1-out/2/1/1/0/0") + b"\x00\x07" + b"25.0",
+                0x02,
+            )
+        )
+        await broker.wait_for(PUBACK)
+
+    broker = run_with_broker(test)
+    subscribes = broker.of_type(SUBSCRIBE)
+    assert len(subscribes) == 1
+    _, flags, body = subscribes[0]
+    assert flags == 0x02
+    assert body[2:] == (
+        encode_string("mygateway1-out/1/1/+/+/+")
+        + b"\x00"
+        + encode_string("mygateway1-out/2/1/+/+/+")
+        + b"\x01"
+    )
+    assert calls == [
+        ("mygateway1-out/1/1/1/0/0", "20.0", 0),
+        ("mygateway1-out/2/1/1/0/0", "25.0", 1),
+    ]
+    assert broker.of_type(PUBACK)[0][2] == b"\x00\x07"
+
+
+def test_publish_many():
+    """Test publish many messages with one write and acknowledge qos 1."""
+
+    async def test(broker, client):
+        client.publish_many(
+            [
+                ("mygateway1-in/1/1/1/0/0", "20.0", 0, False),
+                ("mygateway1-in/1/1/1/0/1", "1", 1, True),
+            ]
+        )
+        assert len(client.inflight) == 1
+        await broker.wait_for(PUBLISH)
+        await broker.wait_for(PUBLISH)
+        for _ in range(10):
+            if not client.inflight:
+                break
+            await asyncio.sleep(0.01)
+        assert not client.inflight
+
+    broker = run_with_broker(test)
+    publishes = broker.of_type(PUBLISH)
+    assert publishes == [
+        (PUBLISH, 0, encode_string("mygateway1-in/1/1/1/0/0") + b"20.0"),
+        (PUBLISH, 0x03, encode_string("mygateway1-in/1/1/1/0/1") + b"\x00\x01" + b"1"),
+    ]
+
+
+def test_publish_unacknowledged(caplog):
+    """Test stop with unacknowledged messages."""
+
+    async def test(broker, client):
+        client.publish("mygateway1-in/1/1/1/0/0", "20.0", 1, False)
+        await broker.wait_for(PUBLISH)
+        assert client.inflight == {1: "mygateway1-in/1/1/1/0/0"}
+
+    run_with_broker(test, broker=BrokerStub(ack=False))
+    assert "Disconnecting with 1 unacknowledged messages" in caplog.text
+
+
+def test_packet_ids_in_flight(caplog):
+    """Test publish and subscribe when all packet ids are in flight."""
+
+    async def test(broker, client):
+        await broker.wait_for(CONNECT)
+        client.inflight.update(dict.fromkeys(range(1, 0x10000), "topic"))
+        client.publish_many(
+            [
+                ("mygateway1-in/1/1/1/0/0", "20.0", 1, False),
+                ("mygateway1-in/1/1/1/0/1", "1", 0, False),
+            ]
+        )
+        client.subscribe("mygateway1-out/#", lambda *args: None, 0)
+        await broker.wait_for(PUBLISH)
+        assert not client.topics
+        client.inflight.clear()
+
+    broker = run_with_broker(test)
+    assert broker.of_type(PUBLISH) == [
+        (PUBLISH, 0, encode_string("mygateway1-in/1/1/1/0/1") + b"1")
+    ]
+    assert not broker.of_type(SUBSCRIBE)
+    assert "All packet ids are in flight, dropping message" in caplog.text
+    assert "All packet ids are in flight, not subscribing" in caplog.text
+
+
+def test_writing_paused():
+    """Test writing paused while the write buffer is above its limit."""
+
+    async def test(broker, client):
+        await broker.wait_for(CONNECT)
+        assert not client.writing_paused
+        # pylint: disable-next=protected-access
+        client._writer.transport.set_write_buffer_limits(high=0)
+        broker.writer.transport.pause_reading()
+        client.publish_many([("mygateway1-in/1/1/1/0/0", "x" * 100000, 0, False)] * 100)
+        assert client.writing_paused
+        broker.writer.transport.resume_reading()
+        await asyncio.wait_for(client.drain(), 1)
+        assert not client.writing_paused
+
+    run_with_broker(test)
+
+
+def test_keepalive():
+    """Test ping when idle."""
+
+    async def test(broker, client):
+        await broker.wait_for(PINGREQ)
+        for _ in range(10):
+            if client._ping_sent is None:  # pylint: disable=protected-access
+                break
+            await asyncio.sleep(0.01)
+        assert client._ping_sent is None  # pylint: disable=protected-access
+        assert not client.disconnected.done()
+
+    broker = run_with_broker(test, keepalive=0.05)
+    assert broker.of_type(PINGREQ)
+
+
+def test_connection_lost(caplog):
+    """Test broker closing the connection."""
+
+    async def test(broker, client):
+        await broker.wait_for(CONNECT)
+        broker.writer.close()
+        await asyncio.wait_for(client.disconnected, 1)
+        client.publish("mygateway1-in/1/1/1/0/0", "20.0", 0, False)
+
+    run_with_broker(test)
+    assert "Connection to broker lost" in caplog.text
+    assert "Not connected to broker, dropping packet" in caplog.text
+
+
+def test_async_start_mqtt_client():
+    """Test start the client of the async mqtt gateway command."""
+
+    async def run():
+        broker = BrokerStub()
+        await broker.start()
+        try:
+            port = broker.port
+            client = await async_start_mqtt_client("127.0.0.1", port)
+            assert isinstance(client, AsyncioMQTTClient)
+            await client.stop()
+            await broker.stop()
+            with pytest.raises(SystemExit):
+                await async_start_mqtt_client("127.0.0.1", port)
+        finally:
+            await broker.stop()
+
+    asyncio.run(run())
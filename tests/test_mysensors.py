@@ -8,6 +8,7 @@ import pytest
 import voluptuous as vol
 
 from mysensors import BaseSyncGateway
+from mysensors.message import Message
 from mysensors.sensor import Sensor
 
 # pylint: disable=redefined-outer-name
@@ -51,6 +52,17 @@ def test_logic_bad_message(gateway):
     assert gateway.logic("bad;bad;bad;bad;bad;bad\n") is None
 
 
+def test_respond_message(gateway, add_sensor):
+    """Test that respond takes and returns messages."""
+    sensor = add_sensor(1)
+    sensor.add_child_sensor(1, gateway.const.Presentation.S_POWER)
+    sensor.update_child_value(1, gateway.const.SetReq.V_WATT, 42)
+    reply = gateway.respond(Message("1;1;2;0;17;\n"))
+    assert isinstance(reply, Message)
+    assert reply.encode() == "1;1;1;0;17;42\n"
+    assert gateway.logic(Message("1;1;2;0;17;\n")) == "1;1;1;0;17;42\n"
+
+
 def test_per_instance_handler():
     """Test that gateway can add own handlers."""
     gateway_1 = get_gateway()
@@ -141,10 +153,107 @@ def test_internal_id_request(gateway, add_sensor):
     add_sensor(254)
     assert 254 in gateway.sensors
     ret = gateway.logic("255;255;3;0;3;\n")
+    assert ret == "255;255;3;0;4;3\n"
+    assert 3 in gateway.sensors
+    assert 255 not in gateway.sensors
+
+
+def test_id_request_no_free_id(gateway, add_sensor):
+    """Test internal node id request when all ids are used."""
+    for node_id in range(1, 255):
+        add_sensor(node_id)
+    ret = gateway.logic("255;255;3;0;3;\n")
     assert ret is None
     assert 255 not in gateway.sensors
 
 
+def test_id_request_reserved_ids(gateway):
+    """Test internal node id request skips reserved ids."""
+    gateway.node_ids.reserve(1, 10)
+    ret = gateway.logic("255;255;3;0;3;\n")
+    assert ret == "255;255;3;0;4;11\n"
+    assert 11 in gateway.sensors
+
+
+def test_id_request_sensors_without_allocator(gateway):
+    """Test internal node id request skips sensors added to the dict."""
+    gateway.sensors[1] = Sensor(1)
+    ret = gateway.logic("255;255;3;0;3;\n")
+    assert ret == "255;255;3;0;4;2\n"
+
+
+def test_id_request_recycle_silent_node(gateway):
+    """Test internal node id request recycles id of a silent node."""
+    gateway.node_ids.recycle_after = 0
+    for node_id in range(1, 255):
+        gateway.add_sensor(node_id)
+    gateway.logic("1;255;3;0;0;50\n")
+    ret = gateway.logic("255;255;3;0;3;\n")
+    assert ret == "255;255;3;0;4;2\n"
+    assert 2 in gateway.sensors
+    assert not gateway.sensors[2].children
+
+
+def test_remove_sensor(gateway):
+    """Test that removing a sensor frees its node id."""
+    gateway.add_sensor(1)
+    gateway.add_sensor(2)
+    sensor = gateway.sensors[1]
+    assert gateway.remove_sensor(1) is sensor
+    assert 1 not in gateway.sensors
+    _, changes = gateway.changes_since()
+    assert changes[-1] == (1, None, None)
+    assert gateway.remove_sensor(1) is None
+    ret = gateway.logic("255;255;3;0;3;\n")
+    assert ret == "255;255;3;0;4;1\n"
+    assert 1 in gateway.sensors
+
+
+def test_changes_since(gateway):
+    """Test that gateway tracks changes of sensors from messages."""
+    token, changes = gateway.changes_since()
+    assert changes == []
+    gateway.logic("1;255;0;0;17;2.0.0\n")
+    gateway.logic("1;1;0;0;6;\n")
+    gateway.logic("1;1;1;0;0;20.0\n")
+    token, changes = gateway.changes_since(token)
+    assert changes == [(1, None, None), (1, 1, None), (1, 1, 0)]
+    gateway.logic("1;1;1;0;0;21.0\n")
+    assert gateway.changes_since(token) == (token + 1, [(1, 1, 0)])
+
+
+def test_stats_disabled(gateway):
+    """Test that stats are not recorded by default."""
+    gateway.logic("1;255;0;0;17;2.0.0\n")
+    assert gateway.stats.summary() == {}
+
+
+def test_stats(gateway):
+    """Test that gateway records durations of handling stages."""
+    calls = []
+    gateway.event_callback = calls.append
+    gateway.stats.enabled = True
+    gateway.logic("1;255;0;0;17;2.0.0\n")
+    gateway.logic("1;255;0;0;17;2.0.0\n")
+    gateway.logic("bad\n")
+    summary = gateway.stats.summary()
+    assert len(calls) == 2
+    for stage in ("decode", "validate", "handler", "event_callback"):
+        assert summary[stage]["all"]["count"] == 2
+        assert summary[stage]["types"]["0;17"]["count"] == 2
+
+
+def test_stats_exclude_event_callback(gateway):
+    """Test that the handler stage doesn't include the event callback."""
+    gateway.event_callback = lambda msg: time.sleep(0.05)
+    gateway.stats.enabled = True
+    gateway.logic("1;255;0;0;17;2.0.0\n")
+    summary = gateway.stats.summary()
+    assert summary["event_callback"]["all"]["max"] >= 0.05
+    assert summary["handler"]["all"]["max"] < 0.05
+    assert summary["handler"]["all"]["count"] == 1
+
+
 def test_id_request_with_node_zero(gateway, add_sensor):
     """Test internal node id request with node 0 already assigned."""
     add_sensor(0)
@@ -405,6 +514,43 @@ def test_callback_for_type_stream(gateway, add_sensor):
     assert messages[0].payload == "01000200B00626E80300"
 
 
+def test_logic_many(gateway, add_sensor):
+    """Test handling many lines in one batch."""
+    messages = []
+
+    def callback(message):
+        """Add message to messages list."""
+        messages.append(message)
+
+    gateway.event_callback = callback
+    sensor = add_sensor(1)
+    sensor.add_child_sensor(0, gateway.const.Presentation.S_LIGHT_LEVEL)
+    ret = gateway.logic_many(
+        ["1;0;1;0;23;43\n", "bad;bad;bad;bad;bad;bad\n", "255;255;3;0;3;\n"]
+        + ["255;255;3;0;3;\n", "1;0;1;0;23;44\n"]
+    )
+    assert ret == "255;255;3;0;4;2\n255;255;3;0;4;3\n"
+    assert [msg.payload for msg in messages] == ["43", "44"]
+    assert gateway.logic_many(["bad;bad;bad;bad;bad;bad\n"]) is None
+
+
+def test_logic_many_batch_callback(gateway, add_sensor):
+    """Test batch callback receives coalesced updates."""
+    messages = []
+    batches = []
+    gateway.event_callback = messages.append
+    gateway.batch_event_callback = batches.append
+    sensor = add_sensor(1)
+    sensor.add_child_sensor(0, gateway.const.Presentation.S_LIGHT_LEVEL)
+    gateway.logic_many(["1;0;1;0;23;43\n", "1;0;1;0;23;44\n"])
+    assert not messages
+    assert len(batches) == 1
+    assert [msg.payload for msg in batches[0]] == ["43", "44"]
+    gateway.logic("1;0;1;0;23;45\n")
+    assert [msg.payload for msg in messages] == ["45"]
+    assert len(batches) == 1
+
+
 def test_callback_exception(gateway, caplog):
     """Test gateway callback with exception."""
     side_effect = ValueError("test callback error")
@@ -2,14 +2,16 @@
 
 import json
 import os
+import sqlite3
 from collections import deque
 from unittest import mock
 
 import pytest
 
-from mysensors import Gateway
+from mysensors import BaseSyncGateway, Gateway
 from mysensors.persistence import MySensorsJSONEncoder, Persistence
 from mysensors.sensor import ChildSensor, Sensor
+from mysensors.stats import GatewayStats
 
 # pylint: disable=redefined-outer-name
 
@@ -32,7 +34,9 @@ def add_sensor(gateway):
     return _add_sensor
 
 
-@pytest.mark.parametrize("filename", ["file.pickle", "file.json"])
+@pytest.mark.parametrize(
+    "filename", ["file.pickle", "file.json", "file.journal", "file.db", "file.sqlite"]
+)
 def test_persistence(gateway, add_sensor, filename, tmpdir):
     """Test persistence."""
     sensor = add_sensor(1)
@@ -92,7 +96,9 @@ def test_json_no_files(gateway, tmpdir):
     assert not gateway.sensors
 
 
-@pytest.mark.parametrize("filename", ["file.pickle", "file.json"])
+@pytest.mark.parametrize(
+    "filename", ["file.pickle", "file.json", "file.journal", "file.sqlite"]
+)
 def test_empty_files(gateway, filename, tmpdir):
     """Test persistence with empty files."""
     assert not gateway.sensors
@@ -178,6 +184,248 @@ def test_persistence_upgrade(mock_save_json, gateway, add_sensor, filename, tmpd
     assert gateway.sensors[1].children[0].type == sensor.children[0].type
 
 
+def test_journal_append(gateway, add_sensor, tmpdir):
+    """Test that journal persistence appends changed values."""
+    sensor = add_sensor(1)
+    for child_id in range(10):
+        sensor.add_child_sensor(child_id, gateway.const.Presentation.S_LIGHT_LEVEL)
+    add_sensor(2)
+    gateway.track_sensor(1)
+    gateway.track_sensor(2)
+    persistence_file = tmpdir.join("file.journal")
+    persistence = Persistence(
+        gateway.sensors, mock.MagicMock(), persistence_file.strpath
+    )
+    persistence.changes = gateway.changes
+    persistence.save_sensors()
+    assert len(persistence_file.readlines()) == 1
+    sensor.update_child_value(0, gateway.const.SetReq.V_LIGHT_LEVEL, "43")
+    persistence.save_sensors()
+    lines = persistence_file.readlines()
+    assert len(lines) == 2
+    assert json.loads(lines[1]) == {
+        "node_id": 1,
+        "child_id": 0,
+        "value_type": gateway.const.SetReq.V_LIGHT_LEVEL,
+        "value": "43",
+    }
+    persistence.save_sensors()
+    assert len(persistence_file.readlines()) == 2
+    persistence_file.write('{"node_id": 2, ', mode="a")
+    gateway.sensors.clear()
+    persistence.safe_load_sensors()
+    assert gateway.sensors[1].children[0].values == {
+        gateway.const.SetReq.V_LIGHT_LEVEL: "43"
+    }
+    assert len(gateway.sensors[1].children) == 10
+    assert 2 in gateway.sensors
+
+
+def test_journal_append_new_node(gateway, tmpdir):
+    """Test that journal persistence appends node, child and value records."""
+    gateway.add_sensor(1)
+    persistence_file = tmpdir.join("file.journal")
+    persistence = Persistence(
+        gateway.sensors, mock.MagicMock(), persistence_file.strpath
+    )
+    persistence.changes = gateway.changes
+    persistence.save_sensors()
+    sensor = gateway.sensors[gateway.add_sensor(2)]
+    sensor.add_child_sensor(0, gateway.const.Presentation.S_LIGHT_LEVEL, "light")
+    sensor.update_child_value(0, gateway.const.SetReq.V_LIGHT_LEVEL, "43")
+    sensor.sketch_name = "test"
+    persistence.save_sensors()
+    records = [json.loads(line) for line in persistence_file.readlines()[1:]]
+    assert [list(record)[:3] for record in records] == [
+        ["node_id", "type", "sketch_name"],
+        ["node_id", "child_id", "type"],
+        ["node_id", "child_id", "value_type"],
+    ]
+    gateway.sensors.clear()
+    persistence.safe_load_sensors()
+    assert gateway.sensors[2].sketch_name == "test"
+    assert gateway.sensors[2].children[0].description == "light"
+    assert gateway.sensors[2].children[0].values == {
+        gateway.const.SetReq.V_LIGHT_LEVEL: "43"
+    }
+
+
+def test_journal_load_sensor_records(gateway, add_sensor, tmpdir):
+    """Test loading a journal with whole sensor records."""
+    sensor = add_sensor(1)
+    sensor.add_child_sensor(0, gateway.const.Presentation.S_LIGHT_LEVEL)
+    sensor.children[0].values[gateway.const.SetReq.V_LIGHT_LEVEL] = "43"
+    persistence_file = tmpdir.join("file.journal")
+    persistence_file.write("{}\n" + json.dumps(sensor, cls=MySensorsJSONEncoder) + "\n")
+    gateway.sensors.clear()
+    Persistence(
+        gateway.sensors, mock.MagicMock(), persistence_file.strpath
+    ).safe_load_sensors()
+    assert gateway.sensors[1].children[0].values == {
+        gateway.const.SetReq.V_LIGHT_LEVEL: "43"
+    }
+
+
+@mock.patch("mysensors.persistence.JOURNAL_MIN_RECORDS", 2)
+def test_journal_compaction(gateway, add_sensor, tmpdir):
+    """Test that journal persistence compacts into a new snapshot."""
+    add_sensor(1)
+    persistence_file = tmpdir.join("file.journal")
+    persistence = Persistence(
+        gateway.sensors, mock.MagicMock(), persistence_file.strpath
+    )
+    persistence.changes = gateway.changes
+    persistence.save_sensors()
+    for lines in (2, 3, 1):
+        gateway.track_sensor(1)
+        persistence.save_sensors()
+        assert len(persistence_file.readlines()) == lines
+    gateway.sensors.clear()
+    persistence.safe_load_sensors()
+    assert 1 in gateway.sensors
+
+
+def test_sqlite_upsert(gateway, add_sensor, tmpdir):
+    """Test that sqlite persistence only updates changed sensors."""
+    sensor = add_sensor(1)
+    sensor.add_child_sensor(0, gateway.const.Presentation.S_LIGHT_LEVEL)
+    add_sensor(2)
+    persistence_file = tmpdir.join("file.sqlite")
+    persistence = Persistence(
+        gateway.sensors, mock.MagicMock(), persistence_file.strpath
+    )
+    persistence.changes = gateway.changes
+    persistence.save_sensors()
+    gateway.track_sensor(1)
+    sensor.update_child_value(0, gateway.const.SetReq.V_LIGHT_LEVEL, "43")
+    gateway.sensors[2].sketch_name = "not saved"
+    persistence.save_sensors()
+    conn = sqlite3.connect(persistence_file.strpath)
+    try:
+        assert conn.execute("SELECT * FROM child_values").fetchall() == [
+            (1, 0, gateway.const.SetReq.V_LIGHT_LEVEL, "43")
+        ]
+        assert conn.execute(
+            "SELECT sensor_id, sketch_name FROM sensors ORDER BY sensor_id"
+        ).fetchall() == [(1, None), (2, None)]
+    finally:
+        conn.close()
+    gateway.sensors.clear()
+    persistence.safe_load_sensors()
+    assert gateway.sensors[1].children[0].values == {
+        gateway.const.SetReq.V_LIGHT_LEVEL: "43"
+    }
+    assert gateway.sensors[2].sketch_name is None
+
+
+def test_sqlite_upsert_changed_rows(gateway, add_sensor, tmpdir):
+    """Test that sqlite persistence only updates the rows of changes."""
+    sensor = add_sensor(1)
+    for child_id in range(2):
+        sensor.add_child_sensor(child_id, gateway.const.Presentation.S_LIGHT_LEVEL)
+        sensor.children[child_id].values[gateway.const.SetReq.V_LIGHT_LEVEL] = "0"
+    gateway.track_sensor(1)
+    persistence_file = tmpdir.join("file.db")
+    persistence = Persistence(
+        gateway.sensors, mock.MagicMock(), persistence_file.strpath
+    )
+    persistence.changes = gateway.changes
+    persistence.save_sensors()
+    # Change a value and a child without marking them as changed.
+    sensor.children[1].values[gateway.const.SetReq.V_LIGHT_LEVEL] = "not saved"
+    sensor.children[1].description = "not saved"
+    sensor.update_child_value(0, gateway.const.SetReq.V_LIGHT_LEVEL, "43")
+    persistence.save_sensors()
+    conn = sqlite3.connect(persistence_file.strpath)
+    try:
+        assert conn.execute(
+            "SELECT child_id, value FROM child_values ORDER BY child_id"
+        ).fetchall() == [(0, "43"), (1, "0")]
+        assert conn.execute(
+            "SELECT child_id, description FROM children ORDER BY child_id"
+        ).fetchall() == [(0, ""), (1, "")]
+    finally:
+        conn.close()
+
+
+def test_sqlite_stale_tmp_file(gateway, add_sensor, tmpdir):
+    """Test that a snapshot doesn't keep rows from a stale temporary file."""
+    add_sensor(1)
+    Persistence(
+        gateway.sensors, mock.MagicMock(), tmpdir.join("file.tmp.db").strpath
+    ).save_sensors()
+    gateway.sensors.clear()
+    add_sensor(2)
+    persistence = Persistence(
+        gateway.sensors, mock.MagicMock(), tmpdir.join("file.db").strpath
+    )
+    persistence.save_sensors()
+    gateway.sensors.clear()
+    persistence.safe_load_sensors()
+    assert list(gateway.sensors) == [2]
+
+
+@pytest.mark.parametrize("filename", ["file.journal", "file.db"])
+def test_append_id_request(filename, tmpdir):
+    """Test that nodes added by id requests are saved by appending."""
+    persistence_file = tmpdir.join(filename).strpath
+    gateway = BaseSyncGateway(
+        mock.MagicMock(), persistence=True, persistence_file=persistence_file
+    )
+    gateway.add_sensor(1)
+    gateway.tasks.persistence.save_sensors()
+    assert gateway.logic("255;255;3;0;3;\n") == "255;255;3;0;4;2\n"
+    gateway.tasks.persistence.save_sensors()
+    gateway = BaseSyncGateway(
+        mock.MagicMock(), persistence=True, persistence_file=persistence_file
+    )
+    gateway.tasks.persistence.safe_load_sensors()
+    assert sorted(gateway.sensors) == [1, 2]
+    gateway.node_ids.sync(gateway.sensors)
+    assert gateway.logic("255;255;3;0;3;\n") == "255;255;3;0;4;3\n"
+
+
+@pytest.mark.parametrize("filename", ["file.journal", "file.db"])
+def test_remove_sensor(filename, tmpdir):
+    """Test that a removed node isn't loaded again."""
+    persistence_file = tmpdir.join(filename).strpath
+    gateway = BaseSyncGateway(
+        mock.MagicMock(), persistence=True, persistence_file=persistence_file
+    )
+    gateway.add_sensor(1)
+    gateway.add_sensor(2)
+    gateway.tasks.persistence.save_sensors()
+    gateway.remove_sensor(2)
+    gateway.tasks.persistence.save_sensors()
+    gateway.sensors.clear()
+    gateway.tasks.persistence.safe_load_sensors()
+    assert list(gateway.sensors) == [1]
+
+
+@pytest.mark.parametrize("old_filename", ["file.pickle", "file.json"])
+def test_sqlite_migration(gateway, add_sensor, old_filename, tmpdir):
+    """Test that sqlite persistence migrates sensors from old files."""
+    sensor = add_sensor(1)
+    sensor.add_child_sensor(0, gateway.const.Presentation.S_LIGHT_LEVEL, "test")
+    sensor.children[0].values[gateway.const.SetReq.V_LIGHT_LEVEL] = "43"
+    Persistence(
+        gateway.sensors, mock.MagicMock(), tmpdir.join(old_filename).strpath
+    ).save_sensors()
+    gateway.sensors.clear()
+    persistence_file = tmpdir.join("file.sqlite")
+    persistence = Persistence(
+        gateway.sensors, mock.MagicMock(), persistence_file.strpath
+    )
+    persistence.safe_load_sensors()
+    assert gateway.sensors[1].children[0].description == "test"
+    persistence.save_sensors()
+    gateway.sensors.clear()
+    persistence.safe_load_sensors()
+    assert gateway.sensors[1].children[0].values == {
+        gateway.const.SetReq.V_LIGHT_LEVEL: "43"
+    }
+
+
 class MySensorsJSONEncoderTestUpgrade(MySensorsJSONEncoder):
     """JSON encoder used for testing upgrade with missing attributes."""
 
@@ -192,3 +440,16 @@ class MySensorsJSONEncoderTestUpgrade(MySensorsJSONEncoder):
                 "values": o.values,
             }
         return super().default(o)
+
+
+def test_save_stats(gateway, add_sensor, tmpdir):
+    """Test that save duration is recorded when stats are enabled."""
+    add_sensor(1)
+    persistence = Persistence(
+        gateway.sensors, mock.MagicMock(), tmpdir.join("file.json").strpath
+    )
+    persistence.stats = GatewayStats(enabled=True)
+    persistence.save_sensors()
+    persistence.save_sensors()
+    histograms = persistence.stats.histograms()
+    assert histograms[("persistence_save", None, None)].count == 1
@@ -0,0 +1,127 @@
+"""Test outbound scheduler."""
+
+import asyncio
+import threading
+from unittest import mock
+
+from mysensors import Gateway
+from mysensors.scheduler import (
+    PRIORITY_BULK,
+    OutboundScheduler,
+    TokenBucket,
+)
+from mysensors.task import AsyncTasks, SyncTasks
+
+
+def test_token_bucket():
+    """Test token bucket refill and consume."""
+    bucket = TokenBucket(10.0, burst=2.0, now=0.0)
+    assert bucket.consume(0.0)
+    assert bucket.consume(0.0)
+    assert not bucket.consume(0.0)
+    assert bucket.delay(0.05) == 0.05
+    assert bucket.consume(0.1)
+    assert bucket.delay(10.0) == 0.0
+    assert bucket.tokens == 2.0
+
+
+def test_no_limits():
+    """Test that all messages are sent without rate limits."""
+    scheduler = OutboundScheduler()
+    sent = []
+    scheduler.submit("1;1;1;0;2;1\n2;1;1;0;2;1\n")
+    scheduler.submit("")
+    assert len(scheduler) == 2
+    assert scheduler.poll(sent.append) is None
+    assert sent == ["1;1;1;0;2;1\n", "2;1;1;0;2;1\n"]
+    assert not scheduler
+
+
+def test_priorities():
+    """Test that messages are sent in priority order."""
+    scheduler = OutboundScheduler(rate=1.0)
+    sent = []
+    scheduler.submit("1;1;1;0;2;1\n", PRIORITY_BULK)
+    scheduler.submit("2;1;1;0;2;1\n")
+    scheduler.submit("3;255;3;0;6;M\n")
+    assert scheduler.poll(sent.append, now=0.0) == 1.0
+    assert scheduler.poll(sent.append, now=1.0) == 1.0
+    assert scheduler.poll(sent.append, now=2.0) is None
+    assert sent == ["3;255;3;0;6;M\n", "2;1;1;0;2;1\n", "1;1;1;0;2;1\n"]
+
+
+def test_node_rate():
+    """Test that a rate limited node doesn't hold back other nodes."""
+    scheduler = OutboundScheduler(node_rate=2.0)
+    sent = []
+    scheduler.submit("1;1;1;0;2;1\n1;1;1;0;2;0\n2;1;1;0;2;1\n")
+    with mock.patch("mysensors.scheduler.time.monotonic", return_value=0.0):
+        assert scheduler.poll(sent.append) == 0.5
+    assert sent == ["1;1;1;0;2;1\n", "2;1;1;0;2;1\n"]
+    assert scheduler.poll(sent.append, now=0.5) is None
+    assert sent[-1] == "1;1;1;0;2;0\n"
+
+
+def test_submit_during_poll():
+    """Test that a submit from another thread waits for poll to finish."""
+    scheduler = OutboundScheduler(node_rate=2.0)
+    sent = []
+    scheduler.submit("1;1;1;0;2;1\n1;1;1;0;2;0\n")
+    submitter = threading.Thread(target=scheduler.submit, args=("1;1;1;0;2;2\n",))
+
+    def send(line):
+        """Submit a message for the same node while polling."""
+        sent.append(line)
+        submitter.start()
+        submitter.join(0.1)
+        assert submitter.is_alive()
+
+    assert scheduler.poll(send, now=0.0) == 0.5
+    submitter.join()
+    assert sent == ["1;1;1;0;2;1\n"]
+    scheduler.poll(sent.append, now=0.5)
+    scheduler.poll(sent.append, now=1.0)
+    assert sent == ["1;1;1;0;2;1\n", "1;1;1;0;2;0\n", "1;1;1;0;2;2\n"]
+
+
+def test_sync_tasks_scheduler():
+    """Test that sync tasks send replies via the scheduler."""
+    gateway = Gateway()
+    transport = mock.MagicMock()
+    gateway.tasks = SyncTasks(gateway.const, False, None, gateway.sensors, transport)
+    gateway.tasks.scheduler = OutboundScheduler(rate=100.0)
+    gateway.tasks.start()
+    try:
+        gateway.tasks.add_job(str, "1;1;1;0;2;1\n")
+        gateway.tasks.add_job(str, "2;1;1;0;2;1\n")
+        for _ in range(100):
+            if transport.send.call_count == 2:
+                break
+            asyncio.run(asyncio.sleep(0.01))
+        assert transport.send.mock_calls == [
+            mock.call("1;1;1;0;2;1\n"),
+            mock.call("2;1;1;0;2;1\n"),
+        ]
+    finally:
+        gateway.tasks.stop()
+
+
+def test_async_tasks_scheduler():
+    """Test that async tasks send replies via the scheduler."""
+    gateway = Gateway()
+    transport = mock.MagicMock()
+    gateway.tasks = AsyncTasks(gateway.const, False, None, gateway.sensors, transport)
+    gateway.tasks.scheduler = OutboundScheduler(rate=100.0)
+
+    async def send_messages():
+        """Send messages through the scheduler."""
+        gateway.tasks.add_job(str, "1;1;1;0;2;1\n")
+        gateway.tasks.add_job(str, "2;1;1;0;2;1\n")
+        assert transport.send.mock_calls == [mock.call("1;1;1;0;2;1\n")]
+        await asyncio.sleep(0.05)
+        assert transport.send.mock_calls == [
+            mock.call("1;1;1;0;2;1\n"),
+            mock.call("2;1;1;0;2;1\n"),
+        ]
+
+    asyncio.run(send_messages())
@@ -3,7 +3,8 @@
 import pytest
 import voluptuous
 
-from mysensors.sensor import ChildSensor, Sensor
+from mysensors import Gateway
+from mysensors.sensor import ChangeTracker, ChildSensor, Sensor, validate_all
 from mysensors.const import get_const
 
 
@@ -198,3 +199,85 @@ def test_validate_child_state():
         sensor.validate_child_state(child_id, None, "50")
 
     sensor.validate_child_state(child_id, value_type, "50")
+
+
+def test_change_tracker():
+    """Test tracking changes of a sensor by change token."""
+    const = get_const("1.4")
+    tracker = ChangeTracker()
+    sensor = Sensor(1)
+    sensor.tracker = tracker
+    sensor.add_child_sensor(0, const.Presentation.S_LIGHT_LEVEL)
+    sensor.update_child_value(0, const.SetReq.V_LIGHT_LEVEL, "43")
+    token, changes = tracker.changes_since()
+
+    assert changes == [(1, 0, None), (1, 0, const.SetReq.V_LIGHT_LEVEL)]
+
+    sensor.battery_level = 50
+    sensor.update_child_value(0, const.SetReq.V_LIGHT_LEVEL, "44")
+    token, changes = tracker.changes_since(token)
+
+    assert changes == [(1, None, None), (1, 0, const.SetReq.V_LIGHT_LEVEL)]
+    assert tracker.changes_since(token) == (token, [])
+
+    # A later change moves the key after earlier changes.
+    sensor.sketch_name = "test"
+    assert tracker.changes_since(token - 1)[1] == [
+        (1, 0, const.SetReq.V_LIGHT_LEVEL),
+        (1, None, None),
+    ]
+
+    # Setting the same values doesn't mark changes.
+    token = tracker.token
+    sensor.sketch_name = "test"
+    sensor.battery_level = 50
+    sensor.heartbeat = 0
+    sensor.update_child_value(0, const.SetReq.V_LIGHT_LEVEL, "44")
+    assert tracker.changes_since(token) == (token, [])
+
+
+def test_pickle_without_tracker():
+    """Test that the change tracker isn't pickled."""
+    sensor = Sensor(1)
+    sensor.tracker = ChangeTracker()
+    state = sensor.__getstate__()
+
+    assert "tracker" not in state
+
+    new_sensor = Sensor.__new__(Sensor)
+    new_sensor.__setstate__(state)
+
+    assert new_sensor.tracker is None
+    assert new_sensor.sensor_id == 1
+
+
+def test_child_schema_cached():
+    """Test that child schemas are shared per const version and child type."""
+    const = get_const("2.0")
+    child = ChildSensor(0, const.Presentation.S_TEMP)
+    other_child = ChildSensor(1, int(const.Presentation.S_TEMP))
+
+    schema = child.get_schema("2.0")
+
+    assert other_child.get_schema("2.0.1") is schema
+    assert child.get_schema("1.5") is not schema
+    assert child.validate("2.0", {const.SetReq.V_TEMP: "20.0"}) == {
+        const.SetReq.V_TEMP: "20.0"
+    }
+
+
+def test_validate_all():
+    """Test validating all children of all sensors of a gateway."""
+    const = get_const("2.0")
+    gateway = Gateway(protocol_version="2.0")
+    for sensor_id in (1, 2):
+        sensor = gateway.sensors[sensor_id] = Sensor(sensor_id)
+        sensor.add_child_sensor(0, const.Presentation.S_TEMP)
+        sensor.children[0].values[const.SetReq.V_TEMP] = "20.0"
+    gateway.sensors[2].children[0].values[999] = "20.0"
+    gateway.sensors[2].add_child_sensor(1, 999)
+
+    errors = validate_all(gateway)
+
+    assert list(errors) == [(2, 0), (2, 1)]
+    assert isinstance(errors[(2, 0)], voluptuous.Invalid)
@@ -0,0 +1,132 @@
+"""Test the simulated network."""
+
+from click.testing import CliRunner
+import pytest
+
+from mysensors import Message
+from mysensors.cli import cli
+from mysensors.simulator import (
+    MQTTBroker,
+    SimulatedNetwork,
+    SimulatedNode,
+    make_nodes,
+    simulate,
+)
+
+DURATION = 0.3
+
+
+def test_node_boot():
+    """Test the lines sent by a booting node."""
+    node = SimulatedNode(1, protocol_version="2.2", time_request=False)
+    lines = node.boot()
+    assert lines[:5] == [
+        "1;255;0;0;17;2.2\n",
+        "1;255;3;0;11;Simulated node\n",
+        "1;255;3;0;12;1.0\n",
+        "1;1;0;0;6;\n",
+        "1;2;0;0;7;\n",
+    ]
+    assert [line.rsplit(";", 1)[0] for line in lines[5:]] == ["1;1;1;0;0", "1;2;1;0;1"]
+
+
+def test_node_request_id():
+    """Test that a node without id requests an id."""
+    node = SimulatedNode(protocol_version="2.2")
+    assert node.boot() == ["255;255;3;0;3;\n"]
+    lines = node.receive(Message("255;255;3;0;4;7\n"))
+    assert node.node_id == 7
+    assert lines[0] == "7;255;0;0;17;2.2\n"
+
+
+def test_node_smart_sleep():
+    """Test that a smart sleep node notifies the gateway before sleep."""
+    node = SimulatedNode(1, protocol_version="2.2", smart_sleep=True)
+    node.boot()
+    assert node.report()[-1] == "1;255;3;0;32;2\n"
+    node = SimulatedNode(1, protocol_version="2.0", smart_sleep=True)
+    node.boot()
+    assert node.report()[-1] == "1;255;3;0;22;2\n"
+
+
+def test_network_gateway_version():
+    """Test that the network answers version requests to the gateway."""
+    network = SimulatedNetwork([])
+    delivered = []
+    network.attach(delivered.append)
+    network.write(b"0;255;3;0;2;\n")
+    assert delivered == [b"0;255;3;0;2;2.3.2\n"]
+
+
+def test_broker_publish():
+    """Test routing a message through the broker."""
+    broker = MQTTBroker()
+    received = []
+    broker.subscribe("out/+/1", lambda *args: received.append(args), 1)
+    broker.publish("out/2/1", "20", 0)
+    broker.publish("out/2/2", "21", 0)
+    assert received == [("out/2/1", "20", 0)]
+
+
+@pytest.mark.parametrize("gateway_type", ["sync", "async", "tcp", "mqtt"])
+def test_simulate(gateway_type):
+    """Test running gateways against a simulated network."""
+    network = SimulatedNetwork(make_nodes(3, rate=100.0, smart_sleep=1))
+    stats = simulate(network, gateway_type, duration=DURATION)
+    assert stats["nodes"] == 3
+    assert stats["sent"] > 3 * 8
+    assert stats["received"] >= 3
+    assert stats["latency"]["count"] >= 3
+
+
+@pytest.mark.parametrize("gateway_type", ["sync", "async"])
+def test_simulate_ota(gateway_type):
+    """Test firmware updates of simulated nodes."""
+    network = SimulatedNetwork(make_nodes(2, rate=100.0))
+    stats = simulate(network, gateway_type, duration=DURATION, ota_nodes=(1,))
+    assert stats["ota_blocks"] == 1152 // 16
+    assert network.nodes[0].fw_ver == 2
+    assert network.nodes[1].fw_ver == 1
+
+
+def test_simulate_request_id():
+    """Test nodes requesting ids from the gateway."""
+    network = SimulatedNetwork(make_nodes(3, rate=100.0, request_id=True))
+    simulate(network, "sync", duration=DURATION)
+    assert sorted(node.node_id for node in network.nodes) == [1, 2, 3]
+
+
+def test_cli_simulator():
+    """Test the simulator command."""
+    runner = CliRunner()
+    result = runner.invoke(
+        cli, ["simulator", "-n", "2", "-r", "50", "-d", str(DURATION)]
+    )
+    assert result.exit_code == 0, result.output
+    assert '"nodes": 2' in result.output
+
+
+def test_cli_simulator_persistence_file(tmp_path, monkeypatch):
+    """Test the simulator command saves to the given persistence file only."""
+    monkeypatch.chdir(tmp_path)
+    persistence_file = tmp_path / "state" / "sensors.json"
+    persistence_file.parent.mkdir()
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "simulator",
+            "-n",
+            "2",
+            "-r",
+            "50",
+            "-d",
+            str(DURATION),
+            "--persistence",
+            "--persistence-file",
+            str(persistence_file),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert persistence_file.exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["state"]
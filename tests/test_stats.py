@@ -0,0 +1,87 @@
+"""Test gateway stats."""
+
+from unittest import mock
+
+import pytest
+
+from mysensors.stats import BUCKETS, GatewayStats, Histogram
+
+
+def test_histogram():
+    """Test histogram counts and percentiles."""
+    histogram = Histogram()
+    assert histogram.percentile(0.5) is None
+    for duration in (1e-6, 3e-6, 3e-6, 1e-3):
+        histogram.add(duration)
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(1.007e-3)
+    assert histogram.min == 1e-6
+    assert histogram.max == 1e-3
+    assert histogram.percentile(0.25) == 1e-6
+    assert histogram.percentile(0.5) == 4e-6
+    assert histogram.percentile(0.99) == 1e-3
+    assert sum(histogram.counts) == 4
+
+
+def test_histogram_above_buckets():
+    """Test that durations above the last bucket are counted."""
+    histogram = Histogram()
+    histogram.add(BUCKETS[-1] * 2)
+    assert histogram.counts[-1] == 1
+    assert histogram.percentile(0.5) == BUCKETS[-1] * 2
+
+
+def test_stats_record_per_type():
+    """Test that durations are recorded per stage and message type."""
+    stats = GatewayStats()
+    stats.record("decode", 2e-6, 1, 0)
+    stats.record("decode", 5e-6, 3, 11)
+    stats.record("persistence_save", 1e-3)
+    summary = stats.summary()
+    assert summary["decode"]["all"]["count"] == 2
+    assert summary["decode"]["types"]["1;0"]["count"] == 1
+    assert summary["decode"]["types"]["3;11"]["max"] == 5e-6
+    assert summary["persistence_save"]["types"] == {}
+    stats.reset()
+    assert not stats.summary()
+
+
+def test_stage_timer():
+    """Test that a stage timer records marked stages once."""
+    stats = GatewayStats()
+    stage_timer = stats.timer()
+    stage_timer.mark("decode")
+    stage_timer.mark("handler")
+    stage_timer.record()
+    stage_timer.record()
+    histograms = stats.histograms()
+    assert set(histograms) == {("decode", None, None), ("handler", None, None)}
+    assert histograms[("decode", None, None)].count == 1
+
+
+def test_stage_timer_split_stage():
+    """Test that a stage marked around another stage is recorded once."""
+    stats = GatewayStats()
+    with mock.patch("mysensors.stats.timer", side_effect=[0.0, 1.0, 3.0, 7.0]):
+        stage_timer = stats.timer()
+        stage_timer.mark("handler")
+        stage_timer.mark("event_callback")
+        stage_timer.mark("handler")
+    stage_timer.record()
+    histograms = stats.histograms()
+    assert histograms[("handler", None, None)].count == 1
+    assert histograms[("handler", None, None)].sum == 5.0
+    assert histograms[("event_callback", None, None)].sum == 2.0
+
+
+def test_count_lines():
+    """Test counting of command strings and bytes per type and sub type."""
+    stats = GatewayStats()
+    stats.count_lines("sent", "1;1;1;0;2;1\n1;1;1;0;2;0\n1;255;3;0;6;M\n")
+    stats.count_lines("sent", b"1;1;1;0;2;1\nbad\n")
+    stats.count("reconnects")
+    assert stats.counters() == {
+        ("sent", 1, 2): 3,
+        ("sent", 3, 6): 1,
+        ("reconnects", None, None): 1,
+    }
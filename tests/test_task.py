@@ -1,5 +1,6 @@
 """Test task module."""
 
+import threading
 from unittest import mock
 
 from mysensors import Gateway
@@ -35,3 +36,33 @@ def test_threading_persistence(mock_timer_class, mock_save_sensors):
     gateway.tasks.stop()
     assert mock_timer_2.cancel.call_count == 1
     assert mock_save_sensors.call_count == 3
+
+
+def test_poll_queue_wakes_on_job():
+    """Test that the poll thread runs jobs as soon as they are added."""
+    gateway = get_gateway()
+    sent = threading.Event()
+    gateway.tasks.transport.send.side_effect = lambda reply: sent.set()
+    gateway.tasks.start()
+    try:
+        gateway.tasks.add_job(str, "1;255;3;0;1;123\n")
+        assert sent.wait(1)
+        assert gateway.tasks.transport.send.call_args == mock.call("1;255;3;0;1;123\n")
+    finally:
+        with mock.patch.object(gateway.tasks, "persistence", None):
+            gateway.tasks.stop()
+    # pylint: disable=protected-access
+    gateway.tasks._poll_thread.join(1)
+    assert not gateway.tasks._poll_thread.is_alive()
+
+
+@mock.patch("mysensors.task.threading.Timer")
+def test_call_later_queues_job(mock_timer_class):
+    """Test that call_later queues a job when the timer fires."""
+    gateway = get_gateway()
+    cancel = gateway.tasks.call_later(2.0, str, 1)
+    assert mock_timer_class.call_args == mock.call(
+        2.0, gateway.tasks.add_job, args=(str, 1)
+    )
+    assert mock_timer_class.return_value.start.call_count == 1
+    assert cancel is mock_timer_class.return_value.cancel
@@ -1,12 +1,20 @@
 """Test the gateway transport."""
 
+import asyncio
 from unittest import mock
 
 import pytest
 
 from mysensors import Gateway
+from mysensors.message import Message
 from mysensors.task import SyncTasks
-from mysensors.transport import BaseMySensorsProtocol, Transport
+from mysensors.transport import (
+    AsyncMySensorsProtocol,
+    AsyncTransport,
+    BaseMySensorsProtocol,
+    SyncTransport,
+    Transport,
+)
 
 # pylint: disable=redefined-outer-name
 
@@ -65,6 +73,60 @@ def test_handle_line(gateway):
     assert 1 in gateway.sensors
 
 
+def test_data_received_many_lines(gateway):
+    """Test that many received lines are handled as one job."""
+    gateway.tasks.transport.protocol.data_received(
+        b"1;255;0;0;17;1.4.1\n255;255;3;0;3;\n255;255;3;"
+    )
+    assert len(gateway.tasks.queue) == 1
+    ret = gateway.tasks.run_job()
+    assert 1 in gateway.sensors
+    assert ret == "255;255;3;0;4;2\n"
+    gateway.tasks.transport.protocol.data_received(b"0;3;\n")
+    ret = gateway.tasks.run_job()
+    assert ret == "255;255;3;0;4;3\n"
+
+
+def test_data_received_bytes(gateway):
+    """Test that received lines are handled as bytes."""
+    protocol = gateway.tasks.transport.protocol
+    with mock.patch.object(gateway.tasks, "add_job") as add_job:
+        protocol.data_received(b"1;255;0;0;17;1.4.1\n")
+        protocol.data_received(b"1;255;3;0;0;57\n1;255;3;0;0;58\n")
+    assert add_job.call_args_list == [
+        mock.call(gateway.logic, b"1;255;0;0;17;1.4.1"),
+        mock.call(gateway.logic_many, [b"1;255;3;0;0;57", b"1;255;3;0;0;58"]),
+    ]
+
+
+def test_send_bytes(gateway, connection_transport):
+    """Test sending a mix of command strings and bytes."""
+    transport = gateway.tasks.transport
+    transport.connect()
+    with transport.coalesce():
+        transport.send("1;255;3;0;0;57\n")
+        transport.send(bytearray(b"1;255;3;0;0;58\n"))
+    assert connection_transport.write.call_args == mock.call(
+        b"1;255;3;0;0;57\n1;255;3;0;0;58\n"
+    )
+
+
+def test_send_message(gateway, connection_transport):
+    """Test sending a message object."""
+    transport = gateway.tasks.transport
+    transport.connect()
+    transport.send(Message("1;255;3;0;0;57\n"))
+    assert connection_transport.write.call_args == mock.call(b"1;255;3;0;0;57\n")
+    with transport.coalesce():
+        transport.send(Message("1;255;3;0;0;58\n"))
+        transport.send("1;255;3;0;0;59\n")
+        transport.send(b"1;255;3;0;0;60\n")
+        transport.send(Message(node_id="bad"))
+    assert connection_transport.write.call_args == mock.call(
+        b"1;255;3;0;0;58\n1;255;3;0;0;59\n1;255;3;0;0;60\n"
+    )
+
+
 def test_disconnect(gateway, connection_transport):
     """Test disconnect."""
     assert gateway.tasks.transport.protocol.transport is None
@@ -158,3 +220,111 @@ def test_send_error(gateway, connection_transport, reconnect_callback):
     assert connection_transport.write.call_count == 1
     assert connection_transport.close.call_count == 1
     assert reconnect_callback.call_count == 1
+
+
+def test_send_coalesce(gateway, connection_transport):
+    """Test that messages sent while coalescing are written together."""
+    gateway.tasks.transport.connect()
+    with gateway.tasks.transport.coalesce():
+        gateway.tasks.transport.send("1;255;3;0;1;123\n")
+        gateway.tasks.transport.send(None)
+        gateway.tasks.transport.send("2;255;3;0;1;123\n")
+        assert connection_transport.write.call_count == 0
+    assert connection_transport.write.call_count == 1
+    assert connection_transport.write.call_args == mock.call(
+        b"1;255;3;0;1;123\n2;255;3;0;1;123\n"
+    )
+
+
+def test_send_coalesce_high_watermark(gateway, connection_transport):
+    """Test that coalesced messages are written at the high watermark."""
+    gateway.tasks.transport.connect()
+    gateway.tasks.transport.write_high_watermark = 32
+    with gateway.tasks.transport.coalesce():
+        gateway.tasks.transport.send("1;255;3;0;1;123\n")
+        assert connection_transport.write.call_count == 0
+        gateway.tasks.transport.send("2;255;3;0;1;123\n")
+        assert connection_transport.write.call_count == 1
+        gateway.tasks.transport.send("3;255;3;0;1;123\n")
+    assert connection_transport.write.call_count == 2
+    assert connection_transport.write.call_args == mock.call(b"3;255;3;0;1;123\n")
+
+
+def test_writing_paused(gateway, connection_transport):
+    """Test that the transport reports paused writing from the protocol."""
+    gateway.tasks.transport.connect()
+    assert connection_transport.set_write_buffer_limits.call_args == mock.call(
+        high=gateway.tasks.transport.write_high_watermark,
+        low=gateway.tasks.transport.write_low_watermark,
+    )
+    assert not gateway.tasks.transport.writing_paused
+    gateway.tasks.transport.protocol.pause_writing()
+    assert gateway.tasks.transport.writing_paused
+    gateway.tasks.transport.protocol.resume_writing()
+    assert not gateway.tasks.transport.writing_paused
+
+
+def test_sync_flush_writing_paused(caplog):
+    """Test that sync messages stay buffered while writing is paused."""
+    _gateway = Gateway()
+    transport = SyncTransport(_gateway, mock.MagicMock(), timeout=0.01)
+    _gateway.tasks = SyncTasks(_gateway.const, False, None, _gateway.sensors, transport)
+    connection_transport = mock.MagicMock()
+    transport.protocol.connection_made(connection_transport)
+    transport.protocol.pause_writing()
+    transport.send("1;255;3;0;1;123\n")
+    assert connection_transport.write.call_count == 0
+    assert "keeping 16 bytes buffered" in caplog.text
+    transport.send("2;255;3;0;1;123\n")
+    assert connection_transport.write.call_count == 0
+    transport.protocol.resume_writing()
+    transport.flush()
+    assert connection_transport.write.call_args_list == [
+        mock.call(b"1;255;3;0;1;123\n2;255;3;0;1;123\n")
+    ]
+
+
+def test_async_send_coalesce():
+    """Test that async messages sent in one loop iteration are written together."""
+    _gateway = Gateway()
+    transport = AsyncTransport(_gateway, mock.MagicMock())
+    _gateway.tasks = SyncTasks(_gateway.const, False, None, _gateway.sensors, transport)
+    connection_transport = mock.MagicMock()
+
+    async def send_and_drain():
+        """Send messages and drain the transport."""
+        transport.protocol.connection_made(connection_transport)
+        assert isinstance(transport.protocol, AsyncMySensorsProtocol)
+        transport.send("1;255;3;0;1;123\n")
+        transport.send("2;255;3;0;1;123\n")
+        assert connection_transport.write.call_count == 0
+        await asyncio.sleep(0)
+        assert connection_transport.write.call_count == 1
+        assert connection_transport.write.call_args == mock.call(
+            b"1;255;3;0;1;123\n2;255;3;0;1;123\n"
+        )
+        transport.protocol.pause_writing()
+        drain = asyncio.ensure_future(transport.drain())
+        await asyncio.sleep(0)
+        assert not drain.done()
+        transport.protocol.resume_writing()
+        await asyncio.wait_for(drain, 1)
+
+    asyncio.run(send_and_drain())
+
+
+def test_count_reconnects_and_sent():
+    """Test that reconnects and sent messages are counted in gateway stats."""
+    _gateway = Gateway()
+    _gateway.stats.enabled = True
+    connect = mock.AsyncMock()
+    transport = AsyncTransport(_gateway, connect)
+    transport.protocol.transport = mock.MagicMock()
+    asyncio.run(transport.connect())
+    asyncio.run(transport.connect())
+    transport.send("1;255;3;0;1;123456789\n")
+    assert connect.call_count == 2
+    assert _gateway.stats.counters() == {
+        ("reconnects", None, None): 1,
+        ("messages_sent", 3, 1): 1,
+    }